@@ -20,6 +20,7 @@ class AdvancedWebAR extends WebARApp {
         if ('xr' in navigator) {
             try {
                 this.isWebXRSupported = await navigator.xr.isSessionSupported('immersive-ar');
+                ARTelemetry.record('webxr_ar', this.isWebXRSupported);
                 if (this.isWebXRSupported) {
                     console.log('WebXR AR поддерживается!');
                     this.initWebXR();
@@ -29,7 +30,10 @@ class AdvancedWebAR extends WebARApp {
             } catch (error) {
                 console.log('Ошибка проверки WebXR:', error);
                 this.isWebXRSupported = false;
+                ARTelemetry.record('webxr_ar', false);
             }
+        } else {
+            ARTelemetry.record('webxr_ar', false);
         }
     }
     
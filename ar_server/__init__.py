@@ -0,0 +1,48 @@
+"""
+Общий серверный слой для запускающих скриптов веб-AR
+(start_server.py, start_mobile_server.py, start_https.py, simple_https.py)
+"""
+
+from .admission import Admission
+from .cache import AssetCache
+from .handler import (
+    CAMERA_HEADERS, CORS_HEADERS, ISOLATION_HEADERS, ARRequestHandler, device_icon,
+)
+from .fsindex import FileIndex, shared_index
+from .metrics import Metrics
+from .network import lan_addresses
+from .options import add_server_arguments, parse_server_args
+from .qr import QRCodes, qr_urls
+from .server import ThreadPoolHTTPServer, ThreadPoolMixIn, create_server
+
+
+def __getattr__(name):
+    # Сертификаты нужны только HTTPS скриптам: HTTP сервер стартует без
+    # subprocess, tempfile и прочего, что тянет certs
+    if name == 'CertificateManager':
+        from .certs import CertificateManager
+        return CertificateManager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    'ARRequestHandler',
+    'Admission',
+    'AssetCache',
+    'CAMERA_HEADERS',
+    'CORS_HEADERS',
+    'CertificateManager',
+    'FileIndex',
+    'ISOLATION_HEADERS',
+    'Metrics',
+    'QRCodes',
+    'ThreadPoolHTTPServer',
+    'ThreadPoolMixIn',
+    'add_server_arguments',
+    'create_server',
+    'device_icon',
+    'lan_addresses',
+    'parse_server_args',
+    'qr_urls',
+    'shared_index',
+]
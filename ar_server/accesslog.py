@@ -0,0 +1,157 @@
+"""
+Журнал запросов: очередь и фоновая запись пачками в stdout или файл
+
+Обработчик только добавляет кортеж в deque (без блокировок в CPython).
+Форматирование, определение устройства по User-Agent и вывод выполняются
+в отдельном потоке.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from .useragent import device_kind
+
+DEVICE_ICONS = {'mobile': '📱', 'desktop': '💻'}
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 256
+# Пауза после неполной пачки, чтобы накопилась следующая
+BATCH_WAIT = 0.05
+MAX_LOG_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+
+
+class AccessLog:
+    """Асинхронный журнал запросов с записью пачками
+
+    path=None - вывод в stdout, иначе файл с ротацией по размеру
+    (file, file.1 ... file.N). При переполнении очереди записи
+    отбрасываются и считаются, а не тормозят обработку запросов.
+    """
+
+    def __init__(self, path=None, log_format='text', queue_size=DEFAULT_QUEUE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE, max_bytes=MAX_LOG_BYTES, backups=LOG_BACKUPS):
+        self.path = path
+        self.log_format = log_format
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.written = 0
+        self.reused = 0
+        self.dropped = 0
+        self._records = deque()
+        self._stopping = threading.Event()
+        self._file = None
+        self._file_size = 0
+        if path is not None:
+            self._open_file()
+        self._thread = threading.Thread(target=self._run, name='access-log', daemon=True)
+        self._thread.start()
+
+    def log(self, client, user_agent, requestline, status, size, connection_request=1):
+        """Ставит запись в очередь; вызывается из обработчика запроса
+
+        connection_request - номер запроса на соединении (больше 1 - keep-alive).
+        """
+        if len(self._records) >= self.queue_size:
+            self.dropped += 1
+            return
+        self._records.append((time.time(), client, user_agent, requestline, status, size,
+                              connection_request))
+
+    def close(self):
+        """Дописывает очередь и останавливает поток записи"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        if self._file is not None:
+            self._file.close()
+        if self.written:
+            print(f"🔁 Keep-alive: {self.reused / self.written:.0%} запросов по уже открытым "
+                  f"соединениям ({self.reused} из {self.written})")
+        if self.dropped:
+            print(f"⚠️  Журнал: пропущено записей при переполнении очереди: {self.dropped}")
+
+    def format(self, record):
+        timestamp, client, user_agent, requestline, status, size, connection_request = record
+        kind = device_kind(user_agent)
+        if self.log_format == 'json':
+            return json.dumps({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(timestamp)),
+                'client': client,
+                'device': kind,
+                'request': requestline,
+                'status': status,
+                'size': size,
+                'connection_request': connection_request,
+                'user_agent': user_agent,
+            }, ensure_ascii=False)
+        when = time.strftime('%d/%b/%Y %H:%M:%S', time.localtime(timestamp))
+        return (f'{DEVICE_ICONS[kind]} {client} - [{when}] "{requestline}" {status} {size} '
+                f'#{connection_request}')
+
+    def _run(self):
+        records = self._records
+        while True:
+            # Флаг читаем до выборки: всё, что добавлено раньше, будет записано
+            stopping = self._stopping.is_set()
+            batch = []
+            while records and len(batch) < self.batch_size:
+                batch.append(records.popleft())
+            if batch:
+                self._write(''.join(self.format(record) + '\n' for record in batch))
+                self.written += len(batch)
+                self.reused += sum(record[-1] > 1 for record in batch)
+            elif stopping:
+                return
+            if len(batch) < self.batch_size:
+                self._stopping.wait(BATCH_WAIT)
+
+    def _write(self, text):
+        if self._file is None:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            return
+        data = text.encode('utf-8')
+        if self._file_size + len(data) > self.max_bytes and self._file_size:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data)
+
+    def _open_file(self):
+        self._file = open(self.path, 'ab')
+        self._file_size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backups:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.unlink(self.path)
+        self._open_file()
+
+
+def create_access_log(options, worker=None):
+    """Журнал по --access-log: '-' - stdout, 'off' - выключен, иначе файл
+
+    С --workers у каждого воркера свой файл (access-<номер>.log): ротация
+    одного файла из нескольких процессов теряла бы строки.
+    """
+    target = getattr(options, 'access_log', '-')
+    if target == 'off':
+        return None
+    if worker is not None and target != '-':
+        root, ext = os.path.splitext(target)
+        target = f'{root}-{worker}{ext}'
+    return AccessLog(None if target == '-' else target, getattr(options, 'log_format', 'text'))
@@ -0,0 +1,215 @@
+"""
+Допуск клиентов: соединения с одного IP, частота запросов, сброс нагрузки
+и дедлайн чтения заголовков
+
+Для открытой Wi-Fi сети на площадке: телефон с зациклившейся перезагрузкой
+debug.html или клиент, присылающий запрос по байту (slow loris), не должен
+оставить без ответа остальных. Отказы быстрые: 503 или 429 с Retry-After
+без чтения файлов. Счётчики отказов - в /__metrics и при остановке.
+Адреса loopback (браузер на самом компьютере, benchmark.py) в лимиты на
+клиента не попадают.
+"""
+
+import ipaddress
+import math
+import socket
+import threading
+import time
+
+from .options import DEFAULT_BURST, DEFAULT_MAX_PER_IP, DEFAULT_RATE
+
+REASONS = ('per_ip', 'rate', 'shed', 'header_timeout')
+REASON_TITLES = {
+    'per_ip': 'соединений сверх лимита на IP',
+    'rate': 'запросов сверх частоты (429)',
+    'shed': 'соединений при переполненной очереди (503)',
+    'header_timeout': 'соединений без заголовков в срок',
+}
+# Сколько клиентов помнить; полные корзины при переполнении забываются
+MAX_CLIENTS = 4096
+# Через сколько секунд повторить после сброса нагрузки
+SHED_RETRY_AFTER = 2
+# Как часто проверяются дедлайны чтения заголовков
+CHECK_INTERVAL = 0.25
+
+
+class Admission:
+    """Лимит соединений на IP и token bucket запросов на IP
+
+    Корзина клиента вмещает burst запросов и пополняется на rate в
+    секунду: страница с библиотеками (~20 запросов) проходит сразу, а
+    цикл перезагрузок упирается в rate. 0 в любом параметре - без лимита.
+    """
+
+    def __init__(self, max_per_ip=DEFAULT_MAX_PER_IP, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 exempt_loopback=True):
+        self.max_per_ip = max_per_ip
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.exempt_loopback = exempt_loopback
+        self.rejected = dict.fromkeys(REASONS, 0)
+        self._connections = {}
+        # ip -> [токены, время последнего пополнения]
+        self._buckets = {}
+        self._loopback = {}
+        self._lock = threading.Lock()
+
+    def _limited(self, ip):
+        """Подпадает ли адрес под лимиты на клиента"""
+        if not self.exempt_loopback:
+            return True
+        loopback = self._loopback.get(ip)
+        if loopback is None:
+            try:
+                loopback = ipaddress.ip_address(ip.split('%', 1)[0]).is_loopback
+            except ValueError:
+                loopback = False
+            if len(self._loopback) >= MAX_CLIENTS:
+                self._loopback = {}
+            self._loopback[ip] = loopback
+        return not loopback
+
+    def open_connection(self, ip):
+        """Учитывает соединение; False - с этого IP уже max_per_ip соединений"""
+        if not self.max_per_ip or not self._limited(ip):
+            return True
+        with self._lock:
+            count = self._connections.get(ip, 0)
+            if count >= self.max_per_ip:
+                self.rejected['per_ip'] += 1
+                return False
+            self._connections[ip] = count + 1
+        return True
+
+    def close_connection(self, ip):
+        if not self.max_per_ip or not self._limited(ip):
+            return
+        with self._lock:
+            count = self._connections.get(ip, 0) - 1
+            if count > 0:
+                self._connections[ip] = count
+            else:
+                self._connections.pop(ip, None)
+
+    def allow_request(self, ip):
+        """0 - запрос принят, иначе через сколько секунд повторить (429)"""
+        if not self.rate or not self._limited(ip):
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(ip)
+            if bucket is None:
+                if len(self._buckets) >= MAX_CLIENTS:
+                    self._forget_idle(now)
+                bucket = self._buckets[ip] = [self.burst, now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0
+            bucket[0] = tokens
+            self.rejected['rate'] += 1
+        return max(1, math.ceil((1 - tokens) / self.rate))
+
+    def _forget_idle(self, now):
+        # Полная корзина ничем не отличается от новой
+        idle = [ip for ip, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for ip in idle:
+            del self._buckets[ip]
+
+    def count(self, reason):
+        with self._lock:
+            self.rejected[reason] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.rejected)
+
+
+def reject_connection(sock, tls, retry_after=SHED_RETRY_AFTER):
+    """Быстрый отказ прямо в цикле accept(): 503 по HTTP, закрытие для TLS
+
+    Для TLS ответ без рукопожатия невозможен, а рукопожатие в цикле
+    accept() задержало бы всех остальных; браузер повторит запрос.
+    """
+    try:
+        if not tls:
+            sock.setblocking(False)
+            try:
+                # Непрочитанный запрос превратил бы close() в RST до ответа
+                sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                pass
+            sock.send(b'HTTP/1.1 503 Service Unavailable\r\n'
+                      b'Retry-After: %d\r\nContent-Length: 0\r\n'
+                      b'Connection: close\r\n\r\n' % retry_after)
+            sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+class ReadDeadlines:
+    """Обрывает соединения, не приславшие заголовки запроса за timeout
+
+    Таймаут сокета срабатывает только на паузе между пакетами: клиент,
+    присылающий по байту раз в несколько секунд, держал бы рабочий поток
+    сколько угодно. Один поток раз в CHECK_INTERVAL закрывает такие
+    сокеты на чтение и запись, и обработчик выходит из readline().
+    """
+
+    def __init__(self, timeout, admission=None):
+        self.timeout = timeout
+        self.admission = admission
+        self._deadlines = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, sock):
+        """Отсчёт до конца заголовков; уже идущий отсчёт не продлевается"""
+        with self._lock:
+            self._deadlines.setdefault(sock, time.monotonic() + self.timeout)
+            if self._thread is None:
+                # Поток запускается с первым соединением, уже после fork() воркеров
+                self._thread = threading.Thread(
+                    target=self._run, name='read-deadlines', daemon=True)
+                self._thread.start()
+
+    def finish(self, sock):
+        with self._lock:
+            self._deadlines.pop(sock, None)
+
+    def close(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(CHECK_INTERVAL):
+            now = time.monotonic()
+            with self._lock:
+                expired = [sock for sock, deadline in self._deadlines.items()
+                           if deadline <= now]
+                for sock in expired:
+                    del self._deadlines[sock]
+            for sock in expired:
+                try:
+                    # Метод базового класса: SSLSocket.shutdown сбросил бы
+                    # TLS объект под читающим потоком
+                    socket.socket.shutdown(sock, socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                if self.admission is not None:
+                    self.admission.count('header_timeout')
+
+
+def report_admission(admission):
+    """Печатает отказы при остановке сервера"""
+    if admission is None:
+        return
+    rejected = {reason: count for reason, count in admission.snapshot().items() if count}
+    if not rejected:
+        return
+    print("🚦 Отклонено: " + ", ".join(
+        f"{count} {REASON_TITLES[reason]}" for reason, count in rejected.items()))
@@ -0,0 +1,587 @@
+"""
+Асинхронный движок на asyncio: одно событийное колесо вместо потока
+на соединение, keep-alive, TLS и таймауты на каждое соединение
+"""
+
+import asyncio
+import email.utils
+import html
+import os
+import resource
+import socket
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler
+
+from .admission import report_admission
+from .cache import FileEntry, report_cache
+from .compress import negotiate
+from .fsindex import list_directory
+from .handler import COPY_BUFFER_SIZE, cache_control, device_icon, guess_type, is_hidden
+from .livereload import (
+    LIVE_RELOAD_PATH, MAX_SUBSCRIBERS, LoopSubscriber, event_stream_prologue,
+)
+from .metrics import METRICS_PATH
+from .preload import early_hints_response
+from .qr import QR_PATHS
+from .ranges import RangeNotSatisfiable, plan_ranges
+from .telemetry import MAX_BODY, TELEMETRY_PATH, parse_report
+from .vendor import origin_url
+from .options import (
+    DEFAULT_BACKLOG, DEFAULT_HANDSHAKE_TIMEOUT, DEFAULT_HEADER_TIMEOUT,
+    DEFAULT_KEEP_ALIVE_TIMEOUT, DEFAULT_MAX_CONNECTIONS, DEFAULT_MAX_REQUESTS, DEFAULT_TIMEOUT,
+)
+from .server import report_first_accept
+from .tls import HandshakeStats, report_handshakes
+
+MAX_HEADERS = 100
+MAX_LINE = 64 * 1024
+# Дескрипторы, которые оставляем под файлы, логи и сертификаты
+RESERVED_FDS = 64
+SERVER_VERSION = SimpleHTTPRequestHandler.server_version
+SYS_VERSION = SimpleHTTPRequestHandler.sys_version
+
+
+def connection_ceiling(max_connections):
+    """Ограничивает число соединений лимитом открытых файлов процесса"""
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        return max_connections
+    # Каждое соединение держит сокет и, пока отдаёт ответ, открытый файл
+    return max(1, min(max_connections, (soft_limit - RESERVED_FDS) // 2))
+
+
+class AsyncRequest:
+    """Разобранный запрос: стартовая строка и заголовки"""
+
+    def __init__(self, method, path, version, headers, requestline):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.requestline = requestline
+        self.started = time.perf_counter()
+        # Номер запроса на соединении; last - исчерпан --max-requests
+        self.number = 1
+        self.last = False
+
+    @property
+    def keep_alive(self):
+        if self.last:
+            return False
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+
+class AsyncHTTPServer:
+    """Статический HTTP(S) сервер на asyncio с интерфейсом socketserver
+
+    Сокет создаётся и привязывается в конструкторе, поэтому "Address already
+    in use" поднимается как OSError там же, где и у потокового сервера.
+    Число одновременных соединений ограничено max_connections и лимитом
+    дескрипторов, а с одного IP - admission; сверх них клиент сразу
+    получает 503.
+    """
+
+    def __init__(self, server_address, handler_class, ssl_context=None,
+                 directory=None, connection_timeout=DEFAULT_TIMEOUT,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, backlog=DEFAULT_BACKLOG,
+                 asset_cache=None, handshake_timeout=DEFAULT_HANDSHAKE_TIMEOUT,
+                 access_log=None, keep_alive_timeout=DEFAULT_KEEP_ALIVE_TIMEOUT,
+                 max_requests=DEFAULT_MAX_REQUESTS, reuse_port=False, file_index=None,
+                 admission=None, header_timeout=DEFAULT_HEADER_TIMEOUT):
+        self.handler_class = handler_class
+        self.extra_headers = tuple(getattr(handler_class, 'extra_headers', ()))
+        self.extensions_map = getattr(
+            handler_class, 'extensions_map', SimpleHTTPRequestHandler.extensions_map)
+        self.directory = os.fspath(directory) if directory else os.getcwd()
+        self.ssl_context = ssl_context
+        self.handshake_timeout = handshake_timeout
+        self.tls_stats = HandshakeStats() if ssl_context is not None else None
+        self.asset_cache = asset_cache
+        self.file_index = file_index
+        self.access_log = access_log
+        self.connection_timeout = connection_timeout
+        self.admission = admission
+        # Первый запрос должен прийти целиком за header_timeout: wait_for
+        # ограничивает всё чтение заголовков, а не паузу между пакетами
+        self.header_timeout = (
+            min(header_timeout, connection_timeout) if header_timeout and header_timeout > 0
+            else connection_timeout)
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_requests = max(1, max_requests)
+        self.max_connections = connection_ceiling(max_connections)
+        self.log_requests = True
+        self.metrics = None
+        self.telemetry = None
+        self.preload = None
+        self.live_reload = None
+        # Ответы по HTTP/2 (--http2) - задаёт create_server
+        self.http2 = None
+        # QR коды адресов (/__qr.svg, /__qr.png) - задаёт запускающий скрипт
+        self.qr_codes = None
+        self.started_at = None
+        self.active_connections = 0
+        self.socket = socket.create_server(
+            server_address, backlog=backlog, reuse_port=reuse_port)
+        self.server_address = self.socket.getsockname()[:2]
+        self._loop = None
+        self._stopped = None
+        self._connections = {}
+        self._started = threading.Event()
+        self._finished = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+    # Жизненный цикл, совместимый с socketserver.BaseServer
+
+    def serve_forever(self):
+        self._finished.clear()
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._finished.set()
+
+    def shutdown(self):
+        self._started.wait()
+        self._loop.call_soon_threadsafe(self._stopped.set)
+        self._finished.wait()
+
+    def server_close(self):
+        self.socket.close()
+        if self.access_log is not None:
+            self.access_log.close()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        if self.live_reload is not None:
+            self.live_reload.close()
+        if self.http2 is not None:
+            from .http2 import report_http2
+            report_http2(self.http2)
+        report_cache(self.asset_cache)
+        report_handshakes(self.tls_stats)
+        report_admission(self.admission)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        server = await asyncio.start_server(
+            self._handle_connection, sock=self.socket, ssl=self.ssl_context,
+            ssl_handshake_timeout=self.handshake_timeout if self.ssl_context else None,
+            limit=MAX_LINE)
+        self._started.set()
+        async with server:
+            await self._stopped.wait()
+            server.close()
+            # Обрываем keep-alive соединения, чтобы их задачи завершились сами
+            # (TLS close_notify от клиента при остановке не ждём)
+            for writer in self._connections.values():
+                writer.transport.abort()
+            if self._connections:
+                await asyncio.wait(list(self._connections), timeout=self.connection_timeout)
+
+    # Соединение и разбор запросов
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername') or ('-', 0)
+        if self.started_at is not None:
+            report_first_accept(self.started_at)
+            self.started_at = None
+        admission = self.admission
+        if self.active_connections >= self.max_connections:
+            if admission is not None:
+                admission.count('shed')
+            await self._reject(writer)
+            return
+        if admission is not None and not admission.open_connection(peer[0]):
+            await self._reject(writer)
+            return
+        self.active_connections += 1
+        if self.metrics is not None:
+            self.metrics.connection_opened()
+        self._connections[asyncio.current_task()] = writer
+        # socket.create_server создаёт сокет с proto=0, и asyncio сам не
+        # включает TCP_NODELAY: без него заголовки и тело ответа по
+        # keep-alive ждут отложенного ACK клиента (~40 мс)
+        sock = writer.get_extra_info('socket')
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        ssl_object = writer.get_extra_info('ssl_object')
+        if ssl_object is not None:
+            # Длительность рукопожатия asyncio не отдаёт, считаем возобновления
+            self.tls_stats.record(0.0, ssl_object.session_reused)
+        number = 0
+        try:
+            if (self.http2 is not None and ssl_object is not None
+                    and ssl_object.selected_alpn_protocol() == 'h2'):
+                await self.http2.serve_async(reader, writer, peer)
+                return
+            while True:
+                # Между запросами - таймаут простоя keep-alive
+                timeout = self.keep_alive_timeout if number else self.header_timeout
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), timeout)
+                except asyncio.TimeoutError:
+                    if not number and admission is not None:
+                        admission.count('header_timeout')
+                    break
+                except ValueError:
+                    # Слишком длинная строка или битые заголовки
+                    await self._send_error(
+                        writer, peer, None, HTTPStatus.BAD_REQUEST, close=True)
+                    break
+                if request is None:
+                    break
+                number += 1
+                request.number = number
+                request.last = number >= self.max_requests
+                if not await self._respond(reader, writer, peer, request):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            self.active_connections -= 1
+            if admission is not None:
+                admission.close_connection(peer[0])
+            if self.metrics is not None:
+                self.metrics.connection_closed()
+            self._connections.pop(asyncio.current_task(), None)
+            await self._close(writer)
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        requestline = line.decode('iso-8859-1').rstrip('\r\n')
+        words = requestline.split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            raise ValueError(requestline)
+        method, path, version = words
+        headers = {}
+        for _ in range(MAX_HEADERS + 1):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return AsyncRequest(method, path, version, headers, requestline)
+            name, sep, value = line.decode('iso-8859-1').partition(':')
+            if not sep:
+                raise ValueError(line)
+            headers[name.strip().lower()] = value.strip()
+        raise ValueError('too many headers')
+
+    async def _respond(self, reader, writer, peer, request):
+        if request.method == 'OPTIONS':
+            self._write_head(writer, request, HTTPStatus.NO_CONTENT, [])
+            await writer.drain()
+            self.log_request(peer, request, HTTPStatus.NO_CONTENT, 0)
+            return request.keep_alive
+        telemetry = (self.telemetry is not None and request.method == 'POST'
+                     and urllib.parse.urlsplit(request.path).path == TELEMETRY_PATH)
+        if request.method not in ('GET', 'HEAD') and not telemetry:
+            # Тело запроса не читаем, поэтому соединение не переиспользуем
+            return await self._send_error(
+                writer, peer, request, HTTPStatus.NOT_IMPLEMENTED, close=True)
+        if self.admission is not None:
+            retry_after = self.admission.allow_request(peer[0])
+            if retry_after:
+                return await self._send_bytes(
+                    writer, peer, request, HTTPStatus.TOO_MANY_REQUESTS, b'', 'text/plain',
+                    [('Retry-After', str(retry_after))], close=telemetry)
+        if telemetry:
+            return await self._receive_telemetry(reader, writer, peer, request)
+
+        if (self.metrics is not None or self.qr_codes is not None
+                or self.telemetry is not None or self.live_reload is not None):
+            url = urllib.parse.urlsplit(request.path)
+            if self.live_reload is not None and url.path == LIVE_RELOAD_PATH:
+                return await self._event_stream(reader, writer, peer, request)
+            if self.telemetry is not None and url.path == TELEMETRY_PATH:
+                body, content_type = self.telemetry.render(url.query)
+                return await self._send_bytes(
+                    writer, peer, request, HTTPStatus.OK, body, content_type,
+                    [('Cache-Control', 'no-store')])
+            if self.metrics is not None and url.path == METRICS_PATH:
+                body, content_type = self.metrics.render(
+                    url.query, self.tls_stats, self.admission)
+                return await self._send_bytes(
+                    writer, peer, request, HTTPStatus.OK, body, content_type,
+                    [('Cache-Control', 'no-store')])
+            if self.qr_codes is not None and url.path in QR_PATHS:
+                rendered = self.qr_codes.render(request.path)
+                if rendered is None:
+                    return await self._send_error(writer, peer, request, HTTPStatus.NOT_FOUND)
+                return await self._send_bytes(
+                    writer, peer, request, HTTPStatus.OK, *rendered,
+                    [('Cache-Control', 'no-store')])
+
+        if is_hidden(request.path):
+            return await self._send_error(writer, peer, request, HTTPStatus.NOT_FOUND)
+        index = self.file_index
+        path = self.translate_path(request.path)
+        if index.isdir(path) if index is not None else os.path.isdir(path):
+            parts = urllib.parse.urlsplit(request.path)
+            if not parts.path.endswith('/'):
+                location = urllib.parse.urlunsplit(
+                    (parts[0], parts[1], parts[2] + '/', parts[3], parts[4]))
+                return await self._send_bytes(
+                    writer, peer, request, HTTPStatus.MOVED_PERMANENTLY, b'',
+                    'text/html', [('Location', location)])
+            isfile = index.isfile if index is not None else os.path.isfile
+            for index_file in ('index.html', 'index.htm'):
+                index_file = os.path.join(path, index_file)
+                if isfile(index_file):
+                    path = index_file
+                    break
+            else:
+                body = self.list_directory(path, request.path)
+                if body is None:
+                    return await self._send_error(writer, peer, request, HTTPStatus.NOT_FOUND)
+                return await self._send_bytes(
+                    writer, peer, request, HTTPStatus.OK, body,
+                    'text/html; charset=utf-8')
+
+        if path.endswith('/'):
+            return await self._send_error(writer, peer, request, HTTPStatus.NOT_FOUND)
+        if (self.preload is not None and self.preload.early_hints and request.method == 'GET'
+                and request.version == 'HTTP/1.1'):
+            link = self.preload.early(path, request.path)
+            if link:
+                # Уходит сразу: кэш и файл проверяются уже после неё
+                writer.write(early_hints_response(link))
+        entry = None
+        if self.asset_cache:
+            entry = self.asset_cache.get(path, self.guess_type,
+                                         index.stat if index is not None else os.stat)
+        if entry is None and (index is None or index.exists(path)):
+            entry = FileEntry.open(path, self.guess_type)
+        if entry is None:
+            location = origin_url(request.path)
+            if location is not None:
+                # Копии нет в vendor/ - пусть браузер возьмёт файл с CDN
+                return await self._send_bytes(
+                    writer, peer, request, HTTPStatus.FOUND, b'', 'text/plain',
+                    [('Location', location)])
+            return await self._send_error(writer, peer, request, HTTPStatus.NOT_FOUND)
+        if self.live_reload is not None:
+            self.live_reload.watch(path)
+        try:
+            return await self._send_entry(writer, peer, request, entry)
+        finally:
+            entry.close()
+
+    async def _receive_telemetry(self, reader, writer, peer, request):
+        """POST /__telemetry: тело - пачка замеров страницы"""
+        try:
+            length = int(request.headers.get('content-length', ''))
+        except ValueError:
+            return await self._send_error(
+                writer, peer, request, HTTPStatus.LENGTH_REQUIRED, close=True)
+        if not 0 <= length <= MAX_BODY:
+            return await self._send_error(
+                writer, peer, request, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, close=True)
+        try:
+            # Тело - под тем же дедлайном, что и заголовки
+            body = await asyncio.wait_for(reader.readexactly(length), self.header_timeout)
+        except asyncio.TimeoutError:
+            return False
+        try:
+            accepted = self.telemetry.add(request.headers.get('user-agent', ''),
+                                          parse_report(body))
+        except ValueError:
+            return await self._send_error(writer, peer, request, HTTPStatus.BAD_REQUEST)
+        if not accepted:
+            return await self._send_bytes(
+                writer, peer, request, HTTPStatus.SERVICE_UNAVAILABLE, b'', 'text/plain',
+                [('Retry-After', '1')])
+        self._write_head(writer, request, HTTPStatus.NO_CONTENT, [])
+        await writer.drain()
+        self.log_request(peer, request, HTTPStatus.NO_CONTENT, 0)
+        return request.keep_alive
+
+    async def _event_stream(self, reader, writer, peer, request):
+        """GET /__livereload: события пишет поток слежения, задача ждёт закрытия"""
+        live_reload = self.live_reload
+        if live_reload.subscribers() >= MAX_SUBSCRIBERS:
+            return await self._send_bytes(
+                writer, peer, request, HTTPStatus.SERVICE_UNAVAILABLE, b'', 'text/plain',
+                [('Retry-After', '5')])
+        self._write_head(writer, request, HTTPStatus.OK, [
+            ('Content-Type', 'text/event-stream'), ('Cache-Control', 'no-store')], close=True)
+        self.log_request(peer, request, HTTPStatus.OK, 0)
+        if request.method != 'GET':
+            await writer.drain()
+            return False
+        writer.write(event_stream_prologue(live_reload.boot))
+        await writer.drain()
+        subscriber = LoopSubscriber(self._loop, writer)
+        if not live_reload.subscribe(subscriber):
+            return False
+        try:
+            # Клиент ничего не присылает: любое чтение завершится закрытием
+            while await reader.read(4096):
+                pass
+        finally:
+            live_reload.unsubscribe(subscriber)
+        return False
+
+    # Формирование ответов
+
+    async def _send_entry(self, writer, peer, request, entry):
+        encoding = negotiate(request.headers.get('accept-encoding'), entry.variants)
+        body, etag = entry.representation(encoding)
+        length = entry.length(encoding)
+        validators = [('ETag', etag), ('Last-Modified', entry.last_modified)]
+        if entry.variants:
+            validators.append(('Vary', 'Accept-Encoding'))
+        control = cache_control(request.path, entry.content_type, self.live_reload is not None)
+        if control:
+            validators.append(('Cache-Control', control))
+        if entry.not_modified(request.headers.get('if-none-match'),
+                              request.headers.get('if-modified-since')):
+            self._write_head(writer, request, HTTPStatus.NOT_MODIFIED, validators)
+            await writer.drain()
+            self.log_request(peer, request, HTTPStatus.NOT_MODIFIED, 0)
+            return request.keep_alive
+
+        range_header = request.headers.get('range') if request.method == 'GET' else None
+        try:
+            status, headers, parts, tail = plan_ranges(
+                range_header, request.headers.get('if-range'), etag,
+                entry.last_modified, length, entry.content_type)
+        except RangeNotSatisfiable:
+            return await self._send_bytes(
+                writer, peer, request, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+                b'', 'text/plain', [('Content-Range', f'bytes */{length}')])
+
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Accept-Ranges', 'bytes'))
+        if self.preload is not None and status == HTTPStatus.OK:
+            link = self.preload.link(entry.path, request.path, entry)
+            if link:
+                headers.append(('Link', link))
+        self._write_head(writer, request, status, headers + validators)
+        sent = 0
+        if request.method == 'GET':
+            for prefix, offset, count in parts:
+                writer.write(prefix)
+                await self._write_range(writer, body, offset, count)
+                sent += len(prefix) + count
+            writer.write(tail)
+            sent += len(tail)
+            if self.asset_cache is not None and status == HTTPStatus.OK:
+                self.asset_cache.record_sent(entry, encoding, length)
+        await writer.drain()
+        self.log_request(peer, request, status, sent)
+        return request.keep_alive
+
+    async def _write_range(self, writer, source, offset, count):
+        """Пишет часть буфера или файла кусками, дожидаясь отправки"""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)[offset:offset + count]
+            for position in range(0, len(view), COPY_BUFFER_SIZE):
+                writer.write(view[position:position + COPY_BUFFER_SIZE])
+                await writer.drain()
+            return
+        await writer.drain()
+        # Без TLS - os.sendfile, с TLS asyncio сам читает файл кусками
+        await self._loop.sendfile(writer.transport, source, offset, count, fallback=True)
+
+    def _write_head(self, writer, request, status, headers, close=False):
+        keep_alive = not close and request is not None and request.keep_alive
+        lines = [
+            f'HTTP/1.1 {status.value} {status.phrase}',
+            f'Server: {SERVER_VERSION} {SYS_VERSION} asyncio',
+            f'Date: {email.utils.formatdate(usegmt=True)}',
+        ]
+        lines.extend(f'{name}: {value}' for name, value in headers)
+        lines.extend(f'{name}: {value}' for name, value in self.extra_headers)
+        if keep_alive:
+            lines.append('Connection: keep-alive')
+            lines.append(f'Keep-Alive: timeout={int(self.keep_alive_timeout)}, '
+                         f'max={self.max_requests - request.number}')
+        else:
+            lines.append('Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'strict'))
+
+    async def _send_bytes(self, writer, peer, request, status, body, content_type,
+                          headers=(), close=False):
+        head = [('Content-type', content_type), ('Content-Length', str(len(body)))]
+        head.extend(headers)
+        self._write_head(writer, request, status, head, close)
+        if request is None or request.method != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+        self.log_request(peer, request, status, len(body))
+        return not close and request is not None and request.keep_alive
+
+    async def _send_error(self, writer, peer, request, status, close=False):
+        body = SimpleHTTPRequestHandler.error_message_format % {
+            'code': status.value,
+            'message': html.escape(status.phrase, quote=False),
+            'explain': html.escape(status.description, quote=False),
+        }
+        return await self._send_bytes(
+            writer, peer, request, status, body.encode('utf-8', 'replace'),
+            SimpleHTTPRequestHandler.error_content_type, close=close)
+
+    async def _reject(self, writer):
+        writer.write(b'HTTP/1.1 503 Service Unavailable\r\n'
+                     b'Retry-After: 1\r\nContent-Length: 0\r\n'
+                     b'Connection: close\r\n\r\n')
+        await self._close(writer)
+
+    async def _close(self, writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except (ConnectionError, ssl.SSLError):
+            pass
+
+    # Файловая система
+
+    def translate_path(self, path):
+        # translate_path стандартного обработчика использует только self.directory
+        return SimpleHTTPRequestHandler.translate_path(self, path)
+
+    def guess_type(self, path):
+        if self.file_index is not None:
+            return self.file_index.content_type(path, self._guess_type)
+        return guess_type(path, self.extensions_map)
+
+    def _guess_type(self, path):
+        return guess_type(path, self.extensions_map)
+
+    def list_directory(self, path, url_path):
+        if self.file_index is not None:
+            return self.file_index.listing(path, url_path)
+        return list_directory(path, url_path)
+
+    def log_request(self, peer, request, status, size):
+        user_agent = request.headers.get('user-agent', '') if request else ''
+        if self.metrics is not None:
+            if request is None:
+                self.metrics.record('-', status.value, 0, 0.0, user_agent)
+            else:
+                self.metrics.record(
+                    request.path, status.value, 0 if request.method == 'HEAD' else size,
+                    time.perf_counter() - request.started, user_agent)
+        if not self.log_requests:
+            return
+        requestline = request.requestline if request else '-'
+        number = request.number if request else 1
+        if self.access_log is not None:
+            return self.access_log.log(peer[0], user_agent, requestline, status.value, size,
+                                       number)
+        print(f'{device_icon(user_agent)} {peer[0]} - "{requestline}" {status.value} {size} '
+              f'#{number}')
+        sys.stdout.flush()
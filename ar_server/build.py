@@ -0,0 +1,226 @@
+"""
+Сборка статики: минификация JS/CSS, имена с хэшем содержимого и манифест
+
+Собранные файлы лежат в assets/<имя>.<хэш>.<расширение>. Сервер с
+--assets подменяет ссылки src/href в HTML по assets/manifest.json, а
+файлы с хэшем в имени отдаёт с Cache-Control: immutable.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+ASSETS_DIR = 'assets'
+ASSETS_PREFIX = '/assets/'
+MANIFEST = 'manifest.json'
+# Что собирать: файлы, на которые ссылаются страницы
+BUILD_SOURCES = ('ar-app.js', 'advanced-ar.js', 'telemetry.js', 'style.css')
+HASH_LENGTH = 4
+
+# Строки, шаблоны, комментарии и всё остальное - по одному токену
+JS_TOKENS = re.compile(r'''
+    (?P<string>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*"|`(?:\\.|[^`\\])*`)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<slash>/)
+  | (?P<other>[^'"`/]+)
+''', re.S | re.X)
+CSS_TOKENS = re.compile(r'''
+    (?P<string>'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*")
+  | (?P<comment>/\*.*?\*/)
+  | (?P<other>[^'"/]+|/)
+''', re.S | re.X)
+# После этих символов и слов "/" начинает регулярное выражение, а не деление
+REGEX_PREFIX = tuple('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORD_END = re.compile(r'(?<![\w$])(?:return|typeof|case|in|of|new|delete|void|throw)$')
+LITERAL_MARK = re.compile(r'\0(\d+)\0')
+JS_PUNCTUATION = re.compile(r'\s*([{}()\[\];,:=?|&])\s*')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+# После них перевод строки можно убрать без риска для автоподстановки ";"
+JS_JOINABLE = ('{', ';', ',', '(', '[')
+
+
+def _squeeze_js(code):
+    lines = []
+    for line in code.split('\n'):
+        line = JS_PUNCTUATION.sub(r'\1', ' '.join(line.split()))
+        if not line:
+            continue
+        if lines and lines[-1].endswith(JS_JOINABLE):
+            lines[-1] += line
+        else:
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def _starts_regex(before):
+    """Начинает ли "/" после этого кода регулярное выражение"""
+    before = before.rstrip()
+    return not before or before.endswith(REGEX_PREFIX) or bool(REGEX_KEYWORD_END.search(before))
+
+
+def _read_regex(source, start):
+    """Конец литерала регулярного выражения, начинающегося в start"""
+    position, in_class = start + 1, False
+    while position < len(source):
+        char = source[position]
+        if char == '\\':
+            position += 2
+            continue
+        if char == '\n':
+            break
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            position += 1
+            while position < len(source) and source[position].isalpha():
+                position += 1
+            return position
+        position += 1
+    return start + 1
+
+
+def minify_js(source):
+    """Консервативная минификация: комментарии, отступы и пробелы
+
+    Переводы строк сохраняются везде, где от них может зависеть
+    автоподстановка точки с запятой. Строки, шаблоны и регулярные
+    выражения на время сжатия заменяются метками и переносятся как есть.
+    """
+    code, literals, position = [], [], 0
+    while position < len(source):
+        match = JS_TOKENS.match(source, position)
+        kind, end = match.lastgroup, match.end()
+        if kind == 'other':
+            code.append(match.group())
+        elif kind == 'comment':
+            # Многострочный комментарий может разделять операторы
+            code.append('\n' if '\n' in match.group() else ' ')
+        elif kind == 'slash' and not _starts_regex(''.join(code)):
+            code.append('/')
+        else:
+            if kind == 'slash':
+                end = _read_regex(source, position)
+            code.append(f'\0{len(literals)}\0')
+            literals.append(source[position:end])
+        position = end
+    squeezed = _squeeze_js(''.join(code))
+    return LITERAL_MARK.sub(lambda m: literals[int(m.group(1))], squeezed).strip() + '\n'
+
+
+def minify_css(source):
+    """Убирает комментарии, лишние пробелы и точку с запятой перед }"""
+    # Сначала убираем комментарии, чтобы соседние пробелы слились в один кусок
+    source = ''.join(' ' if match.lastgroup == 'comment' else match.group()
+                     for match in CSS_TOKENS.finditer(source))
+    out = []
+    for match in CSS_TOKENS.finditer(source):
+        if match.lastgroup == 'string':
+            out.append(match.group())
+            continue
+        css = CSS_PUNCTUATION.sub(r'\1', re.sub(r'\s+', ' ', match.group()))
+        out.append(re.sub(r':\s+', ':', css).replace(';}', '}'))
+    return ''.join(out).strip() + '\n'
+
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+
+def hashed_name(name, data):
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.blake2b(data, digest_size=HASH_LENGTH).hexdigest()
+    return f'{stem}.{digest}{ext}'
+
+
+def build_assets(root, sources=BUILD_SOURCES):
+    """Собирает файлы в <root>/assets и пишет манифест
+
+    Возвращает словарь манифеста {исходное имя: {path, size, minified, gzip}}.
+    Сборки прошлых версий удаляются.
+    """
+    out_dir = os.path.join(root, ASSETS_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+    for name in sources:
+        with open(os.path.join(root, name), encoding='utf-8') as f:
+            source = f.read()
+        minify = MINIFIERS.get(os.path.splitext(name)[1])
+        data = (minify(source) if minify else source).encode('utf-8')
+        target = hashed_name(name, data)
+        _write_atomic(os.path.join(out_dir, target), data)
+        files[name] = {
+            'path': f'{ASSETS_DIR}/{target}',
+            'size': len(source.encode('utf-8')),
+            'minified': len(data),
+            'gzip': len(gzip.compress(data, compresslevel=9, mtime=0)),
+        }
+    current = {os.path.basename(info['path']) for info in files.values()} | {MANIFEST}
+    for name in os.listdir(out_dir):
+        if name not in current and not name.startswith('.'):
+            os.unlink(os.path.join(out_dir, name))
+    _write_atomic(os.path.join(out_dir, MANIFEST),
+                  json.dumps({'files': files}, indent=2, sort_keys=True).encode('utf-8'))
+    return files
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(prefix='.build-', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AssetManifest:
+    """Подмена ссылок src/href на собранные файлы в HTML страницах"""
+
+    def __init__(self, files):
+        files = dict(files)
+        names = '|'.join(re.escape(name) for name in sorted(files, key=len, reverse=True))
+        pattern = re.compile(
+            rb'''(\b(?:src|href)\s*=\s*)(["'])(?:\./)?(''' + names.encode() + rb''')\2''')
+        # Файлы и выражение меняются вместе одним присваиванием (reload)
+        self._state = (files, pattern)
+
+    @classmethod
+    def load(cls, root):
+        try:
+            with open(os.path.join(root, ASSETS_DIR, MANIFEST)) as f:
+                files = json.load(f).get('files', {})
+        except (OSError, ValueError):
+            files = {}
+        files = {name: info['path'] for name, info in files.items()
+                 if os.path.isfile(os.path.join(root, info['path']))}
+        return cls(files)
+
+    @property
+    def files(self):
+        return self._state[0]
+
+    def reload(self, root):
+        """Перечитывает манифест после пересборки (--live-reload)"""
+        self._state = self.load(root)._state
+
+    def __len__(self):
+        return len(self.files)
+
+    def transform(self, path, content_type, body):
+        files, pattern = self._state
+        if not files or not content_type.startswith('text/html'):
+            return body
+        return pattern.sub(
+            lambda m: m.group(1) + m.group(2) + files[m.group(3).decode()].encode() + m.group(2),
+            body)
+
+
+def load_manifest(root):
+    """Загружает assets/manifest.json и печатает, сколько файлов собрано"""
+    manifest = AssetManifest.load(root)
+    if manifest:
+        print(f"🏗️  Собранные файлы: {', '.join(sorted(manifest.files))}")
+    else:
+        print("⚠️  Нет собранных файлов: запустите python build_assets.py")
+    return manifest
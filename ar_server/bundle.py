@@ -0,0 +1,422 @@
+"""
+Бандл сайта (--bundle): все раздаваемые файлы одним отображённым в память
+файлом со сжатыми вариантами, ETag, MIME типами и хэш-индексом
+
+Без бандла сервер раздаёт текущий каталог целиком: рядом со страницами
+лежат cert.pem, key.pem и .py скрипты, а каждый запрос - это open и stat.
+Бандл собирается заранее (python build_bundle.py) только из файлов сайта.
+Сервер при старте делает mmap и читает заголовок; запрос - хэш пути, проба
+таблицы слотов и ответ срезом memoryview без копирования. Файл отображён до
+fork(), поэтому воркеры --workers делят одни страницы кэша ядра.
+
+Формат (little-endian):
+  заголовок   MAGIC, версия, число слотов (степень двойки), число записей
+  слоты       (хэш пути, смещение записи); хэш 0 - пустой слот
+  записи      RECORD, затем путь, MIME тип и ETag, затем VARIANT на каждый
+              сжатый вариант
+  данные      тела файлов, листингов каталогов и их сжатых вариантов
+
+Путь - относительный, через '/', корень - пустая строка. Бандл заменяется
+новым файлом (os.replace), а не перезаписывается: работающий сервер
+продолжает отдавать прежнюю версию до перезапуска.
+"""
+
+import email.utils
+import errno
+import fnmatch
+import hashlib
+import mmap
+import os
+import stat as stat_module
+import struct
+import tempfile
+import threading
+
+from .cache import AssetEntry
+from .compress import ENCODINGS, build_variants, is_compressible
+from .fsindex import render_listing
+from .options import DEFAULT_BUNDLE_FILE
+
+MAGIC = b'ARBUNDLE'
+VERSION = 1
+
+HEADER = struct.Struct('<8sIII')
+SLOT = struct.Struct('<QQ')
+# Тип, число вариантов, длины пути, MIME типа и ETag, mtime, тело
+RECORD = struct.Struct('<BBHHHdQQ')
+# Номер кодировки в ENCODINGS, смещение, размер
+VARIANT = struct.Struct('<BQQ')
+# Заполнение таблицы слотов не больше половины: проба - один-два слота
+MIN_SLOTS = 8
+ALIGNMENT = 8
+
+FILE = 0
+DIRECTORY = 1
+LISTING_TYPE = 'text/html; charset=utf-8'
+
+# Что не попадает в бандл: серверные скрипты, ключи, журналы, сами бандлы
+EXCLUDED = ('*.py', '*.pyc', '*.bat', '*.sh', '*.pem', '*.key', '*.crt', '*.md',
+            '*.jsonl', '*.gz', '*.arlog', '*.arbundle')
+
+
+class BundleError(ValueError):
+    """Файл не является бандлом этой версии"""
+
+
+def path_hash(key):
+    """64-битный хэш относительного пути; 0 зарезервирован за пустым слотом"""
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, 'little') | 1
+
+
+def _key(relative):
+    return relative.encode('utf-8', 'surrogateescape')
+
+
+class BundleEntry(AssetEntry):
+    """Файл бандла: тело и варианты - срезы отображения без копирования"""
+
+    __slots__ = ('path', 'body', 'size', 'mtime', 'etag', 'last_modified',
+                 'content_type', 'variants', 'is_dir')
+
+    def __init__(self, path, body, mtime, etag, content_type, variants, is_dir):
+        self.path = path
+        self.body = body
+        self.size = len(body)
+        self.mtime = mtime
+        self.etag = etag
+        self.last_modified = email.utils.formatdate(mtime, usegmt=True)
+        self.content_type = content_type
+        self.variants = variants
+        self.is_dir = is_dir
+
+
+class Bundle:
+    """Отображённый бандл вместо FileIndex и AssetCache сразу
+
+    Методы повторяют FileIndex (isdir, isfile, exists, stat, content_type,
+    listing) и AssetCache (get, record_sent, savings, stats): движкам не
+    важно, откуда берутся файлы. Путь вне бандла не существует - запрос
+    получит 404, даже если такой файл лежит в каталоге.
+    """
+
+    def __init__(self, path, root, compress=True):
+        self.path = os.path.abspath(path)
+        self.root = os.path.abspath(root)
+        self.compress = compress
+        self._prefix = self.root.rstrip(os.sep) + os.sep
+        with open(self.path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise BundleError(f'{self.path}: пустой файл') from None
+        self.size = len(self._map)
+        if self.size < HEADER.size:
+            raise BundleError(f'{self.path}: не бандл')
+        magic, version, self.slots, self.entries = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise BundleError(f'{self.path}: не бандл')
+        if version != VERSION:
+            raise BundleError(f'{self.path}: версия {version}, сервер читает {VERSION}')
+        if self.slots & (self.slots - 1) or HEADER.size + self.slots * SLOT.size > self.size:
+            raise BundleError(f'{self.path}: повреждённая таблица слотов')
+        self._view = memoryview(self._map)
+        self._mask = self.slots - 1
+        # Относительный путь -> BundleEntry (только найденные: их не больше записей)
+        self._found = {}
+        self.hits = 0
+        self.misses = 0
+        self._savings = {}
+        self._lock = threading.Lock()
+
+    # Поиск
+
+    def _relative(self, path):
+        """Путь в бандле для пути файловой системы или None вне корня"""
+        path = path.rstrip(os.sep)
+        if path == self.root.rstrip(os.sep):
+            return ''
+        if not path.startswith(self._prefix):
+            return None
+        relative = path[len(self._prefix):]
+        return relative.replace(os.sep, '/') if os.sep != '/' else relative
+
+    def entry(self, path):
+        """BundleEntry файла или каталога или None"""
+        relative = self._relative(path)
+        if relative is None:
+            return None
+        entry = self._found.get(relative)
+        if entry is None:
+            entry = self._find(relative)
+            if entry is not None:
+                self._found[relative] = entry
+        return entry
+
+    def _find(self, relative):
+        key = _key(relative)
+        wanted = path_hash(key)
+        index = wanted & self._mask
+        while True:
+            slot_hash, offset = SLOT.unpack_from(self._map, HEADER.size + index * SLOT.size)
+            if not slot_hash:
+                return None
+            if slot_hash == wanted:
+                entry = self._read_record(offset, key)
+                if entry is not None:
+                    return entry
+            index = (index + 1) & self._mask
+
+    def _read_record(self, offset, key):
+        (kind, count, path_length, type_length, etag_length, mtime,
+         body_offset, body_size) = RECORD.unpack_from(self._map, offset)
+        position = offset + RECORD.size
+        if self._map[position:position + path_length] != key:
+            # Совпал только хэш
+            return None
+        position += path_length
+        content_type = self._map[position:position + type_length].decode('latin-1')
+        position += type_length
+        etag = self._map[position:position + etag_length].decode('latin-1')
+        position += etag_length
+        variants = {}
+        for _ in range(count):
+            encoding, data_offset, data_size = VARIANT.unpack_from(self._map, position)
+            position += VARIANT.size
+            if self.compress:
+                variants[ENCODINGS[encoding]] = self._view[data_offset:data_offset + data_size]
+        relative = key.decode('utf-8', 'surrogateescape')
+        path = os.path.join(self.root, *relative.split('/')) if relative else self.root
+        return BundleEntry(
+            path, self._view[body_offset:body_offset + body_size], mtime, etag,
+            content_type, variants, kind == DIRECTORY)
+
+    # Интерфейс FileIndex
+
+    def stat(self, path):
+        entry = self.entry(path)
+        if entry is None:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        mode = (stat_module.S_IFDIR | 0o555) if entry.is_dir else (stat_module.S_IFREG | 0o444)
+        return os.stat_result((mode, 0, 0, 1, 0, 0, entry.size,
+                               entry.mtime, entry.mtime, entry.mtime))
+
+    def isdir(self, path):
+        entry = self.entry(path)
+        return entry is not None and entry.is_dir
+
+    def isfile(self, path):
+        entry = self.entry(path)
+        return entry is not None and not entry.is_dir
+
+    def exists(self, path):
+        return self.entry(path) is not None
+
+    def content_type(self, path, guess_type):
+        entry = self.entry(path)
+        return entry.content_type if entry is not None else guess_type(path)
+
+    def listing(self, path, url_path):
+        """Листинг каталога, собранный при сборке бандла"""
+        entry = self.entry(path)
+        if entry is None or not entry.is_dir:
+            return None
+        return bytes(entry.body)
+
+    def refresh(self):
+        # Бандл неизменяем: новая версия - новый файл и перезапуск
+        pass
+
+    def read(self, path):
+        """Содержимое файла (для разбора страниц и стилей в preload)"""
+        entry = self.entry(path)
+        if entry is None or entry.is_dir:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        return bytes(entry.body)
+
+    # Интерфейс AssetCache
+
+    def get(self, path, guess_type, stat_path=None):
+        """BundleEntry файла или None; guess_type и stat_path не нужны"""
+        entry = self.entry(path)
+        found = entry is not None and not entry.is_dir
+        # Счётчики - из потоков пула: += без блокировки теряет обновления
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry if found else None
+
+    def record_sent(self, entry, encoding, sent_bytes):
+        with self._lock:
+            counters = self._savings.setdefault(entry.path, [0, 0, 0])
+            counters[0] += 1
+            counters[1] += entry.size
+            counters[2] += sent_bytes
+
+    def savings(self):
+        with self._lock:
+            return {path: tuple(counters) for path, counters in self._savings.items()}
+
+    def invalidate(self, path):
+        pass
+
+    def invalidate_type(self, content_type):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': 0,
+                'entries': self.entries,
+                'bytes': self.size,
+                'max_bytes': self.size,
+            }
+
+    def close(self):
+        self._found.clear()
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Срезы ещё отдаются: отображение закроется вместе с процессом
+            pass
+
+
+def open_bundle(path, root, compress=True):
+    """Отображает бандл и печатает, что в нём; при ошибке - выход с сообщением"""
+    try:
+        bundle = Bundle(path, root, compress=compress)
+    except (OSError, BundleError) as error:
+        raise SystemExit(f"❌ Бандл не открыт: {error}. Соберите его: python build_bundle.py")
+    print(f"📦 Бандл {os.path.basename(bundle.path)}: записей {bundle.entries}, "
+          f"{bundle.size / 1024 / 1024:.1f} МБ; раздаются только файлы бандла")
+    return bundle
+
+
+# Сборка
+
+def is_excluded(name, patterns=EXCLUDED):
+    return name.startswith('.') or any(fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def collect_files(root, patterns=EXCLUDED):
+    """Относительные пути файлов сайта в каталоге root (без ссылок наружу)"""
+    root = os.path.abspath(root)
+    real_root = os.path.realpath(root)
+    files = []
+    for directory, dirs, names in os.walk(root):
+        dirs[:] = sorted(d for d in dirs
+                         if not d.startswith(('.', '__')) and not is_excluded(d, patterns))
+        for name in sorted(names):
+            if is_excluded(name, patterns):
+                continue
+            path = os.path.join(directory, name)
+            real = os.path.realpath(path)
+            if not os.path.isfile(real) or os.path.commonpath([real, real_root]) != real_root:
+                continue
+            files.append(os.path.relpath(path, root).replace(os.sep, '/'))
+    return files
+
+
+def build_bundle(root, output, guess_type, files, transforms=(), compress=True):
+    """Собирает бандл из файлов (относительных путей) каталога root
+
+    Функции transforms(path, content_type, body) применяются как в
+    AssetCache, поэтому подмена адресов --vendor/--assets попадает в бандл
+    готовой. Возвращает {путь: (размер, {кодировка: размер})}.
+    """
+    root = os.path.abspath(root)
+    records = []
+    directories = {'': []}
+    for relative in files:
+        parts = relative.split('/')
+        for depth in range(1, len(parts)):
+            parent, name = '/'.join(parts[:depth - 1]), parts[depth - 1]
+            if '/'.join(parts[:depth]) not in directories:
+                directories['/'.join(parts[:depth])] = []
+                directories[parent].append((name, True))
+        directories['/'.join(parts[:-1])].append((parts[-1], False))
+
+        path = os.path.join(root, *parts)
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            body = f.read()
+        content_type = guess_type(path)
+        for transform in transforms:
+            body = transform(path, content_type, body)
+        variants = {}
+        if compress and is_compressible(content_type, len(body)):
+            variants = build_variants(path, body, stat)
+        records.append((relative, FILE, content_type, stat.st_mtime, body, variants))
+
+    for relative, children in directories.items():
+        path = os.path.join(root, *relative.split('/')) if relative else root
+        children.sort(key=lambda child: child[0].lower())
+        body = render_listing('/' + relative + ('/' if relative else ''),
+                              [(name, is_dir, False) for name, is_dir in children])
+        variants = build_variants(path, body, None) if compress else {}
+        records.append((relative, DIRECTORY, LISTING_TYPE, os.stat(path).st_mtime,
+                        body, variants))
+
+    _write_bundle(output, records)
+    return {relative: (len(body), {encoding: len(data) for encoding, data in variants.items()})
+            for relative, kind, _, _, body, variants in records if kind == FILE}
+
+
+def _write_bundle(output, records):
+    slots = MIN_SLOTS
+    while slots < len(records) * 2:
+        slots *= 2
+    table = [(0, 0)] * slots
+    encoded = []
+    offset = HEADER.size + slots * SLOT.size
+    for relative, kind, content_type, mtime, body, variants in records:
+        key = _key(relative)
+        content_type = content_type.encode('latin-1')
+        # Тот же ETag, что у CacheEntry: кэш браузера переживает смену режима
+        etag = ('"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()).encode('latin-1')
+        encoded.append((key, kind, content_type, etag, mtime, body,
+                        variants, offset))
+        index = path_hash(key) & (slots - 1)
+        while table[index][0]:
+            index = (index + 1) & (slots - 1)
+        table[index] = (path_hash(key), offset)
+        offset += (RECORD.size + len(key) + len(content_type) + len(etag)
+                   + len(variants) * VARIANT.size)
+
+    data = []
+    data_offset = offset
+
+    def place(chunk):
+        nonlocal data_offset
+        padding = -data_offset % ALIGNMENT
+        data.append(b'\0' * padding)
+        data.append(chunk)
+        data_offset += padding
+        placed = data_offset
+        data_offset += len(chunk)
+        return placed
+
+    header = [HEADER.pack(MAGIC, VERSION, slots, len(records))]
+    header.extend(SLOT.pack(*slot) for slot in table)
+    for key, kind, content_type, etag, mtime, body, variants, _ in encoded:
+        header.append(RECORD.pack(kind, len(variants), len(key), len(content_type), len(etag),
+                                  mtime, place(body), len(body)))
+        header.extend((key, content_type, etag))
+        for encoding, variant in variants.items():
+            header.append(VARIANT.pack(ENCODINGS.index(encoding), place(variant), len(variant)))
+
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(prefix='.bundle-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.writelines(header)
+            f.writelines(data)
+        os.replace(tmp_path, output)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,297 @@
+"""
+LRU кэш содержимого статических файлов с ETag и Last-Modified
+"""
+
+import email.utils
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import timezone
+
+from .compress import build_variants, is_compressible
+
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024
+DEFAULT_MAX_FILE_SIZE = 2 * 1024 * 1024
+
+
+class AssetEntry:
+    """Общие валидаторы для условных запросов"""
+
+    __slots__ = ()
+
+    def representation(self, encoding):
+        """Тело и ETag для выбранной кодировки (None - без сжатия)"""
+        if encoding is None:
+            return self.body, self.etag
+        # У каждого представления свой сильный ETag
+        return self.variants[encoding], f'{self.etag[:-1]}-{encoding}"'
+
+    def length(self, encoding):
+        return self.size if encoding is None else len(self.variants[encoding])
+
+    def not_modified(self, if_none_match, if_modified_since):
+        """Проверяет If-None-Match, а без него If-Modified-Since (RFC 9110)"""
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            # Для GET/HEAD сравнение слабое: W/"x" совпадает с "x"
+            tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+            if '*' in tags:
+                return True
+            etags = [self.etag] + [self.representation(e)[1] for e in self.variants]
+            return any(etag in tags for etag in etags)
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return int(self.mtime) <= since.timestamp()
+        return False
+
+    def close(self):
+        pass
+
+
+class CacheEntry(AssetEntry):
+    """Содержимое файла в памяти и его сжатые варианты"""
+
+    __slots__ = ('path', 'body', 'size', 'source_size', 'mtime', 'mtime_ns', 'etag',
+                 'last_modified', 'content_type', 'variants', 'footprint')
+
+    def __init__(self, path, body, stat, content_type, variants=None):
+        self.path = path
+        self.body = body
+        # Тело может отличаться от файла (transform), свежесть - по файлу
+        self.size = len(body)
+        self.source_size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = stat.st_mtime_ns
+        # Сильный ETag по содержимому: одинаков для всех процессов и перезапусков
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = content_type
+        self.variants = variants or {}
+        self.footprint = self.size + sum(len(data) for data in self.variants.values())
+
+    def is_fresh(self, stat):
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.source_size
+
+
+class FileEntry(AssetEntry):
+    """Открытый файл, который не поместился в кэш (или кэш выключен)"""
+
+    __slots__ = ('path', 'body', 'size', 'mtime', 'etag', 'last_modified',
+                 'content_type', 'variants')
+
+    def __init__(self, path, f, content_type):
+        stat = os.fstat(f.fileno())
+        self.path = path
+        self.body = f
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        # ETag по метаданным, как у nginx: файл не читается целиком
+        self.etag = '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = content_type
+        self.variants = {}
+
+    @classmethod
+    def open(cls, path, guess_type):
+        """Открывает файл или возвращает None, если его нельзя прочитать"""
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        try:
+            return cls(path, f, guess_type(path))
+        except Exception:
+            f.close()
+            raise
+
+    def close(self):
+        self.body.close()
+
+
+class AssetCache:
+    """Ограниченный по объёму LRU кэш файлов, сбрасываемый по mtime/size
+
+    Повторный запрос стоит один os.stat без чтения файла (с FileIndex - ни
+    одного). Файлы крупнее
+    max_file_size не кэшируются и отдаются с диска как раньше. Сжатые
+    варианты строятся при загрузке версии файла и живут в той же записи.
+    Функции transforms(path, content_type, body) по очереди подменяют тело
+    при загрузке (адреса CDN и собранных файлов в HTML).
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_SIZE, max_file_size=DEFAULT_MAX_FILE_SIZE,
+                 compress=True, persist_gzip=False, transforms=()):
+        self.max_bytes = max_bytes
+        self.max_file_size = min(max_file_size, max_bytes)
+        self.compress = compress
+        self.persist_gzip = persist_gzip
+        self.transforms = tuple(transforms)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._savings = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, guess_type, stat_path=os.stat):
+        """Возвращает CacheEntry или None, если файл нельзя взять из кэша
+
+        stat_path - чем проверять свежесть записи (FileIndex.stat - без
+        системного вызова на попадание).
+        """
+        try:
+            stat = stat_path(path)
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.is_fresh(stat):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        if not os.path.isfile(path) or stat.st_size > self.max_file_size:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                body = f.read()
+        except OSError:
+            return None
+        content_type = guess_type(path)
+        persist = self.persist_gzip
+        if self.transforms:
+            transformed = body
+            for transform in self.transforms:
+                transformed = transform(path, content_type, transformed)
+            # Изменённое тело не сохраняем в файл.gz рядом с исходником
+            persist = persist and transformed == body
+            body = transformed
+        variants = None
+        if self.compress and is_compressible(content_type, len(body)):
+            variants = build_variants(path, body, stat, persist)
+        entry = CacheEntry(path, body, stat, content_type, variants)
+        self._store(entry)
+        return entry
+
+    def record_sent(self, entry, encoding, sent_bytes):
+        """Учитывает отданный ответ для отчёта об экономии трафика"""
+        with self._lock:
+            counters = self._savings.setdefault(entry.path, [0, 0, 0])
+            counters[0] += 1
+            counters[1] += entry.size
+            counters[2] += sent_bytes
+
+    def savings(self):
+        """{путь: (ответов, байт без сжатия, байт в сеть)}"""
+        with self._lock:
+            return {path: tuple(counters) for path, counters in self._savings.items()}
+
+    def invalidate(self, path):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self.current_bytes -= entry.footprint
+
+    def invalidate_type(self, content_type):
+        """Убирает записи этого типа (HTML после смены манифеста сборки)"""
+        with self._lock:
+            for path in [path for path, entry in self._entries.items()
+                         if entry.content_type.startswith(content_type)]:
+                self.current_bytes -= self._entries.pop(path).footprint
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _store(self, entry):
+        with self._lock:
+            previous = self._entries.pop(entry.path, None)
+            if previous is not None:
+                self.current_bytes -= previous.footprint
+            self._entries[entry.path] = entry
+            self.current_bytes += entry.footprint
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.footprint
+                self.evictions += 1
+
+
+def report_cache(cache):
+    """Печатает счётчики кэша при остановке сервера"""
+    if cache is None:
+        return
+    stats = cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    if not lookups:
+        return
+    print(f"📦 Кэш: попаданий {stats['hits']}, промахов {stats['misses']} "
+          f"({stats['hits'] / lookups * 100:.0f}%), вытеснений {stats['evictions']}, "
+          f"в памяти файлов: {stats['entries']} ({stats['bytes'] // 1024} КБ)")
+    report_savings(cache)
+
+
+def format_size(size):
+    return f"{size / 1024:.1f} КБ"
+
+
+def report_savings(cache, directory=None):
+    """Печатает экономию трафика от сжатия по каждому файлу"""
+    savings = cache.savings()
+    rows = [(path, counters) for path, counters in savings.items()
+            if counters[2] < counters[1]]
+    if not rows:
+        return
+    rows.sort(key=lambda row: row[1][2] - row[1][1])
+    total_plain = sum(counters[1] for _, counters in rows)
+    total_wire = sum(counters[2] for _, counters in rows)
+    print(f"🗜️  Сжатие сэкономило {format_size(total_plain - total_wire)} трафика:")
+    for path, (responses, plain, wire) in rows:
+        print(f"   {os.path.relpath(path, directory)}: {responses} отв., "
+              f"{format_size(plain)} -> {format_size(wire)} (-{(1 - wire / plain) * 100:.0f}%)")
+
+
+def precompress_tree(cache, directory, guess_type):
+    """Загружает в кэш и сжимает все подходящие файлы каталога при старте"""
+    print("🗜️  Предварительное сжатие файлов:")
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('.', '__')))
+        for name in sorted(files):
+            if name.startswith('.') or name.endswith('.gz'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if size > cache.max_file_size or not is_compressible(guess_type(path), size):
+                continue
+            entry = cache.get(path, guess_type)
+            if entry is None or not entry.variants:
+                continue
+            sizes = ', '.join(
+                f"{encoding} {format_size(len(data))} (-{(1 - len(data) / entry.size) * 100:.0f}%)"
+                for encoding, data in entry.variants.items())
+            print(f"   {os.path.relpath(path, directory)}: {format_size(entry.size)} -> {sizes}")
@@ -0,0 +1,187 @@
+"""
+Самоподписанные ECDSA сертификаты для HTTPS скриптов: выпуск и кэш
+"""
+
+import ipaddress
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+from .network import local_addresses
+from .options import state_dir
+
+# Не в текущем каталоге: он раздаётся, а рядом лежал бы закрытый ключ
+DEFAULT_CERT_DIR = state_dir('certs')
+# Safari не принимает серверные сертификаты сроком больше 825 дней
+CERT_DAYS = 825
+# За сколько до истечения выпускать замену
+RENEW_BEFORE = 30 * 24 * 3600
+
+
+def is_ip(host):
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+class CertificateManager:
+    """Выпускает и кэширует сертификат ECDSA P-256 с SAN для всех адресов
+
+    Действующий сертификат берётся из каталога без запуска openssl.
+    Если он скоро истечёт или в нём нет нового адреса компьютера, сервер
+    стартует со старым, а замена выпускается в фоне и подгружается в
+    SSLContext для новых соединений.
+    """
+
+    def __init__(self, directory=DEFAULT_CERT_DIR, hosts=None, days=CERT_DAYS):
+        self.directory = directory
+        if hosts is None:
+            hosts = ['localhost'] + local_addresses()
+        self.hosts = list(hosts)
+        self.days = days
+        self.cert_file = os.path.join(directory, 'cert.pem')
+        self.key_file = os.path.join(directory, 'key.pem')
+        self.meta_file = os.path.join(directory, 'cert.json')
+
+    def status(self):
+        """'valid', 'stale' (работает, но нужна замена) или 'missing'"""
+        try:
+            with open(self.meta_file) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return 'missing'
+        if not (os.path.exists(self.cert_file) and os.path.exists(self.key_file)):
+            return 'missing'
+        remaining = meta.get('not_after', 0) - time.time()
+        if remaining <= 0:
+            return 'missing'
+        if remaining < RENEW_BEFORE or not set(self.hosts) <= set(meta.get('hosts', ())):
+            return 'stale'
+        return 'valid'
+
+    def ensure(self):
+        """Возвращает (cert_file, key_file), выпуская сертификат только при необходимости"""
+        if self.status() == 'missing':
+            print("🔧 Создание сертификата ECDSA P-256...")
+            if not self.generate():
+                return None, None
+            print(f"✅ SSL сертификат создан для: {', '.join(self.hosts)}")
+        else:
+            print("✅ SSL сертификат уже существует")
+        return self.cert_file, self.key_file
+
+    def create_context(self):
+        """SSLContext с сертификатом из кэша или None, если выпустить не удалось"""
+        cert_file, key_file = self.ensure()
+        if cert_file is None:
+            return None
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_file, key_file)
+        if self.status() == 'stale':
+            self.refresh_in_background(context)
+        return context
+
+    def refresh_in_background(self, context=None):
+        """Выпускает замену в фоновом потоке и подгружает её в context"""
+        def refresh():
+            if self.generate() and context is not None:
+                context.load_cert_chain(self.cert_file, self.key_file)
+                print(f"🔄 Сертификат обновлён для: {', '.join(self.hosts)}")
+
+        print("🔄 Сертификат устарел или не покрывает все адреса - обновляем в фоне")
+        thread = threading.Thread(target=refresh, name='cert-refresh', daemon=True)
+        thread.start()
+        return thread
+
+    def generate(self):
+        """Выпускает сертификат во временном каталоге и атомарно подменяет файлы"""
+        os.makedirs(self.directory, exist_ok=True)
+        workdir = tempfile.mkdtemp(prefix='.cert-', dir=self.directory)
+        try:
+            cert_file = os.path.join(workdir, 'cert.pem')
+            key_file = os.path.join(workdir, 'key.pem')
+            try:
+                openssl_certificate(cert_file, key_file, self.hosts, self.days)
+            except FileNotFoundError:
+                try:
+                    python_certificate(cert_file, key_file, self.hosts, self.days)
+                except ImportError:
+                    print("❌ Нужен OpenSSL или пакет cryptography (pip install cryptography)")
+                    return False
+            except subprocess.CalledProcessError as e:
+                print(f"❌ Ошибка OpenSSL: {e.stderr.strip()}")
+                return False
+            os.chmod(key_file, 0o600)
+            meta = {
+                'hosts': self.hosts,
+                'not_after': time.time() + self.days * 24 * 3600,
+                'key': 'ecdsa-p256',
+            }
+            with open(os.path.join(workdir, 'cert.json'), 'w') as f:
+                json.dump(meta, f)
+            os.replace(key_file, self.key_file)
+            os.replace(cert_file, self.cert_file)
+            # Описание последним: до него кэш считается неполным
+            os.replace(os.path.join(workdir, 'cert.json'), self.meta_file)
+            return True
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def subject_alt_names(hosts):
+    return ','.join(f"IP:{host}" if is_ip(host) else f"DNS:{host}" for host in hosts)
+
+
+def openssl_certificate(cert_file, key_file, hosts, days):
+    """Один вызов openssl: ключ P-256 генерируется за миллисекунды, а не секунды как RSA 4096"""
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1',
+        '-nodes', '-keyout', key_file, '-out', cert_file, '-days', str(days),
+        '-subj', '/O=WebAR/CN=localhost',
+        '-addext', f'subjectAltName={subject_alt_names(hosts)}',
+        '-addext', 'extendedKeyUsage=serverAuth',
+    ], check=True, capture_output=True, text=True)
+
+
+def python_certificate(cert_file, key_file, hosts, days):
+    """Запасной путь без OpenSSL (Windows) через пакет cryptography"""
+    from datetime import datetime, timedelta, timezone
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'WebAR'),
+        x509.NameAttribute(NameOID.COMMON_NAME, 'localhost'),
+    ])
+    names = [x509.IPAddress(ipaddress.ip_address(host)) if is_ip(host) else x509.DNSName(host)
+             for host in hosts]
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=days))
+        .add_extension(x509.SubjectAlternativeName(names), critical=False)
+        .add_extension(x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    with open(key_file, 'wb') as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()))
+    with open(cert_file, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
@@ -0,0 +1,112 @@
+"""
+Предсжатые gzip/deflate варианты файлов и выбор по Accept-Encoding
+"""
+
+import gzip
+import os
+import tempfile
+import zlib
+
+# Сжимаем только текст: картинки, видео и .glb уже сжаты
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'application/wasm',
+    'image/svg+xml',
+    'model/gltf+json',
+)
+MIN_COMPRESS_SIZE = 256
+ENCODINGS = ('gzip', 'deflate')
+
+
+def is_compressible(content_type, size):
+    return size >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def parse_accept_encoding(header):
+    """Разбирает Accept-Encoding в словарь {кодировка: q}"""
+    accepted = {}
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def negotiate(header, available):
+    """Выбирает лучшую из доступных кодировок или None для исходных байт"""
+    if not available or not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    # Порядок ENCODINGS задаёт предпочтение сервера при равном q
+    for coding in ENCODINGS:
+        if coding not in available:
+            continue
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def build_variants(path, body, stat, persist=False):
+    """Сжимает содержимое один раз на версию файла
+
+    Возвращает только варианты, которые меньше оригинала. При persist=True
+    gzip вариант сохраняется рядом как <файл>.gz с mtime исходника и при
+    следующем запуске читается оттуда вместо повторного сжатия.
+    """
+    variants = {}
+    gzipped = _read_static_gzip(path, stat) if persist else None
+    if gzipped is None:
+        # mtime=0 делает результат детерминированным (одинаковый ETag)
+        gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        if persist and len(gzipped) < len(body):
+            _write_static_gzip(path, gzipped, stat)
+    if len(gzipped) < len(body):
+        variants['gzip'] = gzipped
+    # В HTTP "deflate" - это поток zlib, а не голый deflate
+    deflated = zlib.compress(body, 9)
+    if len(deflated) < len(body):
+        variants['deflate'] = deflated
+    return variants
+
+
+def _read_static_gzip(path, stat):
+    try:
+        gz_stat = os.stat(path + '.gz')
+        if gz_stat.st_mtime_ns != stat.st_mtime_ns:
+            return None
+        with open(path + '.gz', 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_static_gzip(path, data, stat):
+    directory = os.path.dirname(path) or '.'
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix='.gz-', dir=directory)
+    except OSError:
+        # Каталог только для чтения - обойдёмся вариантом в памяти
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, path + '.gz')
+    except OSError:
+        os.unlink(tmp_path)
@@ -0,0 +1,320 @@
+"""
+Индекс метаданных раздаваемого каталога: пути, stat, MIME типы и листинги
+
+Без индекса запрос файла стоит несколько системных вызовов (isdir, isfile,
+stat для проверки кэша), а листинг каталога - listdir и stat на каждый
+элемент. Индекс держит результаты scandir в памяти: каталог сканируется
+при первом обращении, stat файла берётся один раз, листинг собирается один
+раз на адрес. Запрос, заставший индекс старше REFRESH_INTERVAL,
+перепроверяет известные каталоги: пересканирует только те, у которых
+сменился mtime, а в остальных заново читает stat уже отданных файлов.
+Изменение файла становится видно не позже чем через REFRESH_INTERVAL.
+
+Скрытые каталоги (.git и т.п.) и всё за пределами корня не индексируются:
+такие запросы идут в файловую систему как раньше.
+"""
+
+import errno
+import html
+import os
+import threading
+import time
+import urllib.parse
+
+REFRESH_INTERVAL = 1.0
+# Дерево больше этого не индексируется целиком: остальные каталоги - напрямую
+MAX_ENTRIES = 100000
+# Листингов на каталог (адрес с разными ?query - разные листинги)
+MAX_LISTINGS = 16
+# Запомненных путей запросов (сканер с тысячами 404 не раздует память)
+MAX_PATHS = 10000
+
+# Пути нет в проиндексированном каталоге
+_ABSENT = object()
+# Сам корень: для него нет _Node в родительском каталоге
+_ROOT = object()
+# Путь вне индекса (запомненный результат)
+_OUTSIDE = object()
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def render_listing(url_path, entries):
+    """HTML листинг каталога в формате SimpleHTTPRequestHandler
+
+    entries - (имя, каталог ли, ссылка ли), уже отсортированные.
+    """
+    displaypath = html.escape(urllib.parse.unquote(url_path), quote=False)
+    title = f'Directory listing for {displaypath}'
+    lines = ['<!DOCTYPE HTML>', '<html lang="en">', '<head>',
+             '<meta charset="utf-8">', f'<title>{title}</title>', '</head>',
+             '<body>', f'<h1>{title}</h1>', '<hr>', '<ul>']
+    for name, is_dir, is_link in entries:
+        displayname = linkname = name
+        if is_dir:
+            displayname = linkname = name + '/'
+        if is_link:
+            displayname = name + '@'
+        lines.append('<li><a href="%s">%s</a></li>' % (
+            urllib.parse.quote(linkname, errors='surrogatepass'),
+            html.escape(displayname, quote=False)))
+    lines.extend(['</ul>', '<hr>', '</body>', '</html>', ''])
+    return '\n'.join(lines).encode('utf-8', 'surrogateescape')
+
+
+def list_directory(path, url_path):
+    """Листинг каталога прямо с диска или None, если его нельзя прочитать"""
+    try:
+        names = sorted(os.listdir(path), key=lambda a: a.lower())
+    except OSError:
+        return None
+    entries = []
+    for name in names:
+        fullname = os.path.join(path, name)
+        entries.append((name, os.path.isdir(fullname), os.path.islink(fullname)))
+    return render_listing(url_path, entries)
+
+
+class _Node:
+    """Элемент каталога: тип из scandir, stat и MIME тип по первому запросу"""
+
+    __slots__ = ('entry', 'is_dir', 'is_file', 'loaded_stat', 'content_type')
+
+    def __init__(self, entry):
+        self.entry = entry
+        try:
+            # Для ссылок scandir сделает stat, для остальных хватит d_type
+            self.is_dir = entry.is_dir()
+            self.is_file = entry.is_file()
+        except OSError:
+            self.is_dir = self.is_file = False
+        self.loaded_stat = None
+        self.content_type = None
+
+
+class _Directory:
+    __slots__ = ('mtime_ns', 'nodes', 'names', 'listings')
+
+    def __init__(self, mtime_ns, nodes):
+        self.mtime_ns = mtime_ns
+        self.nodes = nodes
+        self.names = sorted(nodes, key=str.lower)
+        self.listings = {}
+
+
+class FileIndex:
+    """Метаданные дерева каталогов в памяти с ленивым сканированием
+
+    Методы повторяют os.stat, os.path.isdir/isfile/exists: для путей вне
+    индекса они и вызываются.
+    """
+
+    def __init__(self, root, interval=REFRESH_INTERVAL, max_entries=MAX_ENTRIES):
+        self.root = os.path.abspath(root)
+        self.interval = interval
+        self.max_entries = max_entries
+        self._prefix = self.root.rstrip(os.sep) + os.sep
+        self.entries = 0
+        self.scans = 0
+        self._dirs = {}
+        # Полный путь запроса -> _Node, _ABSENT, _ROOT или _OUTSIDE
+        self._paths = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._next_refresh = time.monotonic() + interval
+
+    # Поиск
+
+    def _absolute(self, path):
+        return path if os.path.isabs(path) else os.path.join(self.root, path)
+
+    def _directory(self, path):
+        """_Directory, _ABSENT (каталога нет) или None (вне индекса)"""
+        directory = self._dirs.get(path)
+        if directory is not None:
+            return directory
+        if path != self.root:
+            parent, name = os.path.split(path)
+            if not name or name.startswith('.'):
+                return None
+            container = self._directory(parent)
+            if container is None or container is _ABSENT:
+                return container
+            node = container.nodes.get(name)
+            if node is None or not node.is_dir:
+                return _ABSENT
+        return self._scan(path)
+
+    def _scan(self, path):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                nodes = {entry.name: _Node(entry) for entry in it}
+        except OSError:
+            return None
+        with self._lock:
+            previous = self._dirs.pop(path, None)
+            if previous is not None:
+                self.entries -= len(previous.nodes)
+                self._paths = {}
+            if self.entries + len(nodes) > self.max_entries:
+                return None
+            directory = self._dirs[path] = _Directory(mtime_ns, nodes)
+            self.entries += len(nodes)
+            self.scans += 1
+        return directory
+
+    def _node(self, path):
+        """_Node, _ABSENT, _ROOT или None (путь вне индекса)"""
+        if time.monotonic() >= self._next_refresh:
+            self._maybe_refresh()
+        node = self._paths.get(path)
+        if node is None:
+            node = self._resolve(path)
+            paths = self._paths
+            if len(paths) >= MAX_PATHS:
+                paths = self._paths = {}
+            paths[path] = node
+        return None if node is _OUTSIDE else node
+
+    def _resolve(self, path):
+        absolute = self._absolute(path)
+        need_dir = absolute.endswith(os.sep) and absolute != os.sep
+        absolute = absolute.rstrip(os.sep) or os.sep
+        if absolute == self.root:
+            return _OUTSIDE if self._directory(absolute) is None else _ROOT
+        if not absolute.startswith(self._prefix):
+            return _OUTSIDE
+        parent, name = os.path.split(absolute)
+        directory = self._directory(parent)
+        if directory is None:
+            return _OUTSIDE
+        if directory is _ABSENT:
+            return _ABSENT
+        node = directory.nodes.get(name)
+        if node is None or (need_dir and not node.is_dir):
+            return _ABSENT
+        return node
+
+    def stat(self, path):
+        node = self._node(path)
+        if node is None or node is _ROOT:
+            return os.stat(path)
+        if node is _ABSENT:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        stat = node.loaded_stat
+        if stat is None:
+            try:
+                stat = node.loaded_stat = node.entry.stat()
+            except OSError:
+                # Файл удалён после сканирования
+                return os.stat(path)
+        return stat
+
+    def isdir(self, path):
+        node = self._node(path)
+        if node is None:
+            return os.path.isdir(path)
+        return node is _ROOT or (node is not _ABSENT and node.is_dir)
+
+    def isfile(self, path):
+        node = self._node(path)
+        if node is None:
+            return os.path.isfile(path)
+        return node is not _ABSENT and node is not _ROOT and node.is_file
+
+    def exists(self, path):
+        node = self._node(path)
+        if node is None:
+            return os.path.exists(path)
+        return node is not _ABSENT
+
+    def content_type(self, path, guess_type):
+        """MIME тип файла, посчитанный guess_type один раз на файл"""
+        node = self._node(path)
+        if node is None or node is _ABSENT or node is _ROOT:
+            return guess_type(path)
+        if node.content_type is None:
+            node.content_type = guess_type(path)
+        return node.content_type
+
+    def listing(self, path, url_path):
+        """HTML листинг каталога (собирается один раз на адрес) или None"""
+        if time.monotonic() >= self._next_refresh:
+            self._maybe_refresh()
+        path = self._absolute(path).rstrip(os.sep) or os.sep
+        directory = None
+        if path == self.root or path.startswith(self._prefix):
+            directory = self._directory(path)
+        if directory is _ABSENT:
+            return None
+        if directory is None:
+            return list_directory(path, url_path)
+        body = directory.listings.get(url_path)
+        if body is None:
+            entries = []
+            for name in directory.names:
+                node = directory.nodes[name]
+                try:
+                    is_link = node.entry.is_symlink()
+                except OSError:
+                    is_link = False
+                entries.append((name, node.is_dir, is_link))
+            body = render_listing(url_path, entries)
+            if len(directory.listings) >= MAX_LISTINGS:
+                directory.listings.clear()
+            directory.listings[url_path] = body
+        return body
+
+    # Обновление
+
+    def _maybe_refresh(self):
+        # Обновляет один поток; остальные тем временем работают со старым индексом
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_refresh = time.monotonic() + self.interval
+            self.refresh()
+        finally:
+            self._refresh_lock.release()
+
+    def refresh(self):
+        """Перепроверяет известные каталоги и уже прочитанные stat файлов"""
+        for path, directory in list(self._dirs.items()):
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                with self._lock:
+                    if self._dirs.get(path) is directory:
+                        del self._dirs[path]
+                        self.entries -= len(directory.nodes)
+                        self._paths = {}
+                continue
+            if mtime_ns != directory.mtime_ns:
+                # Файлы добавлены, удалены или переименованы
+                self._scan(path)
+                continue
+            for name, node in list(directory.nodes.items()):
+                if node.loaded_stat is None:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(path, name))
+                except OSError:
+                    continue
+                if (stat.st_mtime_ns, stat.st_size, stat.st_ino) != (
+                        node.loaded_stat.st_mtime_ns, node.loaded_stat.st_size,
+                        node.loaded_stat.st_ino):
+                    node.loaded_stat = stat
+
+    def stats(self):
+        return {'directories': len(self._dirs), 'entries': self.entries, 'scans': self.scans}
+
+
+def shared_index(root):
+    """Один индекс на каталог для всего процесса (скрипт запуска и сервер)"""
+    root = os.path.abspath(root)
+    with _shared_lock:
+        index = _shared.get(root)
+        if index is None:
+            index = _shared[root] = FileIndex(root)
+        return index
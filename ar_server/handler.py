@@ -0,0 +1,538 @@
+"""
+Общий обработчик запросов и наборы заголовков для веб-AR
+"""
+
+import io
+import mimetypes
+import os
+import select
+import ssl
+import time
+import urllib.parse
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler
+
+from .build import ASSETS_PREFIX
+from .cache import FileEntry
+from .compress import negotiate
+from .livereload import LIVE_RELOAD_PATH, MAX_SUBSCRIBERS, event_stream_prologue
+from .metrics import METRICS_PATH
+from .options import DEFAULT_KEEP_ALIVE_TIMEOUT, DEFAULT_MAX_REQUESTS
+from .preload import early_hints_response
+from .qr import QR_PATHS
+from .ranges import RangeBody, RangeNotSatisfiable, plan_ranges
+from .telemetry import MAX_BODY, TELEMETRY_PATH, parse_report
+from .useragent import device_icon, device_kind  # noqa: F401 (реэкспорт)
+from .vendor import VENDOR_PREFIX, origin_url
+
+# CORS заголовки для AR
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+)
+
+# Заголовки для камеры на мобильных
+CAMERA_HEADERS = (
+    ('Permissions-Policy', 'camera=*, microphone=*'),
+    ('Feature-Policy', 'camera *; microphone *'),
+)
+
+# Заголовки изоляции (нужны для SharedArrayBuffer и WebXR)
+ISOLATION_HEADERS = (
+    ('Cross-Origin-Embedder-Policy', 'credentialless'),
+    ('Cross-Origin-Opener-Policy', 'same-origin'),
+)
+
+# Копии CDN и собранные файлы содержат версию или хэш в пути
+IMMUTABLE_PREFIXES = (VENDOR_PREFIX, ASSETS_PREFIX)
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+COPY_BUFFER_SIZE = 256 * 1024
+
+# Ошибки на разобранный GET/HEAD, после которых соединение можно продолжать
+# (стандартный send_error закрывает его после любой ошибки)
+KEEP_ALIVE_ERRORS = frozenset({HTTPStatus.FORBIDDEN, HTTPStatus.NOT_FOUND})
+# Как часто простаивающее keep-alive соединение проверяет очередь пула
+IDLE_POLL_INTERVAL = 0.05
+
+
+def guess_type(path, extensions_map=SimpleHTTPRequestHandler.extensions_map):
+    """MIME тип файла по тем же правилам, что у SimpleHTTPRequestHandler"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in extensions_map:
+        return extensions_map[ext]
+    guess, _ = mimetypes.guess_type(path)
+    return guess or 'application/octet-stream'
+
+
+def is_hidden(url_path):
+    """Есть ли в адресе скрытый сегмент (.git, .certs, .env): такие адреса - 404"""
+    path = urllib.parse.unquote(urllib.parse.urlsplit(url_path).path)
+    return any(part.startswith('.') for part in path.split('/'))
+
+
+def cache_control(url_path, content_type, revalidate=False):
+    """Год для файлов с версией в пути, проверка при каждом заходе для HTML
+
+    revalidate (--live-reload) - проверка и для остальных файлов: правка
+    скрипта видна после перезагрузки, а не через эвристический срок кэша.
+    """
+    if urllib.parse.urlsplit(url_path).path.startswith(IMMUTABLE_PREFIXES):
+        return IMMUTABLE
+    if revalidate or content_type.startswith('text/html'):
+        return 'no-cache'
+    return None
+
+
+class ARRequestHandler(SimpleHTTPRequestHandler):
+    """Статический обработчик с декларативным набором доп. заголовков
+
+    Заголовки задаются атрибутом extra_headers, чтобы их мог использовать
+    и асинхронный движок, которому не нужен экземпляр обработчика.
+    """
+
+    extra_headers = ()
+    # Keep-alive: страница, скрипты и текстуры идут по одному соединению
+    # (и по одному TLS рукопожатию)
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными записями: без TCP_NODELAY второй
+    # пакет ждёт отложенного ACK клиента (заметно на TLS и keep-alive)
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # Таймаут соединения задаётся сервером (--timeout)
+        self.timeout = getattr(self.server, 'connection_timeout', self.timeout)
+        self.connection_requests = 0
+        super().setup()
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+
+    def wait_for_request(self):
+        """Ждёт следующий запрос keep-alive соединения; False - закрыть его
+
+        Простаивающее соединение держит рабочий поток, поэтому ожидание
+        ограничено --keep-alive-timeout и прерывается, как только другое
+        соединение ждёт свободный поток.
+        """
+        if self.request_buffered():
+            return True
+        deadline = time.monotonic() + getattr(
+            self.server, 'keep_alive_timeout', DEFAULT_KEEP_ALIVE_TIMEOUT)
+        connections_waiting = getattr(self.server, 'connections_waiting', None)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select(
+                [self.connection], [], [], min(remaining, IDLE_POLL_INTERVAL))
+            if readable:
+                return True
+            if connections_waiting is not None and connections_waiting():
+                return False
+
+    def request_buffered(self):
+        """Есть ли уже прочитанные, но не разобранные байты следующего запроса"""
+        # select не видит данные в буфере rfile и в расшифрованных TLS
+        # записях: заглядываем в буфер без блокировки
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def parse_request(self):
+        self.request_started = time.perf_counter()
+        self.connection_requests += 1
+        try:
+            return super().parse_request()
+        finally:
+            # Заголовки прочитаны (или разбор не удался) - дедлайн снят
+            if self.read_deadlines is not None:
+                self.read_deadlines.finish(self.connection)
+
+    def handle_one_request(self):
+        self.logged_status = None
+        self.response_length = '-'
+        self.request_started = None
+        self.connection_header_sent = False
+        self.error_keeps_connection = False
+        # Заголовки запроса должны прийти целиком за --header-timeout
+        self.read_deadlines = getattr(self.server, 'read_deadlines', None)
+        if self.read_deadlines is not None:
+            self.read_deadlines.start(self.connection)
+        try:
+            super().handle_one_request()
+        finally:
+            if self.read_deadlines is not None:
+                self.read_deadlines.finish(self.connection)
+        # В журнал и метрики пишем после ответа, когда известен Content-Length
+        if self.logged_status is None:
+            return
+        headers = getattr(self, 'headers', None)
+        user_agent = headers.get('User-Agent', '') if headers else ''
+        metrics = getattr(self.server, 'metrics', None)
+        if metrics is not None and self.request_started is not None:
+            size = self.response_length
+            if self.command == 'HEAD' or not isinstance(size, int):
+                size = 0
+            metrics.record(self.path if self.command else '-', self.logged_status, size,
+                           time.perf_counter() - self.request_started, user_agent)
+        access_log = getattr(self.server, 'access_log', None)
+        if access_log is not None and getattr(self.server, 'log_requests', True):
+            access_log.log(self.client_address[0], user_agent, self.requestline,
+                           self.logged_status, self.response_length,
+                           self.connection_requests)
+
+    def log_request(self, code='-', size='-'):
+        self.logged_status = code.value if isinstance(code, HTTPStatus) else code
+        if (getattr(self.server, 'access_log', None) is None
+                and getattr(self.server, 'log_requests', True)):
+            super().log_request(code, size)
+
+    def send_error(self, code, message=None, explain=None):
+        self.error_keeps_connection = (
+            code in KEEP_ALIVE_ERRORS and getattr(self, 'command', None) in ('GET', 'HEAD')
+            and not self.close_connection)
+        super().send_error(code, message, explain)
+
+    def send_header(self, keyword, value):
+        keyword_lower = keyword.lower()
+        if keyword_lower == 'content-length':
+            self.response_length = int(value)
+        elif keyword_lower == 'connection':
+            if self.error_keeps_connection:
+                # Connection: close из стандартного send_error после 404
+                self.error_keeps_connection = False
+                return
+            self.connection_header_sent = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        for name, value in self.extra_headers:
+            self.send_header(name, value)
+        # Промежуточный 100 Continue не логируется и Connection не получает
+        if self.logged_status is not None and not self.connection_header_sent:
+            self.send_connection_headers()
+        super().end_headers()
+
+    def send_connection_headers(self):
+        """Connection и Keep-Alive по запросу клиента и лимитам сервера"""
+        max_requests = getattr(self.server, 'max_requests', DEFAULT_MAX_REQUESTS)
+        # Без Content-Length конец тела - только закрытие соединения
+        delimited = (self.response_length != '-' or self.command == 'HEAD'
+                     or self.logged_status in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED))
+        if self.close_connection or self.connection_requests >= max_requests or not delimited:
+            self.send_header('Connection', 'close')
+            return
+        timeout = getattr(self.server, 'keep_alive_timeout', DEFAULT_KEEP_ALIVE_TIMEOUT)
+        self.send_header('Connection', 'keep-alive')
+        self.send_header('Keep-Alive',
+                         f'timeout={int(timeout)}, max={max_requests - self.connection_requests}')
+
+    def send_head(self):
+        admission = getattr(self.server, 'admission', None)
+        if admission is not None:
+            retry_after = admission.allow_request(self.client_address[0])
+            if retry_after:
+                return self.send_retry_after(HTTPStatus.TOO_MANY_REQUESTS, retry_after)
+        metrics = getattr(self.server, 'metrics', None)
+        qr_codes = getattr(self.server, 'qr_codes', None)
+        telemetry = getattr(self.server, 'telemetry', None)
+        live_reload = getattr(self.server, 'live_reload', None)
+        if (metrics is not None or qr_codes is not None or telemetry is not None
+                or live_reload is not None):
+            url = urllib.parse.urlsplit(self.path)
+            if live_reload is not None and url.path == LIVE_RELOAD_PATH:
+                return self.send_event_stream(live_reload)
+            if telemetry is not None and url.path == TELEMETRY_PATH:
+                return self.send_bytes(*telemetry.render(url.query))
+            if metrics is not None and url.path == METRICS_PATH:
+                return self.send_bytes(*metrics.render(
+                    url.query, getattr(self.server, 'tls_stats', None), admission))
+            if qr_codes is not None and url.path in QR_PATHS:
+                rendered = qr_codes.render(self.path)
+                if rendered is None:
+                    # Причина в строке статуса - latin-1, поэтому текст в теле ответа
+                    self.send_error(HTTPStatus.NOT_FOUND, None,
+                                    "QR код недоступен (на сервере нужен пакет qrcode)")
+                    return None
+                return self.send_bytes(*rendered)
+        if is_hidden(self.path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        index = getattr(self.server, 'file_index', None)
+        path = self.translate_path(self.path)
+        file_path = self.resolve_file(path)
+        if file_path is None:
+            if index is None:
+                # Редиректы каталогов, листинги и 404 - как у стандартного обработчика
+                return super().send_head()
+            if index.isdir(path):
+                return self.send_directory(path)
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        preload = getattr(self.server, 'preload', None)
+        if preload is not None and preload.early_hints:
+            self.send_early_hints(preload.early(file_path, self.path))
+        cache = getattr(self.server, 'asset_cache', None)
+        entry = None
+        if cache:
+            entry = cache.get(file_path, self.guess_type,
+                              index.stat if index is not None else os.stat)
+        if entry is None and (index is None or index.exists(file_path)):
+            entry = FileEntry.open(file_path, self.guess_type)
+        if entry is None:
+            return self.send_missing()
+        if live_reload is not None:
+            live_reload.watch(file_path)
+        try:
+            return self.send_entry_head(entry, cache)
+        except Exception:
+            entry.close()
+            raise
+
+    def do_POST(self):
+        """Замеры страниц на /__telemetry (--telemetry); другие POST не поддерживаются"""
+        telemetry = getattr(self.server, 'telemetry', None)
+        # Пока тело не прочитано, соединение после ответа не переиспользуется
+        self.close_connection = True
+        if telemetry is None or urllib.parse.urlsplit(self.path).path != TELEMETRY_PATH:
+            self.send_error(HTTPStatus.NOT_IMPLEMENTED, "Unsupported method ('POST')")
+            return
+        admission = getattr(self.server, 'admission', None)
+        if admission is not None:
+            retry_after = admission.allow_request(self.client_address[0])
+            if retry_after:
+                self.send_retry_after(HTTPStatus.TOO_MANY_REQUESTS, retry_after)
+                return
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self.send_error(HTTPStatus.LENGTH_REQUIRED)
+            return
+        if not 0 <= length <= MAX_BODY:
+            self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            return
+        # Тело - под тем же дедлайном, что и заголовки (--header-timeout)
+        deadlines = getattr(self.server, 'read_deadlines', None)
+        if deadlines is not None:
+            deadlines.start(self.connection)
+        try:
+            body = self.rfile.read(length)
+        finally:
+            if deadlines is not None:
+                deadlines.finish(self.connection)
+        if len(body) < length:
+            return
+        self.close_connection = False
+        try:
+            accepted = telemetry.add(self.headers.get('User-Agent', ''), parse_report(body))
+        except ValueError as error:
+            self.send_error(HTTPStatus.BAD_REQUEST, "Bad telemetry report", str(error))
+            return
+        if not accepted:
+            self.send_retry_after(HTTPStatus.SERVICE_UNAVAILABLE, 1)
+            return
+        self.send_response(HTTPStatus.NO_CONTENT)
+        self.end_headers()
+
+    def do_OPTIONS(self):
+        """Предварительный CORS запрос: ответ - заголовки Access-Control-* без тела"""
+        self.send_response(HTTPStatus.NO_CONTENT)
+        self.end_headers()
+
+    def send_entry_head(self, entry, cache):
+        encoding = negotiate(self.headers.get('Accept-Encoding'), entry.variants)
+        body, etag = entry.representation(encoding)
+        length = entry.length(encoding)
+        if entry.not_modified(self.headers.get('If-None-Match'),
+                              self.headers.get('If-Modified-Since')):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_entry_validators(entry, etag)
+            self.end_headers()
+            entry.close()
+            return None
+
+        # Range определён только для GET
+        range_header = self.headers.get('Range') if self.command == 'GET' else None
+        try:
+            status, headers, parts, tail = plan_ranges(
+                range_header, self.headers.get('If-Range'), etag,
+                entry.last_modified, length, entry.content_type)
+        except RangeNotSatisfiable:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{length}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            entry.close()
+            return None
+
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_entry_validators(entry, etag)
+        preload = getattr(self.server, 'preload', None)
+        if preload is not None and status == HTTPStatus.OK:
+            link = preload.link(entry.path, self.path, entry)
+            if link:
+                self.send_header('Link', link)
+        self.end_headers()
+        if cache is not None and self.command == 'GET' and status == HTTPStatus.OK:
+            cache.record_sent(entry, encoding, length)
+        return RangeBody(body, parts, tail)
+
+    def copyfile(self, source, outputfile):
+        if isinstance(source, RangeBody):
+            for prefix, offset, count in source.parts:
+                if prefix:
+                    outputfile.write(prefix)
+                self.copy_range(source.source, offset, count, outputfile)
+            if source.tail:
+                outputfile.write(source.tail)
+        elif isinstance(source, io.BytesIO):
+            # Тело из памяти: отдаём буфер без копии в bytes
+            outputfile.write(source.getbuffer())
+        else:
+            super().copyfile(source, outputfile)
+
+    def copy_range(self, source, offset, count, outputfile):
+        """Отдаёт count байт с offset кусками фиксированного размера"""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)[offset:offset + count]
+            for position in range(0, len(view), COPY_BUFFER_SIZE):
+                outputfile.write(view[position:position + COPY_BUFFER_SIZE])
+            return
+        if getattr(self.server, 'use_sendfile', True) and not isinstance(
+                self.connection, ssl.SSLSocket):
+            # Копирование файл -> сокет в ядре через os.sendfile
+            self.connection.sendfile(source, offset, count)
+            return
+        # TLS шифрует в user space: читаем в один переиспользуемый буфер
+        source.seek(offset)
+        buffer = bytearray(min(COPY_BUFFER_SIZE, max(count, 1)))
+        view = memoryview(buffer)
+        while count > 0:
+            size = source.readinto(view[:min(count, len(buffer))])
+            if not size:
+                break
+            outputfile.write(view[:size])
+            count -= size
+
+    def send_entry_validators(self, entry, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', entry.last_modified)
+        if entry.variants:
+            self.send_header('Vary', 'Accept-Encoding')
+        control = cache_control(self.path, entry.content_type,
+                                getattr(self.server, 'live_reload', None) is not None)
+        if control:
+            self.send_header('Cache-Control', control)
+
+    def send_early_hints(self, link):
+        """103 Early Hints до основного ответа; клиенты HTTP/1.0 1xx не ждут"""
+        if link and self.command == 'GET' and self.request_version == 'HTTP/1.1':
+            self.wfile.write(early_hints_response(link))
+
+    def send_event_stream(self, live_reload):
+        """Подписка на /__livereload: после заголовков сокет уходит потоку слежения"""
+        if live_reload.subscribers() >= MAX_SUBSCRIBERS:
+            return self.send_retry_after(HTTPStatus.SERVICE_UNAVAILABLE, 5)
+        self.close_connection = True
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        if self.command == 'GET':
+            self.wfile.write(event_stream_prologue(live_reload.boot))
+            live_reload.adopt(self.connection)
+        return None
+
+    def send_retry_after(self, status, retry_after):
+        """Быстрый отказ без тела: клиент повторит через retry_after секунд"""
+        self.send_response(status)
+        self.send_header('Retry-After', str(retry_after))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return None
+
+    def send_bytes(self, body, content_type):
+        """Ответ 200 из памяти для служебных адресов (не кэшируется)"""
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def send_directory(self, path):
+        """Каталог без index.html: редирект на адрес со слешем или листинг"""
+        parts = urllib.parse.urlsplit(self.path)
+        if not parts.path.endswith('/'):
+            self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+            self.send_header('Location', urllib.parse.urlunsplit(
+                (parts[0], parts[1], parts[2] + '/', parts[3], parts[4])))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        return self.list_directory(path)
+
+    def list_directory(self, path):
+        file_index = getattr(self.server, 'file_index', None)
+        if file_index is None:
+            return super().list_directory(path)
+        body = file_index.listing(path, self.path)
+        if body is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "No permission to list directory")
+            return None
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def guess_type(self, path):
+        file_index = getattr(self.server, 'file_index', None)
+        if file_index is None:
+            return super().guess_type(path)
+        return file_index.content_type(path, super().guess_type)
+
+    def send_missing(self):
+        """404, а для отсутствующей копии из vendor/ - редирект на CDN"""
+        location = origin_url(self.path)
+        if location is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        self.send_response(HTTPStatus.FOUND)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return None
+
+    def resolve_file(self, path):
+        """Путь к файлу для ответа или None (редирект, листинг, 404)"""
+        file_index = getattr(self.server, 'file_index', None)
+        if file_index is not None:
+            isdir, isfile = file_index.isdir, file_index.isfile
+        else:
+            isdir, isfile = os.path.isdir, os.path.isfile
+        if isdir(path):
+            if not urllib.parse.urlsplit(self.path).path.endswith('/'):
+                return None
+            for index in ('index.html', 'index.htm'):
+                index = os.path.join(path, index)
+                if isfile(index):
+                    return index
+            return None
+        if path.endswith('/'):
+            return None
+        return path
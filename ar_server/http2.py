@@ -0,0 +1,749 @@
+"""
+HTTP/2 для HTTPS серверов (--http2): ALPN h2 с откатом на HTTP/1.1
+
+Страница A-Frame тянет десятки скриптов и текстур. По HTTP/1.1 браузер
+держит до 6 соединений, и каждое на мобильном канале платит своим TCP и
+TLS рукопожатием, а седьмой файл ждёт, пока освободится одно из них. По
+HTTP/2 все запросы - потоки одного соединения: кадры DATA разных ответов
+чередуются в пределах окон управления потоком клиента, а одинаковые
+заголовки ответов (CORS, Permissions-Policy, Server) после первого ответа
+HPACK кодирует индексом динамической таблицы в один-два байта.
+
+Кадры, HPACK и окна считает пакет h2 (pip install h2); он импортируется
+только с --http2, а без него сервер говорит HTTP/1.1. Сессия сама не
+читает и не пишет сокет: движок threads ведёт её в рабочем потоке
+соединения через select(), asyncio - в задаче соединения.
+"""
+
+import asyncio
+import collections
+import email.utils
+import html
+import os
+import select
+import socket
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler
+
+from .cache import FileEntry
+from .compress import negotiate
+from .fsindex import list_directory
+from .handler import (
+    IDLE_POLL_INTERVAL, cache_control, device_icon, guess_type, is_hidden,
+)
+from .livereload import LIVE_RELOAD_PATH, MAX_SUBSCRIBERS, event_stream_prologue
+from .metrics import METRICS_PATH
+from .options import DEFAULT_KEEP_ALIVE_TIMEOUT, DEFAULT_TIMEOUT
+from .qr import QR_PATHS
+from .ranges import RangeNotSatisfiable, plan_ranges
+from .telemetry import MAX_BODY, TELEMETRY_PATH, parse_report
+from .vendor import origin_url
+
+H2_ALPN = ('h2', 'http/1.1')
+# Потоков одновременно на соединение (браузер открывает их сразу для всех файлов)
+MAX_STREAMS = 100
+# Байт DATA за один проход отправки: между проходами читаются WINDOW_UPDATE
+# и новые запросы
+SEND_BUDGET = 256 * 1024
+FILE_CHUNK = 64 * 1024
+# Неотправленных событий /__livereload на поток
+MAX_QUEUED_EVENTS = 16
+READ_SIZE = 65536
+SERVER_HEADER = f'{SimpleHTTPRequestHandler.server_version} {SimpleHTTPRequestHandler.sys_version}'
+# Заголовки уровня соединения HTTP/1.1 в HTTP/2 запрещены
+CONNECTION_HEADERS = frozenset({'connection', 'keep-alive', 'transfer-encoding', 'upgrade'})
+
+
+def http2_available():
+    """Установлен ли пакет h2"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class H2Request:
+    """Запрос потока: те же поля, что у AsyncRequest"""
+
+    version = 'HTTP/2'
+
+    def __init__(self, headers, body):
+        self.headers = {}
+        pseudo = {}
+        for name, value in headers:
+            if name.startswith(':'):
+                pseudo[name] = value
+            elif name in self.headers:
+                separator = '; ' if name == 'cookie' else ', '
+                self.headers[name] += separator + value
+            else:
+                self.headers[name] = value
+        self.method = pseudo.get(':method', '')
+        self.path = pseudo.get(':path', '/')
+        self.headers.setdefault('host', pseudo.get(':authority', ''))
+        self.body = bytes(body)
+        self.requestline = f'{self.method} {self.path} HTTP/2'
+        self.started = time.perf_counter()
+        self.number = 1
+
+
+class _Response:
+    __slots__ = ('status', 'headers', 'chunks', 'entry', 'events', 'subscriber')
+
+    def __init__(self, status, headers, chunks=None, entry=None, events=None, subscriber=None):
+        self.status = status
+        self.headers = headers
+        self.chunks = chunks
+        self.entry = entry
+        self.events = events
+        self.subscriber = subscriber
+
+
+class _Stream:
+    """Тело ответа в отправке: куски итератора режутся по окну и кадру"""
+
+    __slots__ = ('stream_id', 'chunks', 'pending', 'entry', 'events', 'subscriber')
+
+    def __init__(self, stream_id, response):
+        self.stream_id = stream_id
+        self.chunks = response.chunks
+        self.entry = response.entry
+        # Поток событий /__livereload: куски добавляет поток слежения
+        self.events = response.events
+        self.subscriber = response.subscriber
+        self.pending = memoryview(b'')
+
+    def take(self, limit):
+        """Следующий кусок не больше limit; b'' - пока нечего, None - тело кончилось"""
+        while not self.pending:
+            if self.events is not None:
+                if not self.events:
+                    return b''
+                self.pending = memoryview(self.events.popleft())
+            else:
+                chunk = next(self.chunks, None)
+                if chunk is None:
+                    return None
+                self.pending = memoryview(chunk)
+        data, self.pending = self.pending[:limit], self.pending[limit:]
+        return data
+
+    def close(self):
+        if self.entry is not None:
+            self.entry.close()
+            self.entry = None
+
+
+def _body_chunks(source, parts, tail):
+    """Части буфера (срезы без копии) или файла (pread) в порядке ответа"""
+    for prefix, offset, count in parts:
+        if prefix:
+            yield prefix
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            yield memoryview(source)[offset:offset + count]
+            continue
+        fd = source.fileno()
+        while count > 0:
+            data = os.pread(fd, min(FILE_CHUNK, count), offset)
+            if not data:
+                return
+            yield data
+            offset += len(data)
+            count -= len(data)
+    if tail:
+        yield tail
+
+
+class _StreamSubscriber:
+    """Подписка /__livereload в потоке HTTP/2; вызывается из потока слежения"""
+
+    __slots__ = ('session', 'stream_id')
+
+    def __init__(self, session, stream_id):
+        self.session = session
+        self.stream_id = stream_id
+
+    def send(self, data):
+        return self.session.call_soon(partial(self.session.push, self.stream_id, data))
+
+    def close(self):
+        self.session.call_soon(partial(self.session.reset, self.stream_id))
+
+
+class H2Session:
+    """Одно соединение HTTP/2 без ввода-вывода: байты внутрь, кадры наружу
+
+    call_soon(fn) задаёт движок: выполнить fn в контексте соединения (нужно
+    потоку слежения --live-reload); без него события не принимаются.
+    """
+
+    def __init__(self, gateway, peer):
+        from h2.config import H2Configuration
+        from h2.connection import H2Connection
+        from h2.settings import SettingCodes, Settings
+
+        self.gateway = gateway
+        self.peer = peer
+        self.call_soon = lambda fn: False
+        self.conn = H2Connection(H2Configuration(client_side=False, header_encoding='utf-8'))
+        self.conn.local_settings = Settings(client=False, initial_values={
+            SettingCodes.MAX_CONCURRENT_STREAMS: MAX_STREAMS})
+        self.conn.initiate_connection()
+        # stream_id -> (заголовки, тело) запросов, тело которых ещё идёт
+        self.requests = {}
+        # stream_id -> _Stream ответов, тело которых ещё отправляется
+        self.streams = {}
+        self.served = 0
+        self.closed = False
+
+    def receive(self, data):
+        from h2 import events
+        from h2.exceptions import ProtocolError
+
+        try:
+            received = self.conn.receive_data(data)
+        except ProtocolError:
+            # h2 уже поставил GOAWAY в очередь отправки
+            self.closed = True
+            return
+        for event in received:
+            if isinstance(event, events.RequestReceived):
+                self.requests[event.stream_id] = (event.headers, bytearray())
+                if event.stream_ended:
+                    self._request(event.stream_id)
+            elif isinstance(event, events.DataReceived):
+                self.conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id)
+                pending = self.requests.get(event.stream_id)
+                if pending is None:
+                    continue
+                pending[1].extend(event.data)
+                if len(pending[1]) > MAX_BODY:
+                    self.reset(event.stream_id)
+                elif event.stream_ended:
+                    self._request(event.stream_id)
+            elif isinstance(event, events.StreamEnded):
+                if event.stream_id in self.requests:
+                    self._request(event.stream_id)
+            elif isinstance(event, events.StreamReset):
+                self.requests.pop(event.stream_id, None)
+                self._finish(event.stream_id)
+            elif isinstance(event, events.ConnectionTerminated):
+                self.closed = True
+
+    def data_to_send(self):
+        """Кадры к отправке: очередь h2 и DATA ответов в пределах окон"""
+        if self.streams:
+            self._pump()
+        return self.conn.data_to_send()
+
+    def push(self, stream_id, data):
+        """Событие /__livereload в открытый поток"""
+        stream = self.streams.get(stream_id)
+        if stream is None or stream.events is None:
+            return
+        if len(stream.events) >= MAX_QUEUED_EVENTS:
+            # Клиент не читает поток: браузер переподключится сам
+            self.reset(stream_id)
+            return
+        stream.events.append(data)
+
+    def reset(self, stream_id):
+        from h2.errors import ErrorCodes
+        from h2.exceptions import ProtocolError
+
+        self.requests.pop(stream_id, None)
+        self._finish(stream_id)
+        try:
+            self.conn.reset_stream(stream_id, ErrorCodes.CANCEL)
+        except ProtocolError:
+            pass
+
+    def goaway(self):
+        """Закрытие соединения без ошибки: браузер откроет новое"""
+        if not self.closed:
+            self.closed = True
+            self.conn.close_connection()
+
+    def idle(self):
+        """Нет ни запросов, ни ответов"""
+        return not self.requests and not self.streams
+
+    def waiting(self):
+        """Открыты только потоки событий /__livereload"""
+        return not self.requests and all(
+            stream.events is not None for stream in self.streams.values())
+
+    def close(self):
+        self.closed = True
+        for stream_id in list(self.streams):
+            self._finish(stream_id)
+
+    def _request(self, stream_id):
+        headers, body = self.requests.pop(stream_id)
+        request = H2Request(headers, body)
+        self.served += 1
+        request.number = self.served
+        try:
+            response = self.gateway.respond(self, stream_id, request)
+        except Exception:
+            self.gateway.log_error(self.peer)
+            response = self.gateway.error(request, HTTPStatus.INTERNAL_SERVER_ERROR)
+        end = response.chunks is None and response.events is None
+        self.conn.send_headers(
+            stream_id, [(':status', str(response.status.value))] + response.headers +
+            self.gateway.common_headers(), end_stream=end)
+        if end:
+            if response.entry is not None:
+                response.entry.close()
+            return
+        self.streams[stream_id] = _Stream(stream_id, response)
+
+    def informational(self, stream_id, headers):
+        """Промежуточный ответ (103 Early Hints) до основного"""
+        self.conn.send_headers(stream_id, [(':status', '103')] + headers)
+
+    def _pump(self):
+        from h2.exceptions import ProtocolError
+
+        conn = self.conn
+        budget = SEND_BUDGET
+        while budget > 0:
+            progressed = False
+            # По кадру на поток за проход: ответы идут вперемешку
+            for stream in list(self.streams.values()):
+                try:
+                    window = min(conn.local_flow_control_window(stream.stream_id),
+                                 conn.max_outbound_frame_size)
+                    if window <= 0:
+                        continue
+                    data = stream.take(window)
+                    if data is None:
+                        conn.end_stream(stream.stream_id)
+                        self._finish(stream.stream_id)
+                    elif data:
+                        conn.send_data(stream.stream_id, data)
+                        budget -= len(data)
+                        progressed = True
+                except ProtocolError:
+                    # Поток уже сброшен клиентом или соединение закрыто
+                    self._finish(stream.stream_id)
+            if not progressed:
+                break
+
+    def _finish(self, stream_id):
+        stream = self.streams.pop(stream_id, None)
+        if stream is None:
+            return
+        stream.close()
+        if stream.subscriber is not None:
+            live_reload = getattr(self.gateway.server, 'live_reload', None)
+            if live_reload is not None:
+                live_reload.unsubscribe(stream.subscriber)
+
+
+class HTTP2:
+    """Ответы по HTTP/2 для сервера любого движка
+
+    Логика та же, что у обработчиков HTTP/1.1: служебные адреса, кэш,
+    сжатие, диапазоны, ETag, Link и 103 (по HTTP/2 их учитывает и Chrome).
+    Атрибуты сервера (кэш, индекс, метрики, --live-reload) читаются при
+    каждом запросе: запускающий скрипт задаёт их после создания сервера.
+    """
+
+    def __init__(self, server, directory=None, handler_class=None):
+        self.server = server
+        self.directory = os.fspath(directory) if directory else os.getcwd()
+        self.extra_headers = [(name.lower(), value)
+                              for name, value in getattr(handler_class, 'extra_headers', ())
+                              if name.lower() not in CONNECTION_HEADERS]
+        self.extensions_map = getattr(
+            handler_class, 'extensions_map', SimpleHTTPRequestHandler.extensions_map)
+        self.connections = 0
+        self.streams = 0
+        self._lock = threading.Lock()
+
+    # Движок threads
+
+    def serve_socket(self, sock, client_address):
+        """Соединение в рабочем потоке пула: select() на сокете и пробуждениях"""
+        server = self.server
+        session = H2Session(self, client_address)
+        calls = collections.deque()
+        wakeup = socket.socketpair()
+
+        def call_soon(fn):
+            if session.closed:
+                return False
+            calls.append(fn)
+            try:
+                wakeup[1].send(b'\0')
+            except OSError:
+                return False
+            return True
+
+        session.call_soon = call_soon
+        keep_alive_timeout = getattr(server, 'keep_alive_timeout', DEFAULT_KEEP_ALIVE_TIMEOUT)
+        connections_waiting = getattr(server, 'connections_waiting', None)
+        sock.settimeout(getattr(server, 'connection_timeout', None) or DEFAULT_TIMEOUT)
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            # Кадры уходят отдельными записями: как и обработчику HTTP/1.1,
+            # задержка Нейгла здесь только мешает
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        wakeup[0].setblocking(False)
+        self._count_connection()
+        idle_deadline = time.monotonic() + keep_alive_timeout
+        try:
+            while True:
+                while calls:
+                    calls.popleft()()
+                data = session.data_to_send()
+                if data:
+                    sock.sendall(data)
+                    # Между проходами отправки - только проверка новых кадров
+                    wait = 0
+                elif session.closed:
+                    break
+                else:
+                    wait = IDLE_POLL_INTERVAL
+                # select не видит уже расшифрованные TLS записи
+                if not sock.pending():
+                    readable, _, _ = select.select([sock, wakeup[0]], [], [], wait)
+                    if wakeup[0] in readable:
+                        try:
+                            wakeup[0].recv(4096)
+                        except OSError:
+                            pass
+                    if sock not in readable:
+                        if not wait:
+                            continue
+                        if session.idle() and time.monotonic() >= idle_deadline:
+                            session.goaway()
+                        elif (session.waiting() and connections_waiting is not None
+                              and connections_waiting()):
+                            # Поток пула нужен другому соединению: браузер откроет
+                            # новое, а EventSource переподключится сам
+                            session.goaway()
+                        continue
+                data = sock.recv(READ_SIZE)
+                if not data:
+                    break
+                session.receive(data)
+                idle_deadline = time.monotonic() + keep_alive_timeout
+        except (OSError, ssl.SSLError):
+            pass
+        finally:
+            session.close()
+            for end in wakeup:
+                end.close()
+
+    # Движок asyncio
+
+    async def serve_async(self, reader, writer, peer):
+        """Соединение в задаче asyncio: чтение здесь, отправка - в задаче pump"""
+        server = self.server
+        session = H2Session(self, peer)
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def run(fn):
+            fn()
+            ready.set()
+
+        def call_soon(fn):
+            if session.closed:
+                return False
+            try:
+                loop.call_soon_threadsafe(run, fn)
+            except RuntimeError:
+                return False
+            return True
+
+        async def pump():
+            while True:
+                data = session.data_to_send()
+                if data:
+                    writer.write(data)
+                    await writer.drain()
+                    # drain без ожидания не уступает циклу: дадим прочитать запросы
+                    await asyncio.sleep(0)
+                    continue
+                if session.closed:
+                    return
+                ready.clear()
+                await ready.wait()
+
+        session.call_soon = call_soon
+        keep_alive_timeout = getattr(server, 'keep_alive_timeout', DEFAULT_KEEP_ALIVE_TIMEOUT)
+        self._count_connection()
+        sender = asyncio.create_task(pump())
+        try:
+            while not session.closed and not sender.done():
+                try:
+                    data = await asyncio.wait_for(reader.read(READ_SIZE), keep_alive_timeout)
+                except asyncio.TimeoutError:
+                    if session.idle():
+                        session.goaway()
+                    data = None
+                if data == b'':
+                    break
+                if data:
+                    session.receive(data)
+                ready.set()
+            if session.closed and not sender.done():
+                # GOAWAY и последние кадры
+                await asyncio.wait_for(asyncio.shield(sender), keep_alive_timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            session.close()
+            sender.cancel()
+            try:
+                await sender
+            except (asyncio.CancelledError, ConnectionError, ssl.SSLError):
+                pass
+
+    # Ответы
+
+    def respond(self, session, stream_id, request):
+        server = self.server
+        method = request.method
+        peer = session.peer
+        if method == 'OPTIONS':
+            return self.reply(request, HTTPStatus.NO_CONTENT, peer)
+        telemetry = getattr(server, 'telemetry', None)
+        url = urllib.parse.urlsplit(request.path)
+        posting = telemetry is not None and method == 'POST' and url.path == TELEMETRY_PATH
+        if method not in ('GET', 'HEAD') and not posting:
+            return self.error(request, HTTPStatus.NOT_IMPLEMENTED, peer)
+        admission = getattr(server, 'admission', None)
+        if admission is not None:
+            retry_after = admission.allow_request(peer[0])
+            if retry_after:
+                return self.reply(request, HTTPStatus.TOO_MANY_REQUESTS, peer,
+                                  [('retry-after', str(retry_after))])
+        if posting:
+            try:
+                accepted = telemetry.add(request.headers.get('user-agent', ''),
+                                         parse_report(request.body))
+            except ValueError:
+                return self.error(request, HTTPStatus.BAD_REQUEST, peer)
+            if not accepted:
+                return self.reply(request, HTTPStatus.SERVICE_UNAVAILABLE, peer,
+                                  [('retry-after', '1')])
+            return self.reply(request, HTTPStatus.NO_CONTENT, peer)
+
+        live_reload = getattr(server, 'live_reload', None)
+        if live_reload is not None and url.path == LIVE_RELOAD_PATH:
+            return self.event_stream(session, stream_id, request, live_reload)
+        if telemetry is not None and url.path == TELEMETRY_PATH:
+            return self.reply(request, HTTPStatus.OK, peer, [('cache-control', 'no-store')],
+                              *telemetry.render(url.query))
+        metrics = getattr(server, 'metrics', None)
+        if metrics is not None and url.path == METRICS_PATH:
+            body, content_type = metrics.render(
+                url.query, getattr(server, 'tls_stats', None), admission)
+            return self.reply(request, HTTPStatus.OK, peer, [('cache-control', 'no-store')],
+                              body, content_type)
+        qr_codes = getattr(server, 'qr_codes', None)
+        if qr_codes is not None and url.path in QR_PATHS:
+            rendered = qr_codes.render(request.path)
+            if rendered is None:
+                return self.error(request, HTTPStatus.NOT_FOUND, peer)
+            return self.reply(request, HTTPStatus.OK, peer, [('cache-control', 'no-store')],
+                              *rendered)
+        return self.static(session, stream_id, request)
+
+    def static(self, session, stream_id, request):
+        server = self.server
+        peer = session.peer
+        if is_hidden(request.path):
+            return self.error(request, HTTPStatus.NOT_FOUND, peer)
+        index = getattr(server, 'file_index', None)
+        path = self.translate_path(request.path)
+        if index.isdir(path) if index is not None else os.path.isdir(path):
+            parts = urllib.parse.urlsplit(request.path)
+            if not parts.path.endswith('/'):
+                location = urllib.parse.urlunsplit(
+                    (parts[0], parts[1], parts[2] + '/', parts[3], parts[4]))
+                return self.reply(request, HTTPStatus.MOVED_PERMANENTLY, peer,
+                                  [('location', location)])
+            isfile = index.isfile if index is not None else os.path.isfile
+            for index_file in ('index.html', 'index.htm'):
+                index_file = os.path.join(path, index_file)
+                if isfile(index_file):
+                    path = index_file
+                    break
+            else:
+                body = (index.listing(path, request.path) if index is not None
+                        else list_directory(path, request.path))
+                if body is None:
+                    return self.error(request, HTTPStatus.NOT_FOUND, peer)
+                return self.reply(request, HTTPStatus.OK, peer, [], body,
+                                  'text/html; charset=utf-8')
+        if path.endswith('/'):
+            return self.error(request, HTTPStatus.NOT_FOUND, peer)
+
+        preload = getattr(server, 'preload', None)
+        if preload is not None and preload.early_hints and request.method == 'GET':
+            link = preload.early(path, request.path)
+            if link:
+                session.informational(stream_id, [('link', link)])
+        cache = getattr(server, 'asset_cache', None)
+        entry = None
+        if cache:
+            entry = cache.get(path, self.guess_type, index.stat if index is not None else os.stat)
+        if entry is None and (index is None or index.exists(path)):
+            entry = FileEntry.open(path, self.guess_type)
+        if entry is None:
+            location = origin_url(request.path)
+            if location is not None:
+                return self.reply(request, HTTPStatus.FOUND, peer, [('location', location)])
+            return self.error(request, HTTPStatus.NOT_FOUND, peer)
+        live_reload = getattr(server, 'live_reload', None)
+        if live_reload is not None:
+            live_reload.watch(path)
+        try:
+            return self.entry_response(request, entry, peer, preload, cache,
+                                       live_reload is not None)
+        except Exception:
+            entry.close()
+            raise
+
+    def entry_response(self, request, entry, peer, preload, cache, revalidate):
+        encoding = negotiate(request.headers.get('accept-encoding'), entry.variants)
+        body, etag = entry.representation(encoding)
+        length = entry.length(encoding)
+        validators = [('etag', etag), ('last-modified', entry.last_modified)]
+        if entry.variants:
+            validators.append(('vary', 'Accept-Encoding'))
+        control = cache_control(request.path, entry.content_type, revalidate)
+        if control:
+            validators.append(('cache-control', control))
+        if entry.not_modified(request.headers.get('if-none-match'),
+                              request.headers.get('if-modified-since')):
+            self.log_request(peer, request, HTTPStatus.NOT_MODIFIED, 0)
+            return _Response(HTTPStatus.NOT_MODIFIED, validators, entry=entry)
+
+        range_header = request.headers.get('range') if request.method == 'GET' else None
+        try:
+            status, headers, parts, tail = plan_ranges(
+                range_header, request.headers.get('if-range'), etag,
+                entry.last_modified, length, entry.content_type)
+        except RangeNotSatisfiable:
+            entry.close()
+            return self.reply(request, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, peer,
+                              [('content-range', f'bytes */{length}')])
+        headers = [(name.lower(), value) for name, value in headers]
+        if encoding:
+            headers.append(('content-encoding', encoding))
+        headers.append(('accept-ranges', 'bytes'))
+        if preload is not None and status == HTTPStatus.OK:
+            link = preload.link(entry.path, request.path, entry)
+            if link:
+                headers.append(('link', link))
+        size = sum(len(prefix) + count for prefix, _, count in parts) + len(tail)
+        if request.method != 'GET':
+            self.log_request(peer, request, status, 0)
+            return _Response(status, headers + validators, entry=entry)
+        if cache is not None and status == HTTPStatus.OK:
+            cache.record_sent(entry, encoding, length)
+        self.log_request(peer, request, status, size)
+        return _Response(status, headers + validators, _body_chunks(body, parts, tail), entry)
+
+    def event_stream(self, session, stream_id, request, live_reload):
+        """/__livereload потоком HTTP/2: события кладёт в него поток слежения"""
+        peer = session.peer
+        if live_reload.subscribers() >= MAX_SUBSCRIBERS:
+            return self.reply(request, HTTPStatus.SERVICE_UNAVAILABLE, peer,
+                              [('retry-after', '5')])
+        headers = [('content-type', 'text/event-stream'), ('cache-control', 'no-store')]
+        self.log_request(peer, request, HTTPStatus.OK, 0)
+        if request.method != 'GET':
+            return _Response(HTTPStatus.OK, headers)
+        subscriber = _StreamSubscriber(session, stream_id)
+        if not live_reload.subscribe(subscriber):
+            return self.reply(request, HTTPStatus.SERVICE_UNAVAILABLE, peer,
+                              [('retry-after', '5')])
+        return _Response(HTTPStatus.OK, headers, subscriber=subscriber,
+                         events=collections.deque([event_stream_prologue(live_reload.boot)]))
+
+    def reply(self, request, status, peer, headers=(), body=b'', content_type='text/plain'):
+        """Ответ из памяти: служебные адреса, редиректы, отказы"""
+        headers = [('content-type', content_type),
+                   ('content-length', str(len(body)))] + list(headers)
+        self.log_request(peer, request, status, len(body))
+        if not body or request.method == 'HEAD':
+            return _Response(status, headers)
+        return _Response(status, headers, iter([body]))
+
+    def error(self, request, status, peer=('-', 0)):
+        body = SimpleHTTPRequestHandler.error_message_format % {
+            'code': status.value,
+            'message': html.escape(status.phrase, quote=False),
+            'explain': html.escape(status.description, quote=False),
+        }
+        return self.reply(request, status, peer, [], body.encode('utf-8', 'replace'),
+                          SimpleHTTPRequestHandler.error_content_type)
+
+    def common_headers(self):
+        return [('server', SERVER_HEADER),
+                ('date', email.utils.formatdate(usegmt=True))] + self.extra_headers
+
+    # Файловая система и журнал
+
+    def translate_path(self, path):
+        # translate_path стандартного обработчика использует только self.directory
+        return SimpleHTTPRequestHandler.translate_path(self, path)
+
+    def guess_type(self, path):
+        file_index = getattr(self.server, 'file_index', None)
+        if file_index is not None:
+            return file_index.content_type(path, self._guess_type)
+        return self._guess_type(path)
+
+    def _guess_type(self, path):
+        return guess_type(path, self.extensions_map)
+
+    def log_request(self, peer, request, status, size):
+        server = self.server
+        user_agent = request.headers.get('user-agent', '')
+        metrics = getattr(server, 'metrics', None)
+        if metrics is not None:
+            metrics.record(request.path, status.value, 0 if request.method == 'HEAD' else size,
+                           time.perf_counter() - request.started, user_agent)
+        with self._lock:
+            self.streams += 1
+        if not getattr(server, 'log_requests', True):
+            return
+        access_log = getattr(server, 'access_log', None)
+        if access_log is not None:
+            return access_log.log(peer[0], user_agent, request.requestline, status.value,
+                                  size, request.number)
+        print(f'{device_icon(user_agent)} {peer[0]} - "{request.requestline}" {status.value} '
+              f'{size} #{request.number}')
+        sys.stdout.flush()
+
+    def log_error(self, peer):
+        import traceback
+        print(f"❌ HTTP/2 запрос от {peer[0]}:")
+        traceback.print_exc()
+
+    def _count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+
+def report_http2(http2):
+    """Печатает число соединений и потоков HTTP/2 при остановке сервера"""
+    if http2 is None or not http2.connections:
+        return
+    print(f"🔀 HTTP/2: соединений {http2.connections}, запросов {http2.streams} "
+          f"({http2.streams / http2.connections:.1f} на соединение)")
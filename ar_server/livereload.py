@@ -0,0 +1,408 @@
+"""
+Живая перезагрузка страниц (--live-reload): слежение за файлами и события
+Server-Sent Events на /__livereload
+
+Один поток на процесс раз в WATCH_INTERVAL делает os.stat только тех
+файлов, которые сервер уже отдавал, и манифестов сборки. Изменённый файл
+убирается из кэша вместе со сжатыми вариантами, после смены манифеста -
+и HTML страницы, в которые подставлены адреса. Подключённые страницы
+получают событие change: правка стиля подменяет <link> без перезагрузки,
+остальное перезагружает страницу.
+
+Поток ждёт в selectors.select() на сокетах подписчиков (движок threads
+отдаёт сокет сюда и освобождает рабочий поток), поэтому сотни открытых
+страниц не стоят процессорного времени: без изменений работа - это
+проход stat и комментарий раз в HEARTBEAT_INTERVAL.
+"""
+
+import json
+import os
+import secrets
+import selectors
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+import weakref
+from functools import partial
+
+LIVE_RELOAD_PATH = '/__livereload'
+# Как часто проверять файлы, секунд
+WATCH_INTERVAL = 0.5
+# Комментарий SSE, чтобы прокси и телефоны не закрывали тихое соединение
+HEARTBEAT_INTERVAL = 15.0
+# Через сколько браузер переподключается после обрыва, мс
+RETRY_MS = 1000
+MAX_WATCHED = 4096
+MAX_SUBSCRIBERS = 1000
+
+HEARTBEAT = b': ping\n\n'
+
+# Вставляется перед </body> HTML страниц, загруженных в кэш
+SNIPPET = ('''<script>/* --live-reload */(() => {
+    const source = new EventSource('%s');
+    let server = null;
+    // Сервер перезапущен - файлы могли измениться, пока страница ждала
+    source.addEventListener('hello', (event) => {
+        if (server !== null && server !== event.data) {
+            location.reload();
+        }
+        server = event.data;
+    });
+    const apply = (change) => {
+        const page = location.pathname.endsWith('/') ? location.pathname + 'index.html'
+            : location.pathname;
+        const used = new Set([page, ...performance.getEntriesByType('resource')
+            .map((entry) => new URL(entry.name).pathname)]);
+        const paths = change.paths.filter((path) => used.has(path));
+        if (!change.all && !paths.length) {
+            return;
+        }
+        if (!change.all && paths.every((path) => path.endsWith('.css'))) {
+            for (const link of document.querySelectorAll('link[rel~="stylesheet"]')) {
+                const url = new URL(link.href);
+                if (paths.includes(url.pathname)) {
+                    url.searchParams.set('livereload', Date.now());
+                    link.href = url;
+                }
+            }
+            return;
+        }
+        location.reload();
+    };
+    source.addEventListener('change', (event) => {
+        const change = JSON.parse(event.data);
+        setTimeout(() => apply(change), change.delay || 0);
+    });
+})();</script>
+''' % LIVE_RELOAD_PATH).encode('utf-8')
+
+
+def inject_snippet(path, content_type, body):
+    """Transform кэша: скрипт подписки перед последним </body> HTML страницы"""
+    if not content_type.startswith('text/html'):
+        return body
+    position = body.lower().rfind(b'</body>')
+    if position < 0:
+        return body + SNIPPET
+    return body[:position] + SNIPPET + body[position:]
+
+
+def event_stream_prologue(boot):
+    """Начало потока событий: задержка переподключения и метка процесса"""
+    return f'retry: {RETRY_MS}\nevent: hello\ndata: {boot}\n\n'.encode()
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class _SocketSubscriber:
+    """Сокет, отданный потоку слежения движком threads"""
+
+    __slots__ = ('sock',)
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def send(self, data):
+        # Событие - сотня байт: не ушло целиком - клиент не читает, и
+        # браузер переподключится сам
+        try:
+            return self.sock.send(data) == len(data)
+        except (OSError, ValueError):
+            return False
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class LoopSubscriber:
+    """Соединение движка asyncio: запись передаётся в его событийный цикл"""
+
+    __slots__ = ('loop', 'writer')
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+
+    def send(self, data):
+        if self.writer.is_closing():
+            return False
+        try:
+            self.loop.call_soon_threadsafe(self._write, data)
+        except RuntimeError:
+            # Цикл уже остановлен
+            return False
+        return True
+
+    def _write(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def close(self):
+        # Соединение закрывает его задача, дождавшись конца чтения
+        try:
+            self.loop.call_soon_threadsafe(self.writer.transport.abort)
+        except RuntimeError:
+            pass
+
+
+class LiveReload:
+    """Слежение за отданными файлами и рассылка событий подписчикам
+
+    Создаётся до fork() (метка процесса общая для всех воркеров, чтобы
+    переподключение к другому воркеру не перезагружало страницу), а
+    поток, selector и подписчики появляются в start() в каждом процессе.
+    reloaders - {путь манифеста: функция перечитывания}; sources и
+    rebuild - исходники сборки и функция пересборки (--assets).
+    """
+
+    def __init__(self, root, asset_cache=None, file_index=None, preload=None,
+                 reloaders=None, sources=(), rebuild=None, interval=WATCH_INTERVAL,
+                 settle=0.0):
+        self.root = os.path.abspath(root)
+        self.asset_cache = asset_cache
+        self.file_index = file_index
+        self.preload = preload
+        self.interval = interval
+        # Пауза перед перезагрузкой страницы: с --workers остальные воркеры
+        # замечают изменение в пределах своего прохода
+        self.settle = settle
+        self.boot = secrets.token_hex(4)
+        self.changes = 0
+        self.events = 0
+        self._reloaders = dict(reloaders or {})
+        self._sources = tuple(sources)
+        self._rebuild = rebuild
+        # Путь файла -> подпись (mtime_ns, size, inode) при первой отдаче
+        self._watched = {}
+        self._manifests = {}
+        self._source_signatures = {}
+        self._subscribers = set()
+        self._adopted = weakref.WeakSet()
+        self._new = []
+        self._lock = threading.Lock()
+        self._selector = None
+        self._wakeup = None
+        self._thread = None
+        self._closed = False
+
+    # Жизненный цикл
+
+    def start(self, rebuild=True):
+        """Запускает поток слежения; rebuild=False - пересобирает другой воркер"""
+        self._selector = selectors.DefaultSelector()
+        self._wakeup = socket.socketpair()
+        for sock in self._wakeup:
+            sock.setblocking(False)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ, None)
+        self._manifests = {path: _signature(path) for path in self._reloaders}
+        if rebuild and self._rebuild is not None:
+            self._source_signatures = {path: _signature(path) for path in self._sources}
+        self._thread = threading.Thread(target=self._run, name='ar-live-reload', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._closed = True
+        self._wake()
+        self._thread.join()
+        self._thread = None
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, set()
+            self._new = []
+        for subscriber in subscribers:
+            subscriber.close()
+        self._selector.close()
+        for sock in self._wakeup:
+            sock.close()
+
+    # Подписчики
+
+    def adopt(self, sock):
+        """Забирает сокет движка threads после заголовков ответа; False - мест нет"""
+        subscriber = _SocketSubscriber(sock)
+        if not self.subscribe(subscriber):
+            return False
+        sock.setblocking(False)
+        self._adopted.add(sock)
+        with self._lock:
+            self._new.append(subscriber)
+        self._wake()
+        return True
+
+    def owns(self, sock):
+        """Сокет передан потоку слежения - закрывать его будет он"""
+        return sock in self._adopted
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            if self._closed or len(self._subscribers) >= MAX_SUBSCRIBERS:
+                return False
+            self._subscribers.add(subscriber)
+        return True
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscribers(self):
+        return len(self._subscribers)
+
+    # Файлы
+
+    def watch(self, path):
+        """Запоминает отданный файл; повторные вызовы - один поиск в словаре"""
+        if path in self._watched or len(self._watched) >= MAX_WATCHED:
+            return
+        self._watched[path] = _signature(path)
+
+    def check(self):
+        """Один проход stat; возвращает адреса изменённых файлов"""
+        # Сначала пересборка: удалённые прошлые сборки попадут в этот же проход
+        rebuilt = False
+        for path, known in self._source_signatures.items():
+            if _signature(path) != known:
+                rebuilt = True
+                self._source_signatures[path] = _signature(path)
+        if rebuilt:
+            self._run_rebuild()
+
+        changed = [path for path, known in dict(self._watched).items()
+                   if _signature(path) != known]
+        for path in changed:
+            self._watched[path] = _signature(path)
+
+        manifests = [path for path, known in self._manifests.items()
+                     if _signature(path) != known]
+        for path in manifests:
+            self._manifests[path] = _signature(path)
+            self._reloaders[path]()
+        if not changed and not manifests:
+            return []
+
+        # Сначала индекс: по его stat кэш решает, свежа ли запись
+        if self.file_index is not None:
+            self.file_index.refresh()
+        if self.asset_cache is not None:
+            for path in changed:
+                self.asset_cache.invalidate(path)
+            if manifests:
+                # Адреса собранных файлов подставлены в HTML при загрузке
+                self.asset_cache.invalidate_type('text/html')
+        if self.preload is not None:
+            self.preload.clear()
+        paths = [self.url_path(path) for path in changed + manifests]
+        self.changes += 1
+        self.broadcast('change', json.dumps(
+            {'paths': paths, 'all': bool(manifests), 'delay': int(self.settle * 1000)}))
+        print(f"🔄 Изменено: {', '.join(paths)} - "
+              f"событие {self.subscribers()} страницам")
+        sys.stdout.flush()
+        return paths
+
+    def url_path(self, path):
+        relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+        return '/' + urllib.parse.quote(relative)
+
+    def broadcast(self, event, data):
+        self._send(f'event: {event}\ndata: {data}\n\n'.encode())
+
+    # Поток слежения
+
+    def _run_rebuild(self):
+        try:
+            files = self._rebuild()
+        except (OSError, ValueError) as error:
+            print(f"⚠️  Пересборка не удалась: {error}")
+            return
+        print(f"🏗️  Пересобрано: {', '.join(sorted(files))}")
+
+    def _run(self):
+        next_check = next_heartbeat = time.monotonic()
+        next_heartbeat += HEARTBEAT_INTERVAL
+        while not self._closed:
+            with self._lock:
+                new, self._new = self._new, []
+            for subscriber in new:
+                try:
+                    self._selector.register(subscriber.sock, selectors.EVENT_READ, subscriber)
+                except (OSError, ValueError):
+                    self._drop(subscriber)
+            timeout = max(0.0, min(next_check, next_heartbeat) - time.monotonic())
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    try:
+                        key.fileobj.recv(4096)
+                    except OSError:
+                        pass
+                else:
+                    # Подписчик ничего не присылает: readable - это закрытие
+                    self._drop(key.data)
+            now = time.monotonic()
+            if now >= next_check:
+                next_check = now + self.interval
+                try:
+                    self.check()
+                except Exception as error:
+                    print(f"⚠️  Живая перезагрузка: {error!r}")
+            if now >= next_heartbeat:
+                next_heartbeat = now + HEARTBEAT_INTERVAL
+                self._send(HEARTBEAT)
+
+    def _send(self, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.send(data):
+                self.events += 1
+            else:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.discard(subscriber)
+        if isinstance(subscriber, _SocketSubscriber):
+            try:
+                self._selector.unregister(subscriber.sock)
+            except (KeyError, ValueError):
+                pass
+        subscriber.close()
+
+    def _wake(self):
+        try:
+            self._wakeup[1].send(b'\0')
+        except OSError:
+            pass
+
+
+def create_live_reload(options, directory=None, asset_cache=None, file_index=None,
+                       preload=None, reloaders=None):
+    """LiveReload по --live-reload (поток запускается в start()) или None"""
+    if not getattr(options, 'live_reload', False):
+        return None
+    root = directory or os.getcwd()
+    sources, rebuild = (), None
+    if getattr(options, 'assets', False):
+        from .build import BUILD_SOURCES, build_assets
+        sources = [os.path.join(root, name) for name in BUILD_SOURCES]
+        rebuild = partial(build_assets, root)
+    settle = 2 * WATCH_INTERVAL if getattr(options, 'workers', 1) > 1 else 0.0
+    print(f"🔄 Живая перезагрузка: {LIVE_RELOAD_PATH}, проверка файлов "
+          f"каждые {WATCH_INTERVAL:g} с")
+    return LiveReload(root, asset_cache, file_index, preload, reloaders, sources, rebuild,
+                      settle=settle)
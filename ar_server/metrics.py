@@ -0,0 +1,301 @@
+"""
+Метрики сервера для /__metrics (--metrics): формат Prometheus и JSON
+
+Каждый поток пишет в свой набор счётчиков без блокировок, а при запросе
+/__metrics наборы всех потоков складываются. С --workers каждый процесс
+раз в секунду сохраняет свой снимок в общий каталог, и /__metrics
+складывает снимки всех воркеров.
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from .useragent import device_kind
+
+METRICS_PATH = '/__metrics'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Сканер адресов не должен раздуть метрики: остальные пути идут в "other"
+MAX_PATHS = 500
+OTHER_PATH = 'other'
+# Как часто воркер сохраняет снимок для соседей (--workers)
+SHARE_INTERVAL = 1.0
+
+
+class _Shard:
+    """Счётчики одного потока"""
+
+    __slots__ = ('requests', 'bytes', 'latency', 'opened', 'closed')
+
+    def __init__(self):
+        self.requests = {}
+        self.bytes = {}
+        # устройство -> [счётчики корзин..., сумма, количество]
+        self.latency = {}
+        self.opened = 0
+        self.closed = 0
+
+
+class Metrics:
+    """Счётчики запросов, байт, соединений и гистограммы задержки"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, max_paths=MAX_PATHS):
+        self.buckets = tuple(buckets)
+        self.max_paths = max_paths
+        self._paths = set()
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        # (каталог, имя файла, tls_stats) в режиме --workers
+        self._shared = None
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            # Блокировка только при первом обращении потока
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def connection_opened(self):
+        self._shard().opened += 1
+
+    def connection_closed(self):
+        self._shard().closed += 1
+
+    def record(self, path, status, size, seconds, user_agent):
+        """Учитывает ответ; вызывается из обработчика после отправки"""
+        path = path.partition('?')[0]
+        if path not in self._paths:
+            if len(self._paths) >= self.max_paths:
+                path = OTHER_PATH
+            else:
+                self._paths.add(path)
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        key = (path, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        shard.bytes[path] = shard.bytes.get(path, 0) + size
+        device = device_kind(user_agent)
+        histogram = shard.latency.get(device)
+        if histogram is None:
+            histogram = shard.latency[device] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, seconds)
+        if index < len(self.buckets):
+            histogram[index] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+    def snapshot(self, tls_stats=None, admission=None):
+        """Сумма счётчиков всех потоков в виде словаря"""
+        with self._lock:
+            shards = list(self._shards)
+        requests, sent, latency = {}, {}, {}
+        opened = closed = 0
+        for shard in shards:
+            # Копии: поток может добавить ключ во время обхода
+            for key, value in list(shard.requests.items()):
+                requests[key] = requests.get(key, 0) + value
+            for key, value in list(shard.bytes.items()):
+                sent[key] = sent.get(key, 0) + value
+            for device, histogram in list(shard.latency.items()):
+                total = latency.setdefault(device, [0] * len(histogram))
+                for index, value in enumerate(list(histogram)):
+                    total[index] += value
+            opened += shard.opened
+            closed += shard.closed
+        snapshot = {
+            'requests': [{'path': path, 'status': status, 'count': count}
+                         for (path, status), count in sorted(requests.items())],
+            'bytes_sent': dict(sorted(sent.items())),
+            'connections_in_flight': opened - closed,
+            'connections_total': opened,
+            'latency': {device: _histogram(self.buckets, values)
+                        for device, values in sorted(latency.items())},
+        }
+        if tls_stats is not None:
+            snapshot['tls'] = tls_stats.snapshot()
+        if admission is not None:
+            snapshot['rejected'] = admission.snapshot()
+        return snapshot
+
+    def share(self, directory, name, tls_stats=None, admission=None):
+        """Режим --workers: снимок - в directory/<name>.json раз в SHARE_INTERVAL
+
+        /__metrics любого воркера после этого отдаёт сумму по всем воркерам;
+        счётчики соседей отстают не больше чем на SHARE_INTERVAL.
+        """
+        self._shared = (directory, name, tls_stats, admission)
+        threading.Thread(target=self._share_loop, name='metrics-share', daemon=True).start()
+
+    def _share_loop(self):
+        directory, name, tls_stats, admission = self._shared
+        while True:
+            try:
+                write_shared(directory, name, self.snapshot(tls_stats, admission))
+            except OSError:
+                # Каталог удалён при остановке
+                return
+            time.sleep(SHARE_INTERVAL)
+
+    def render(self, query, tls_stats=None, admission=None):
+        """Тело и Content-Type ответа /__metrics (?format=json - JSON)"""
+        snapshot = self.snapshot(tls_stats, admission)
+        if self._shared is not None:
+            directory, name = self._shared[:2]
+            snapshot = merge_snapshots([snapshot] + read_shared(directory, exclude=name))
+        if urllib.parse.parse_qs(query).get('format') == ['json']:
+            return json.dumps(snapshot, indent=2).encode('utf-8'), 'application/json'
+        return prometheus_text(snapshot).encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def write_shared(directory, name, snapshot):
+    fd, tmp_path = tempfile.mkstemp(prefix='.metrics-', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, os.path.join(directory, name + '.json'))
+
+
+def read_shared(directory, exclude=None):
+    """Снимки воркеров из общего каталога (кроме exclude)"""
+    snapshots = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return snapshots
+    for filename in sorted(names):
+        if not filename.endswith('.json') or filename[:-5] == exclude:
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def retire_shared(directory, name):
+    """Воркер завершился: его соединения больше не открыты, счётчики остаются"""
+    path = os.path.join(directory, name + '.json')
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return
+    snapshot['connections_in_flight'] = 0
+    write_shared(directory, name, snapshot)
+
+
+def merge_snapshots(snapshots):
+    """Сумма снимков нескольких процессов в том же формате"""
+    requests, sent, latency, tls, rejected = {}, {}, {}, None, None
+    in_flight = total = 0
+    for snapshot in snapshots:
+        for item in snapshot['requests']:
+            key = (item['path'], item['status'])
+            requests[key] = requests.get(key, 0) + item['count']
+        for path, size in snapshot['bytes_sent'].items():
+            sent[path] = sent.get(path, 0) + size
+        in_flight += snapshot['connections_in_flight']
+        total += snapshot['connections_total']
+        for device, histogram in snapshot['latency'].items():
+            merged = latency.get(device)
+            if merged is None:
+                latency[device] = {'buckets': [list(bucket) for bucket in histogram['buckets']],
+                                   'sum': histogram['sum'], 'count': histogram['count']}
+                continue
+            for bucket, (_, count) in zip(merged['buckets'], histogram['buckets']):
+                bucket[1] += count
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+        if 'tls' in snapshot:
+            tls = dict(snapshot['tls']) if tls is None else {
+                key: value + snapshot['tls'].get(key, 0) for key, value in tls.items()}
+        if 'rejected' in snapshot:
+            rejected = dict(snapshot['rejected']) if rejected is None else {
+                key: value + snapshot['rejected'].get(key, 0) for key, value in rejected.items()}
+    merged = {
+        'requests': [{'path': path, 'status': status, 'count': count}
+                     for (path, status), count in sorted(requests.items())],
+        'bytes_sent': dict(sorted(sent.items())),
+        'connections_in_flight': in_flight,
+        'connections_total': total,
+        'latency': dict(sorted(latency.items())),
+        'workers': len(snapshots),
+    }
+    if tls is not None:
+        merged['tls'] = tls
+    if rejected is not None:
+        merged['rejected'] = rejected
+    return merged
+
+
+def _histogram(buckets, values):
+    cumulative, counts = 0, []
+    for bound, value in zip(buckets, values):
+        cumulative += value
+        counts.append([bound, cumulative])
+    return {'buckets': counts, 'sum': values[-2], 'count': values[-1]}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(snapshot):
+    lines = [
+        '# HELP ar_requests_total Ответы по пути и статусу',
+        '# TYPE ar_requests_total counter',
+    ]
+    for item in snapshot['requests']:
+        lines.append(f'ar_requests_total{{path="{_label(item["path"])}",'
+                     f'status="{item["status"]}"}} {item["count"]}')
+    lines += ['# HELP ar_response_bytes_total Отправлено байт тела по пути',
+              '# TYPE ar_response_bytes_total counter']
+    for path, size in snapshot['bytes_sent'].items():
+        lines.append(f'ar_response_bytes_total{{path="{_label(path)}"}} {size}')
+    lines += ['# HELP ar_connections_in_flight Открытые соединения',
+              '# TYPE ar_connections_in_flight gauge',
+              f'ar_connections_in_flight {snapshot["connections_in_flight"]}',
+              '# TYPE ar_connections_total counter',
+              f'ar_connections_total {snapshot["connections_total"]}',
+              '# HELP ar_request_duration_seconds Время ответа по типу устройства',
+              '# TYPE ar_request_duration_seconds histogram']
+    for device, histogram in snapshot['latency'].items():
+        for bound, count in histogram['buckets']:
+            lines.append(f'ar_request_duration_seconds_bucket{{device="{device}",le="{bound:g}"}} {count}')
+        lines.append(f'ar_request_duration_seconds_bucket{{device="{device}",le="+Inf"}} '
+                     f'{histogram["count"]}')
+        lines.append(f'ar_request_duration_seconds_sum{{device="{device}"}} {histogram["sum"]:.6f}')
+        lines.append(f'ar_request_duration_seconds_count{{device="{device}"}} {histogram["count"]}')
+    if 'workers' in snapshot:
+        lines += ['# HELP ar_workers Процессы, чьи счётчики вошли в сумму (--workers)',
+                  '# TYPE ar_workers gauge',
+                  f'ar_workers {snapshot["workers"]}']
+    rejected = snapshot.get('rejected')
+    if rejected is not None:
+        lines += ['# HELP ar_rejected_total Отказы допуска клиентов по причине',
+                  '# TYPE ar_rejected_total counter']
+        for reason, count in rejected.items():
+            lines.append(f'ar_rejected_total{{reason="{reason}"}} {count}')
+    tls = snapshot.get('tls')
+    if tls is not None:
+        lines += ['# HELP ar_tls_handshakes_total Успешные TLS рукопожатия',
+                  '# TYPE ar_tls_handshakes_total counter',
+                  f'ar_tls_handshakes_total {tls["handshakes"]}',
+                  '# TYPE ar_tls_resumed_total counter',
+                  f'ar_tls_resumed_total {tls["resumed"]}',
+                  '# TYPE ar_tls_failures_total counter',
+                  f'ar_tls_failures_total {tls["failures"]}',
+                  '# HELP ar_tls_handshake_seconds_sum Суммарное время рукопожатий',
+                  '# TYPE ar_tls_handshake_seconds_sum counter',
+                  f'ar_tls_handshake_seconds_sum {tls["total_seconds"]:.6f}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,118 @@
+"""
+Локальные адреса компьютера для ссылок и сертификатов
+
+Адреса берутся из списка сетевых интерфейсов, а не из маршрута до
+внешнего хоста: без интернета телефон в той же Wi-Fi сети всё равно
+получает рабочую ссылку.
+"""
+
+import ipaddress
+import socket
+import sys
+
+# Виртуальные интерфейсы контейнеров и VPN - в конец списка
+VIRTUAL_PREFIXES = ('docker', 'br-', 'veth', 'virbr', 'vmnet', 'vboxnet', 'tun', 'tap',
+                    'utun', 'wg', 'zt')
+SIOCGIFADDR = 0x8915
+IF_INET6 = '/proc/net/if_inet6'
+
+
+def _linux_ipv4(names):
+    import fcntl
+    import struct
+
+    addresses = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        for name in names:
+            try:
+                packed = fcntl.ioctl(s.fileno(), SIOCGIFADDR,
+                                     struct.pack('256s', name[:15].encode()))
+            except OSError:
+                # Интерфейс без IPv4 адреса
+                continue
+            addresses.append((name, socket.inet_ntoa(packed[20:24])))
+    return addresses
+
+
+def _linux_ipv6():
+    addresses = []
+    try:
+        with open(IF_INET6) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return addresses
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 6:
+            continue
+        address = ipaddress.IPv6Address(int(fields[0], 16))
+        addresses.append((fields[5], str(address)))
+    return addresses
+
+
+def _resolver_addresses():
+    """Запасной путь вне Linux: адреса имени компьютера"""
+    addresses = []
+    for host in (socket.gethostname(), socket.gethostname() + '.local'):
+        try:
+            infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+        except OSError:
+            continue
+        for family, _, _, _, sockaddr in infos:
+            if family in (socket.AF_INET, socket.AF_INET6):
+                addresses.append(('', sockaddr[0].split('%', 1)[0]))
+    return addresses
+
+
+def interface_addresses():
+    """Пары (интерфейс, адрес) для всех IPv4/IPv6 адресов компьютера
+
+    В Linux - ioctl по списку интерфейсов и /proc/net/if_inet6, на других
+    системах - адреса имени компьютера. Пакеты никуда не отправляются.
+    """
+    addresses = []
+    if sys.platform.startswith('linux'):
+        try:
+            names = [name for _, name in socket.if_nameindex()]
+        except OSError:
+            names = []
+        addresses = _linux_ipv4(names) + _linux_ipv6()
+    if not any(not ipaddress.ip_address(address).is_loopback for _, address in addresses):
+        addresses += _resolver_addresses()
+    return addresses
+
+
+def _rank(item):
+    name, address = item
+    ip = ipaddress.ip_address(address)
+    virtual = name.startswith(VIRTUAL_PREFIXES)
+    # Сначала адреса домашней сети IPv4, потом прочие IPv4, потом IPv6
+    return (virtual, ip.version, not ip.is_private, ip.is_link_local)
+
+
+def lan_addresses(version=None):
+    """Адреса, по которым к компьютеру может подключиться телефон, лучшие первыми
+
+    Без loopback и link-local IPv6 (в ссылке для него нужен номер интерфейса).
+    version=4 - только IPv4, для сервера на 0.0.0.0.
+    """
+    candidates, seen = [], set()
+    for name, address in interface_addresses():
+        ip = ipaddress.ip_address(address)
+        if ip.is_loopback or ip.is_unspecified or (ip.version == 6 and ip.is_link_local):
+            continue
+        if version is not None and ip.version != version:
+            continue
+        if address not in seen:
+            seen.add(address)
+            candidates.append((name, address))
+    return [address for _, address in sorted(candidates, key=_rank)]
+
+
+def local_addresses():
+    """Все IP адреса компьютера для SAN сертификата, включая loopback"""
+    unique = []
+    for address in lan_addresses() + ['127.0.0.1', '::1']:
+        if address not in unique:
+            unique.append(address)
+    return unique
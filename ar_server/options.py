@@ -0,0 +1,186 @@
+"""
+Общие параметры командной строки для запускающих скриптов
+"""
+
+import argparse
+import os
+
+
+def state_dir(*parts):
+    """Каталог данных сервера вне раздаваемого (~/.cache/web-ar): ключи, журналы"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'web-ar', *parts)
+
+
+# Значения по умолчанию подобраны для демо на Wi-Fi: десяток телефонов,
+# каждый тянет страницу, скрипты и стили параллельно
+DEFAULT_THREADS = 16
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_BACKLOG = 128
+# Таймаут чтения запроса и отправки ответа (медленный клиент)
+DEFAULT_TIMEOUT = 15.0
+# Простой keep-alive соединения между запросами: в пуле потоков
+# простаивающее соединение занимает рабочий поток
+DEFAULT_KEEP_ALIVE_TIMEOUT = 5.0
+# Запросов по одному соединению; страница с библиотеками - около 15
+DEFAULT_MAX_REQUESTS = 100
+# Потолок асинхронного движка по `python benchmark.py concurrency`: на одно
+# ядро p95 < 1 с держится до ~2000 соединений, дальше быстрее отказать 503
+DEFAULT_MAX_CONNECTIONS = 2000
+# Сколько ждать ClientHello и завершения TLS рукопожатия
+DEFAULT_HANDSHAKE_TIMEOUT = 10.0
+
+# Допуск клиентов: соединений и запросов в секунду с одного IP. Телефон
+# открывает до 6 соединений, страница с библиотеками - около 20 запросов
+DEFAULT_MAX_PER_IP = 32
+DEFAULT_RATE = 30.0
+DEFAULT_BURST = 120
+# Сколько ждать заголовки запроса целиком (slow loris)
+DEFAULT_HEADER_TIMEOUT = 10.0
+
+# Журнал замеров страниц (--telemetry без имени файла): не в раздаваемом каталоге
+DEFAULT_TELEMETRY_FILE = state_dir('telemetry.arlog')
+
+# Бандл сайта (--bundle без имени файла, см. build_bundle.py)
+DEFAULT_BUNDLE_FILE = 'site.arbundle'
+
+# Объём LRU кэша содержимого файлов в мегабайтах
+DEFAULT_CACHE_MB = 32
+
+ENGINES = ('threads', 'asyncio')
+LOG_FORMATS = ('text', 'json')
+
+
+def add_server_arguments(parser):
+    """Добавляет параметры пула обработчиков в argparse парсер"""
+    group = parser.add_argument_group('сервер')
+    group.add_argument(
+        '--port', type=int, default=None,
+        help='порт (по умолчанию 8000 для HTTP и 8443 для HTTPS скриптов)')
+    group.add_argument(
+        '--no-browser', dest='browser', action='store_false',
+        help='не открывать браузер после запуска')
+    group.add_argument(
+        '--engine', choices=ENGINES, default='threads',
+        help='threads - пул потоков, asyncio - событийный цикл для сотен '
+             'одновременных телефонов (по умолчанию threads)')
+    group.add_argument(
+        '--workers', type=int, default=1,
+        help='число процессов на общем порту (SO_REUSEPORT, Linux и macOS): '
+             'TLS и обработка запросов на нескольких ядрах (по умолчанию 1)')
+    group.add_argument(
+        '--threads', type=int, default=DEFAULT_THREADS,
+        help=f'число рабочих потоков (по умолчанию {DEFAULT_THREADS})')
+    group.add_argument(
+        '--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+        help='сколько принятых соединений может ждать свободный поток '
+             f'(по умолчанию {DEFAULT_QUEUE_SIZE})')
+    group.add_argument(
+        '--backlog', type=int, default=DEFAULT_BACKLOG,
+        help=f'глубина очереди accept() в ядре (по умолчанию {DEFAULT_BACKLOG})')
+    group.add_argument(
+        '--timeout', type=float, default=DEFAULT_TIMEOUT,
+        help='таймаут чтения запроса и отправки ответа в секундах '
+             f'(по умолчанию {DEFAULT_TIMEOUT:g})')
+    group.add_argument(
+        '--keep-alive-timeout', type=float, default=DEFAULT_KEEP_ALIVE_TIMEOUT,
+        help='сколько keep-alive соединение ждёт следующий запрос, в секундах '
+             f'(по умолчанию {DEFAULT_KEEP_ALIVE_TIMEOUT:g})')
+    group.add_argument(
+        '--max-requests', type=int, default=DEFAULT_MAX_REQUESTS,
+        help='запросов по одному соединению, 1 - без keep-alive '
+             f'(по умолчанию {DEFAULT_MAX_REQUESTS})')
+    group.add_argument(
+        '--handshake-timeout', type=float, default=DEFAULT_HANDSHAKE_TIMEOUT,
+        help='таймаут TLS рукопожатия в секундах '
+             f'(по умолчанию {DEFAULT_HANDSHAKE_TIMEOUT:g})')
+    group.add_argument(
+        '--max-connections', type=int, default=DEFAULT_MAX_CONNECTIONS,
+        help='потолок одновременных соединений движка asyncio, сверх - 503 '
+             f'(по умолчанию {DEFAULT_MAX_CONNECTIONS}: p95 < 1 с на одно ядро)')
+    group.add_argument(
+        '--max-per-ip', type=int, default=DEFAULT_MAX_PER_IP,
+        help='одновременных соединений с одного IP, сверх - 503; 0 - без лимита '
+             f'(по умолчанию {DEFAULT_MAX_PER_IP}, loopback не ограничивается)')
+    group.add_argument(
+        '--rate', type=float, default=DEFAULT_RATE,
+        help='запросов в секунду с одного IP, сверх - 429 с Retry-After; 0 - без лимита '
+             f'(по умолчанию {DEFAULT_RATE:g})')
+    group.add_argument(
+        '--burst', type=int, default=DEFAULT_BURST,
+        help=f'запросов подряд сверх --rate (по умолчанию {DEFAULT_BURST})')
+    group.add_argument(
+        '--shed-queue', type=int, default=None,
+        help='очередь пула потоков, при которой новые соединения сразу получают 503 '
+             '(по умолчанию = --queue-size; 0 - ждать в backlog)')
+    group.add_argument(
+        '--header-timeout', type=float, default=DEFAULT_HEADER_TIMEOUT,
+        help='за сколько секунд клиент должен прислать заголовки запроса '
+             f'(по умолчанию {DEFAULT_HEADER_TIMEOUT:g})')
+    group.add_argument(
+        '--cache-size', type=float, default=DEFAULT_CACHE_MB, metavar='MB',
+        help='объём кэша файлов в памяти с ETag и ответами 304, 0 - выключить '
+             f'(по умолчанию {DEFAULT_CACHE_MB} МБ)')
+    group.add_argument(
+        '--no-compress', dest='compress', action='store_false',
+        help='не отдавать gzip/deflate варианты текстовых файлов')
+    group.add_argument(
+        '--gzip-static', action='store_true',
+        help='сохранять gzip варианты рядом с файлами как .gz и переиспользовать их')
+    group.add_argument(
+        '--precompress', action='store_true',
+        help='сжать все текстовые файлы при старте и показать экономию')
+    group.add_argument(
+        '--vendor', action='store_true',
+        help='отдавать библиотеки и текстуры CDN из vendor/ (см. fetch_vendor.py)')
+    group.add_argument(
+        '--assets', action='store_true',
+        help='подключать в HTML собранные файлы из assets/ (см. build_assets.py)')
+    group.add_argument(
+        '--bundle', nargs='?', const=DEFAULT_BUNDLE_FILE, default=None, metavar='ФАЙЛ',
+        help='раздавать только файлы бандла, отображённого в память (см. build_bundle.py; '
+             f'по умолчанию {DEFAULT_BUNDLE_FILE}): без скриптов и ключей каталога')
+    group.add_argument(
+        '--access-log', default='-', metavar='ФАЙЛ',
+        help="журнал запросов: '-' - консоль (по умолчанию), 'off' - выключить, "
+             "иначе файл с ротацией по 10 МБ")
+    group.add_argument(
+        '--log-format', choices=LOG_FORMATS, default='text',
+        help='формат журнала: text или json (по строке на запрос)')
+    group.add_argument(
+        '--metrics', action='store_true',
+        help='счётчики запросов, задержек и соединений на /__metrics (Prometheus, ?format=json)')
+    group.add_argument(
+        '--telemetry', nargs='?', const=DEFAULT_TELEMETRY_FILE, default=None, metavar='ФАЙЛ',
+        help='принимать замеры страниц на POST /__telemetry и дописывать их в журнал '
+             f'(по умолчанию {DEFAULT_TELEMETRY_FILE}); сводка по устройствам - GET /__telemetry')
+    group.add_argument(
+        '--preload', action='store_true',
+        help='добавлять к HTML страницам заголовок Link с preload/preconnect их '
+             'стилей, скриптов и CDN')
+    group.add_argument(
+        '--early-hints', action='store_true',
+        help='то же, что --preload, и 103 Early Hints с этими Link до ответа на '
+             'HTML страницу (клиенты HTTP/1.1 и HTTP/2)')
+    group.add_argument(
+        '--http2', action='store_true',
+        help='предлагать HTTPS клиентам HTTP/2 (ALPN h2, откат на HTTP/1.1): все файлы '
+             'страницы по одному соединению; нужен пакет h2')
+    group.add_argument(
+        '--live-reload', action='store_true',
+        help='следить за отданными файлами и перезагружать открытые страницы при их '
+             'изменении (события на /__livereload, скрипт вставляется в HTML)')
+    group.add_argument(
+        '--no-file-index', dest='file_index', action='store_false',
+        help='проверять каждый путь в файловой системе вместо индекса в памяти (для сравнения)')
+    group.add_argument(
+        '--no-sendfile', dest='sendfile', action='store_false',
+        help='копировать файлы через буфер вместо os.sendfile (для сравнения)')
+    return parser
+
+
+def parse_server_args(description, argv=None):
+    """Разбирает аргументы командной строки запускающего скрипта"""
+    parser = argparse.ArgumentParser(description=description)
+    add_server_arguments(parser)
+    return parser.parse_args(argv)
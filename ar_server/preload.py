@@ -0,0 +1,312 @@
+"""
+Подсказки предзагрузки для HTML страниц: Link rel=preload/preconnect и
+103 Early Hints
+
+Телефон узнаёт о style.css, библиотеках A-Frame и скриптах страницы только
+разобрав HTML и запрашивает их на круг позже. Страница разбирается один
+раз на версию (ETag): её стили и скрипты, а в локальных CSS - @import и
+url() (шрифты, картинки), складываются в заголовок Link ответа 200. Для
+других хостов (CDN) добавляется preconnect: DNS, TCP и TLS идут ещё до
+того, как парсер дойдёт до тега. С --early-hints последний известный Link
+страницы уходит промежуточным ответом 103 до проверки кэша и чтения файла.
+"""
+
+import os
+import posixpath
+import re
+import threading
+import urllib.parse
+from html.parser import HTMLParser
+
+# Больше предзагрузок конкурируют с самой страницей за канал
+MAX_PRELOADS = 8
+MAX_PRECONNECTS = 4
+# Страницы и стили крупнее не разбираются
+MAX_PARSE_SIZE = 2 * 1024 * 1024
+# Вложенность @import в CSS
+MAX_CSS_DEPTH = 3
+# Страниц с подсказками в памяти
+MAX_PAGES = 256
+
+CSS_REFERENCE = re.compile(
+    rb'''@import\s+(?:url\(\s*)?["']?([^"')\s;]+)|url\(\s*["']?([^"')\s]+)''')
+CSS_COMMENT = re.compile(rb'/\*.*?\*/', re.S)
+FONT_EXTENSIONS = frozenset({'.woff2', '.woff', '.ttf', '.otf'})
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.svg'})
+# Символы, которые нельзя оставить в <...> заголовка Link
+LINK_SAFE = ":/?#[]@!$&'()*+,;=%~"
+# Хост в заголовке Link: имя в ASCII (после IDNA) или IPv6 в скобках
+LINK_HOST = re.compile(r'(?:[a-z0-9_-]+\.)*[a-z0-9_-]+\.?|\[[0-9a-f:.]+\]')
+
+
+def early_hints_response(link):
+    """Промежуточный ответ 103 с заголовком Link (одинаков для обоих движков)"""
+    return b'HTTP/1.1 103 Early Hints\r\nLink: ' + link.encode('latin-1') + b'\r\n\r\n'
+
+
+class _Resource:
+    __slots__ = ('url', 'kind', 'crossorigin', 'rel')
+
+    def __init__(self, url, kind, crossorigin=None, rel='preload'):
+        self.url = url
+        self.kind = kind
+        self.crossorigin = crossorigin
+        self.rel = rel
+
+    def header(self):
+        value = f'<{self.url}>; rel={self.rel}'
+        if self.rel == 'preload':
+            value += f'; as={self.kind}'
+        if self.crossorigin is not None:
+            value += ('; crossorigin=use-credentials' if self.crossorigin == 'use-credentials'
+                      else '; crossorigin')
+        return value
+
+
+class _PageParser(HTMLParser):
+    """Стили и внешние скрипты страницы в порядке загрузки браузером
+
+    Блокирующие стили и скрипты идут в порядке документа, как их находит
+    сканер предзагрузки браузера: первый запрос займёт уже открытое
+    соединение страницы, и переставлять его ради стилей невыгодно.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocking = []
+        self.deferred = []
+        # (адрес, crossorigin) из всех src: текстуры A-Frame, картинки, видео
+        self.sources = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        crossorigin = attrs.get('crossorigin')
+        if crossorigin is not None:
+            crossorigin = crossorigin.lower() or 'anonymous'
+        # SRI в Link не передать: предзагрузка без integrity скачала бы файл дважды
+        protected = 'integrity' in attrs
+        if tag == 'link':
+            rel = (attrs.get('rel') or '').lower().split()
+            href = attrs.get('href')
+            if href and 'stylesheet' in rel and 'alternate' not in rel:
+                self.sources.append((href, crossorigin))
+                if not protected:
+                    self.blocking.append(_Resource(href, 'style', crossorigin))
+            return
+        src = attrs.get('src')
+        if not src:
+            return
+        if tag == 'script':
+            self.sources.append((src, crossorigin))
+            if protected or 'nomodule' in attrs:
+                return
+            if (attrs.get('type') or '').lower() == 'module':
+                # Модули загружаются в режиме CORS
+                self.deferred.append(_Resource(src, 'script', crossorigin or 'anonymous',
+                                               rel='modulepreload'))
+            elif 'async' in attrs or 'defer' in attrs:
+                self.deferred.append(_Resource(src, 'script', crossorigin))
+            else:
+                self.blocking.append(_Resource(src, 'script', crossorigin))
+            return
+        # <a-cubemap src="..."> перечисляет несколько адресов через пробел
+        self.sources.extend((url, crossorigin) for url in src.split())
+
+
+def _netloc(parts):
+    """Хост[:порт] для заголовка Link: IDN в punycode; None - не кодируется"""
+    try:
+        host = parts.hostname or ''
+        port = parts.port
+        host = f'[{host}]' if ':' in host else host.encode('idna').decode('ascii')
+    except (UnicodeError, ValueError):
+        return None
+    if not LINK_HOST.fullmatch(host):
+        return None
+    return host if port is None else f'{host}:{port}'
+
+
+def _origin(url):
+    """Хост другого сайта (для preconnect) или None для своего адреса
+
+    Пустая строка - чужой хост, который нельзя записать в Link.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if not parts.netloc:
+        return None
+    netloc = _netloc(parts)
+    if netloc is None:
+        return ''
+    return f'{parts.scheme}://{netloc}' if parts.scheme else f'//{netloc}'
+
+
+def _page_body(entry):
+    """Тело страницы в том виде, в каком оно уходит клиенту"""
+    if entry.size > MAX_PARSE_SIZE:
+        return None
+    if isinstance(entry.body, (bytes, bytearray, memoryview)):
+        return bytes(entry.body)
+    try:
+        # Файл без кэша: pread не сдвигает позицию, с которой пойдёт ответ
+        return os.pread(entry.body.fileno(), entry.size, 0)
+    except (OSError, AttributeError):
+        return None
+
+
+class PreloadHints:
+    """Заголовки Link для HTML страниц, разобранных один раз на версию
+
+    Граф зависимостей строится от страницы: стили, скрипты, а для
+    локальных стилей - их @import, шрифты и картинки. Локальные файлы,
+    которых нет на диске, в подсказки не попадают. source - откуда брать
+    файлы вместо диска (Bundle: isfile и read).
+    """
+
+    def __init__(self, root, early_hints=False, source=None):
+        self.root = os.path.abspath(root)
+        self.early_hints = early_hints
+        self.source = source
+        self.parsed = 0
+        # (путь файла, каталог адреса) -> (ETag, Link или None)
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def link(self, file_path, url_path, entry):
+        """Значение Link для ответа 200 на HTML страницу или None"""
+        if not entry.content_type.startswith('text/html'):
+            return None
+        key = (file_path, _base(url_path))
+        known = self._pages.get(key)
+        if known is not None and known[0] == entry.etag:
+            return known[1]
+        body = _page_body(entry)
+        value = None if body is None else self.build(body, key[1])
+        with self._lock:
+            if len(self._pages) >= MAX_PAGES:
+                self._pages.clear()
+            self._pages[key] = (entry.etag, value)
+            self.parsed += 1
+        return value
+
+    def early(self, file_path, url_path):
+        """Link последней отданной версии страницы для 103 Early Hints
+
+        Вызывается до проверки кэша: после изменения страницы одна 103
+        может содержать прежний набор, следующий ответ 200 его обновит.
+        """
+        if not self.early_hints:
+            return None
+        known = self._pages.get((file_path, _base(url_path)))
+        return known[1] if known is not None else None
+
+    def clear(self):
+        """Забывает разобранные страницы: их стили могли измениться (--live-reload)"""
+        with self._lock:
+            self._pages.clear()
+
+    def build(self, body, base):
+        """Значение Link по тексту страницы; base - каталог её адреса"""
+        parser = _PageParser()
+        try:
+            parser.feed(body.decode('utf-8', 'replace'))
+            parser.close()
+        except AssertionError:
+            # Неразбираемая разметка (HTMLParser сообщает о ней assert)
+            pass
+        resources = []
+        seen = set()
+
+        def add(resource):
+            url = self._resolve(base, resource.url)
+            if url is None or url in seen:
+                return False
+            seen.add(url)
+            resource.url = url
+            resources.append(resource)
+            return True
+
+        for resource in parser.blocking + parser.deferred:
+            add(resource)
+        for style in [resource for resource in resources if resource.kind == 'style']:
+            if _origin(style.url) is None:
+                for dependency in self._css_dependencies(style.url, MAX_CSS_DEPTH):
+                    add(dependency)
+
+        origins = []
+        for url, crossorigin in [(r.url, r.crossorigin) for r in resources] + parser.sources:
+            origin = _origin(urllib.parse.urljoin(base, url))
+            if origin and origin not in [o.url for o in origins]:
+                origins.append(_Resource(origin, None, crossorigin, rel='preconnect'))
+        hints = origins[:MAX_PRECONNECTS] + resources[:MAX_PRELOADS]
+        if not hints:
+            return None
+        return ', '.join(hint.header() for hint in hints)
+
+    def _resolve(self, base, url):
+        """Адрес для Link: свой - путь от корня, чужой - как есть; None - пропустить"""
+        url = urllib.parse.urljoin(base, url.strip())
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme and parts.scheme not in ('http', 'https'):
+            return None
+        if not parts.netloc:
+            path = self._file(parts.path)
+            isfile = self.source.isfile if self.source is not None else os.path.isfile
+            if path is None or not isfile(path):
+                return None
+        else:
+            netloc = _netloc(parts)
+            if netloc is None:
+                return None
+            url = urllib.parse.urlunsplit(parts._replace(netloc=netloc))
+        return urllib.parse.quote(url.replace('<', '').replace('>', ''), safe=LINK_SAFE)
+
+    def _file(self, url_path):
+        path = posixpath.normpath(urllib.parse.unquote(url_path))
+        words = [word for word in path.split('/') if word and word not in ('.', '..')]
+        if any(word.startswith('.') for word in words):
+            return None
+        return os.path.join(self.root, *words)
+
+    def _css_dependencies(self, url, depth):
+        """Шрифты, картинки и @import локального стиля (рекурсивно)"""
+        path = self._file(urllib.parse.urlsplit(url).path)
+        try:
+            if self.source is not None:
+                css = self.source.read(path)[:MAX_PARSE_SIZE]
+            else:
+                with open(path, 'rb') as f:
+                    css = f.read(MAX_PARSE_SIZE)
+        except (OSError, TypeError):
+            return []
+        dependencies = []
+        for match in CSS_REFERENCE.finditer(CSS_COMMENT.sub(b'', css)):
+            imported = match.group(1) is not None
+            reference = (match.group(1) or match.group(2)).decode('utf-8', 'replace')
+            if reference.startswith(('data:', '#')):
+                continue
+            resolved = urllib.parse.urljoin(url, reference)
+            extension = posixpath.splitext(urllib.parse.urlsplit(resolved).path)[1].lower()
+            if imported or extension == '.css':
+                dependencies.append(_Resource(resolved, 'style'))
+                if depth > 1 and _origin(resolved) is None:
+                    dependencies.extend(self._css_dependencies(resolved, depth - 1))
+            elif extension in FONT_EXTENSIONS:
+                # Шрифты всегда загружаются в режиме CORS
+                dependencies.append(_Resource(resolved, 'font', 'anonymous'))
+            elif extension in IMAGE_EXTENSIONS:
+                dependencies.append(_Resource(resolved, 'image'))
+        return dependencies
+
+
+def _base(url_path):
+    """Каталог адреса страницы: относительные ссылки считаются от него"""
+    path = urllib.parse.urlsplit(url_path).path
+    return path[:path.rfind('/') + 1] or '/'
+
+
+def create_preload(options, directory=None, source=None):
+    """PreloadHints по --preload/--early-hints или None"""
+    if not (getattr(options, 'preload', False) or getattr(options, 'early_hints', False)):
+        return None
+    return PreloadHints(directory or os.getcwd(),
+                        early_hints=getattr(options, 'early_hints', False), source=source)
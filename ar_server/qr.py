@@ -0,0 +1,171 @@
+"""
+QR коды адресов сервера: кэш матриц, компактный вывод в терминал, SVG и PNG
+
+Матрица кодируется пакетом qrcode один раз на URL и хранится в
+.qr-cache/, поэтому повторный запуск обходится без кодирования. Картинки
+отдаются на /__qr.svg и /__qr.png (?url=<адрес> - другой адрес из списка),
+например для проектора на демо.
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import urllib.parse
+import zlib
+
+QR_CACHE_DIR = '.qr-cache'
+QR_SVG_PATH = '/__qr.svg'
+QR_PNG_PATH = '/__qr.png'
+QR_PATHS = (QR_SVG_PATH, QR_PNG_PATH)
+QR_BORDER = 2
+PNG_SCALE = 8
+# Пара модулей по вертикали -> один символ
+HALF_BLOCKS = {(False, False): ' ', (True, False): '▀', (False, True): '▄', (True, True): '█'}
+
+
+def encode_matrix(url, border=QR_BORDER):
+    """Матрица QR кода (список строк из bool) или None без пакета qrcode"""
+    try:
+        import qrcode
+    except ImportError:
+        return None
+    qr = qrcode.QRCode(border=border)
+    qr.add_data(url)
+    qr.make(fit=True)
+    return [[bool(module) for module in row] for row in qr.get_matrix()]
+
+
+def terminal_text(matrix):
+    """Две строки матрицы на строку терминала через полублоки ▀ ▄ █"""
+    if len(matrix) % 2:
+        matrix = matrix + [[False] * len(matrix[0])]
+    return '\n'.join(
+        ''.join(HALF_BLOCKS[pair] for pair in zip(top, bottom))
+        for top, bottom in zip(matrix[::2], matrix[1::2]))
+
+
+def svg_bytes(matrix):
+    """SVG с одним path: по квадрату на тёмный модуль"""
+    size = len(matrix)
+    squares = ''.join(f'M{x} {y}h1v1h-1z' for y, row in enumerate(matrix)
+                      for x, module in enumerate(row) if module)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+            f'shape-rendering="crispEdges"><rect width="{size}" height="{size}" fill="#fff"/>'
+            f'<path d="{squares}" fill="#000"/></svg>\n').encode('ascii')
+
+
+def _png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def png_bytes(matrix, scale=PNG_SCALE):
+    """Чёрно-белый PNG (1 бит на пиксель) без сторонних пакетов"""
+    size = len(matrix) * scale
+    rows = []
+    for row in matrix:
+        # 1 - белый пиксель, 0 - тёмный модуль
+        bits = ''.join(('0' if module else '1') * scale for module in row)
+        bits += '1' * (-len(bits) % 8)
+        line = b'\0' + int(bits, 2).to_bytes(len(bits) // 8, 'big')
+        rows.extend([line] * scale)
+    header = struct.pack('>IIBBBBB', size, size, 1, 0, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'IDAT', zlib.compress(b''.join(rows), 9)) + _png_chunk(b'IEND', b''))
+
+
+class QRCodes:
+    """QR коды для набора адресов: матрицы и картинки считаются один раз
+
+    Первый адрес - основной (по умолчанию для /__qr.svg и /__qr.png).
+    Коды для адресов не из списка не выдаются.
+    """
+
+    def __init__(self, urls, cache_dir=QR_CACHE_DIR):
+        self.urls = list(urls)
+        self.cache_dir = cache_dir
+        self._rendered = {}
+        self._lock = threading.Lock()
+
+    def _cache_file(self, url):
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest}.txt')
+
+    def _read_cache(self, url):
+        try:
+            with open(self._cache_file(url), encoding='utf-8') as f:
+                cached_url, *rows = f.read().split('\n')
+        except OSError:
+            return None
+        if cached_url != url or not rows:
+            return None
+        return [[char == '1' for char in row] for row in rows]
+
+    def _write_cache(self, url, matrix):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.qr-', dir=self.cache_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write('\n'.join([url] + [''.join('1' if module else '0' for module in row)
+                                           for row in matrix]))
+            os.replace(tmp_path, self._cache_file(url))
+        except OSError:
+            # Без кэша код просто кодируется заново при следующем запуске
+            pass
+
+    def matrix(self, url):
+        """Матрица из памяти, из .qr-cache/ или закодированная заново"""
+        return self._get(url, 'matrix')
+
+    def _get(self, url, kind):
+        key = (url, kind)
+        try:
+            return self._rendered[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._rendered:
+                self._rendered[key] = self._build(url, kind)
+        return self._rendered[key]
+
+    def _build(self, url, kind):
+        if kind == 'matrix':
+            matrix = self._read_cache(url)
+            if matrix is None:
+                matrix = encode_matrix(url)
+                if matrix is not None:
+                    self._write_cache(url, matrix)
+            return matrix
+        # Вызывается под self._lock: матрицу берём напрямую, не через _get
+        matrix = self._rendered.get((url, 'matrix'))
+        if matrix is None:
+            matrix = self._rendered[(url, 'matrix')] = self._build(url, 'matrix')
+        if matrix is None:
+            return None
+        return {'text': terminal_text, 'svg': svg_bytes, 'png': png_bytes}[kind](matrix)
+
+    def terminal(self, url=None):
+        """Компактный QR код для консоли или None без пакета qrcode"""
+        return self._get(url or self.urls[0], 'text')
+
+    def render(self, url_path):
+        """(тело, Content-Type) для /__qr.svg и /__qr.png или None, если кода нет"""
+        parts = urllib.parse.urlsplit(url_path)
+        url = urllib.parse.parse_qs(parts.query).get('url', [self.urls[0]])[0]
+        if url not in self.urls:
+            return None
+        if parts.path == QR_SVG_PATH:
+            body, content_type = self._get(url, 'svg'), 'image/svg+xml'
+        else:
+            body, content_type = self._get(url, 'png'), 'image/png'
+        return None if body is None else (body, content_type)
+
+
+def qr_urls(addresses, port, https_port=None, scheme='http'):
+    """Адреса страниц для QR кодов: для каждого IP и, если задан, HTTPS вариант"""
+    urls = [f'{scheme}://{address}:{port}/' for address in addresses]
+    if https_port is not None:
+        urls += [f'https://{address}:{https_port}/' for address in addresses]
+    return urls
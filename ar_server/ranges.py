@@ -0,0 +1,125 @@
+"""
+Запросы диапазонов (Range, If-Range) и ответы 206 Partial Content
+"""
+
+import os
+from http import HTTPStatus
+
+# Больше диапазонов в одном запросе не обслуживаем - отдаём файл целиком
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    """Ни один диапазон не попадает в файл - нужен ответ 416"""
+
+
+def parse_range(header, size):
+    """Разбирает Range в список (start, end) включительно
+
+    None означает, что заголовок нужно проигнорировать (нет, другая
+    единица, синтаксическая ошибка, слишком много диапазонов).
+    Пересекающиеся и соседние диапазоны объединяются.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+    ranges = []
+    items = [item.strip() for item in spec.split(',') if item.strip()]
+    if len(items) > MAX_RANGES:
+        return None
+    for item in items:
+        first, sep, last = item.partition('-')
+        first, last = first.strip(), last.strip()
+        if not sep or not (first.isdigit() or (not first and last.isdigit())):
+            return None
+        if last and not last.isdigit():
+            return None
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+            if start >= size:
+                continue
+            ranges.append((start, min(end, size - 1)))
+        else:
+            suffix = int(last)
+            if suffix > 0 and size > 0:
+                ranges.append((max(0, size - suffix), size - 1))
+    if not ranges:
+        raise RangeNotSatisfiable()
+    return coalesce(ranges)
+
+
+def coalesce(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(if_range, etag, last_modified):
+    """If-Range: ETag сравнивается строго, дата - на точное совпадение"""
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        return not if_range.startswith('W/') and if_range == etag
+    return if_range == last_modified
+
+
+def plan_ranges(range_header, if_range, etag, last_modified, length, content_type):
+    """Готовит статус, заголовки и части тела ответа
+
+    Возвращает (status, headers, parts, tail), где parts - список
+    (префикс, смещение, длина), а tail - завершающая граница multipart.
+    Ответ без Range - тот же 200 с одной частью на весь файл.
+    """
+    ranges = None
+    if if_range_matches(if_range, etag, last_modified):
+        ranges = parse_range(range_header, length)
+    if ranges is None:
+        headers = [('Content-type', content_type), ('Content-Length', str(length))]
+        return HTTPStatus.OK, headers, [(b'', 0, length)], b''
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers = [
+            ('Content-type', content_type),
+            ('Content-Range', f'bytes {start}-{end}/{length}'),
+            ('Content-Length', str(end - start + 1)),
+        ]
+        return HTTPStatus.PARTIAL_CONTENT, headers, [(b'', start, end - start + 1)], b''
+
+    # os.urandom вместо uuid: модуль uuid заметно удлиняет запуск
+    boundary = os.urandom(16).hex()
+    parts = []
+    for start, end in ranges:
+        prefix = (f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+                  f'Content-Range: bytes {start}-{end}/{length}\r\n\r\n')
+        parts.append((prefix.encode('latin-1'), start, end - start + 1))
+    tail = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+    total = sum(len(prefix) + count for prefix, _, count in parts) + len(tail)
+    headers = [
+        ('Content-type', f'multipart/byteranges; boundary={boundary}'),
+        ('Content-Length', str(total)),
+    ]
+    return HTTPStatus.PARTIAL_CONTENT, headers, parts, tail
+
+
+class RangeBody:
+    """Тело ответа из частей файла или буфера, отдаваемых по кускам"""
+
+    def __init__(self, source, parts, tail=b''):
+        self.source = source
+        self.parts = parts
+        self.tail = tail
+
+    def close(self):
+        if hasattr(self.source, 'close'):
+            self.source.close()
@@ -0,0 +1,396 @@
+"""
+HTTP сервер с ограниченным пулом рабочих потоков
+"""
+
+import os
+import queue
+import ssl
+import sys
+import threading
+import time
+from functools import partial
+from http.server import HTTPServer
+
+from .cache import AssetCache, precompress_tree, report_cache
+from .accesslog import create_access_log
+from .admission import Admission, ReadDeadlines, reject_connection, report_admission
+from .build import ASSETS_DIR, MANIFEST, load_manifest
+from .fsindex import shared_index
+from .handler import guess_type
+from .livereload import create_live_reload, inject_snippet
+from .metrics import Metrics
+from .preload import create_preload
+from .telemetry import create_telemetry
+from .tls import (
+    DEFAULT_ALPN, HandshakeStats, close_tls, configure_server_context, report_handshakes,
+    server_handshake,
+)
+from .vendor import MANIFEST as VENDOR_MANIFEST, VENDOR_DIR, load_vendor
+from .options import (
+    DEFAULT_BACKLOG, DEFAULT_BURST, DEFAULT_CACHE_MB, DEFAULT_HANDSHAKE_TIMEOUT,
+    DEFAULT_HEADER_TIMEOUT, DEFAULT_KEEP_ALIVE_TIMEOUT, DEFAULT_MAX_CONNECTIONS,
+    DEFAULT_MAX_PER_IP, DEFAULT_MAX_REQUESTS, DEFAULT_QUEUE_SIZE, DEFAULT_RATE,
+    DEFAULT_THREADS, DEFAULT_TIMEOUT,
+)
+
+
+class ThreadPoolMixIn:
+    """Обрабатывает соединения в фиксированном пуле потоков
+
+    Цикл accept() только кладёт сокет в ограниченную очередь, поэтому
+    медленный клиент занимает один поток, а не весь сервер. Когда в очереди
+    shed_queue соединений, новые сразу получают 503 (без shed_queue accept()
+    ждёт, и соединения копятся в backlog ядра). Keep-alive соединение без
+    запросов отдаёт поток, как только в очереди кто-то ждёт.
+    """
+
+    pool_size = DEFAULT_THREADS
+    pool_queue_size = DEFAULT_QUEUE_SIZE
+    keep_alive_timeout = DEFAULT_KEEP_ALIVE_TIMEOUT
+    max_requests = DEFAULT_MAX_REQUESTS
+    ssl_context = None
+    handshake_timeout = DEFAULT_HANDSHAKE_TIMEOUT
+    tls_stats = None
+    access_log = None
+    file_index = None
+    preload = None
+    live_reload = None
+    # Ответы по HTTP/2 (--http2) для соединений, выбравших h2 в ALPN
+    http2 = None
+    telemetry = None
+    admission = None
+    shed_queue = 0
+    read_deadlines = None
+    log_requests = True
+    metrics = None
+    # QR коды адресов (/__qr.svg, /__qr.png) - задаёт запускающий скрипт
+    qr_codes = None
+    started_at = None
+    _workers = ()
+
+    def _start_pool(self):
+        self._pending = queue.Queue(self.pool_queue_size)
+        self._workers = []
+        for index in range(self.pool_size):
+            worker = threading.Thread(
+                target=self._worker_loop, name=f'ar-worker-{index}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self._serve_connection(request, client_address)
+            finally:
+                if self.admission is not None:
+                    self.admission.close_connection(client_address[0])
+
+    def _serve_connection(self, request, client_address):
+        if self.ssl_context is not None:
+            # Рукопожатие здесь, а не в accept(): медленный клиент
+            # занимает только свой поток
+            request = server_handshake(
+                self.ssl_context, request, self.handshake_timeout, self.tls_stats)
+            if request is None:
+                return
+        if self.metrics is not None:
+            self.metrics.connection_opened()
+        try:
+            if self.http2 is not None and request.selected_alpn_protocol() == 'h2':
+                self.http2.serve_socket(request, client_address)
+            else:
+                self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if self.read_deadlines is not None:
+                self.read_deadlines.finish(request)
+            # Сокет /__livereload остаётся открытым у потока слежения
+            if self.live_reload is None or not self.live_reload.owns(request):
+                self.shutdown_request(request)
+            if self.metrics is not None:
+                self.metrics.connection_closed()
+
+    def connections_waiting(self):
+        """Есть ли принятые соединения без рабочего потока (или остановка пула)"""
+        return not self._pending.empty()
+
+    def handle_error(self, request, client_address):
+        # Телефон, ушедший со страницы посреди ответа, - не ошибка сервера;
+        # SSLEOFError - то же для TLS сокета, закрытого по --header-timeout
+        if isinstance(sys.exc_info()[1], (ConnectionError, ssl.SSLEOFError)):
+            return
+        super().handle_error(request, client_address)
+
+    def process_request(self, request, client_address):
+        if self.started_at is not None:
+            report_first_accept(self.started_at)
+            self.started_at = None
+        admission = self.admission
+        if admission is not None:
+            # Отказ прямо здесь: поток accept() не ждёт места в очереди
+            if not admission.open_connection(client_address[0]):
+                reject_connection(request, self.ssl_context is not None, retry_after=1)
+                return
+            if self.shed_queue and self._pending.qsize() >= self.shed_queue:
+                admission.close_connection(client_address[0])
+                admission.count('shed')
+                reject_connection(request, self.ssl_context is not None)
+                return
+        if self.read_deadlines is not None and self.ssl_context is None:
+            # Время в очереди входит в --header-timeout: медленные клиенты
+            # не занимают её дольше, чем рабочие потоки (для TLS отсчёт
+            # начинается после рукопожатия со своим таймаутом)
+            self.read_deadlines.start(request)
+        self._pending.put((request, client_address))
+
+    def shutdown_request(self, request):
+        if isinstance(request, ssl.SSLSocket):
+            request = close_tls(request)
+        super().shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            self._pending.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        if self.read_deadlines is not None:
+            self.read_deadlines.close()
+        if self.access_log is not None:
+            self.access_log.close()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        if self.live_reload is not None:
+            self.live_reload.close()
+        if self.http2 is not None:
+            from .http2 import report_http2
+            report_http2(self.http2)
+        report_cache(getattr(self, 'asset_cache', None))
+        report_handshakes(self.tls_stats)
+        report_admission(self.admission)
+
+
+class ThreadPoolHTTPServer(ThreadPoolMixIn, HTTPServer):
+    """HTTPServer с пулом потоков и настраиваемой очередью accept()"""
+
+    def __init__(self, server_address, handler_class, threads=DEFAULT_THREADS,
+                 queue_size=DEFAULT_QUEUE_SIZE, backlog=DEFAULT_BACKLOG,
+                 connection_timeout=None, asset_cache=None, use_sendfile=True,
+                 ssl_context=None, handshake_timeout=DEFAULT_HANDSHAKE_TIMEOUT,
+                 access_log=None, keep_alive_timeout=DEFAULT_KEEP_ALIVE_TIMEOUT,
+                 max_requests=DEFAULT_MAX_REQUESTS, reuse_port=False, file_index=None,
+                 admission=None, shed_queue=None, header_timeout=DEFAULT_HEADER_TIMEOUT,
+                 bind_and_activate=True):
+        # Воркеры --workers слушают один порт (SO_REUSEPORT, Python 3.11+)
+        self.allow_reuse_port = reuse_port
+        self.connection_timeout = connection_timeout
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_requests = max(1, max_requests)
+        self.access_log = access_log
+        self.ssl_context = ssl_context
+        self.handshake_timeout = handshake_timeout
+        self.tls_stats = HandshakeStats() if ssl_context is not None else None
+        self.use_sendfile = use_sendfile
+        self.asset_cache = asset_cache
+        self.file_index = file_index
+        self.pool_size = max(1, threads)
+        self.pool_queue_size = max(1, queue_size)
+        self.admission = admission
+        # None - сброс при полной очереди; больше очереди не бывает: put() ждал бы
+        if shed_queue is None:
+            shed_queue = self.pool_queue_size
+        self.shed_queue = max(0, min(shed_queue, self.pool_queue_size))
+        if header_timeout and header_timeout > 0:
+            self.read_deadlines = ReadDeadlines(header_timeout, admission)
+        # TCPServer передаёт request_queue_size в listen()
+        self.request_queue_size = max(1, backlog)
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self._start_pool()
+
+
+def report_first_accept(started_at):
+    """Печатает, через сколько после запуска скрипта принято первое соединение"""
+    print(f"⚡ Первое соединение принято через "
+          f"{(time.perf_counter() - started_at) * 1000:.0f} мс после запуска")
+
+
+# Параметры, которые бандл выполняет при сборке или не поддерживает
+BUNDLE_BAKED_OPTIONS = (
+    ('--vendor', 'vendor'),
+    ('--assets', 'assets'),
+    ('--precompress', 'precompress'),
+    ('--gzip-static', 'gzip_static'),
+    ('--live-reload', 'live_reload'),
+)
+
+
+def create_server(server_address, handler_class, options=None, ssl_context=None,
+                  directory=None, started_at=None):
+    """Создаёт сервер выбранного движка с параметрами командной строки
+
+    TLS рукопожатие выполняется для каждого соединения отдельно: в рабочем
+    потоке (threads) или в задаче соединения (asyncio). started_at -
+    time.perf_counter() в начале скрипта: по нему печатается время до
+    первого принятого соединения.
+
+    С --workers N > 1 возвращает WorkerSupervisor: кэш, сжатие, бандл и
+    TLS контекст готовятся здесь, до fork(), и достаются воркерам общими, а
+    сами серверы создаются в дочерних процессах.
+    """
+    http2 = getattr(options, 'http2', False)
+    alpn = DEFAULT_ALPN
+    if http2 and ssl_context is None:
+        # Браузеры говорят HTTP/2 только поверх TLS
+        print("⚠️  --http2 работает только с HTTPS: сервер отвечает по HTTP/1.1")
+        http2 = False
+    elif http2:
+        # Как и asyncio, модуль HTTP/2 (и пакет h2) нужен только с --http2
+        from .http2 import H2_ALPN, http2_available
+        if http2_available():
+            alpn = H2_ALPN
+        else:
+            print("⚠️  Для --http2 нужен пакет h2 (pip install h2): "
+                  "сервер отвечает по HTTP/1.1")
+            http2 = False
+    if ssl_context is not None:
+        configure_server_context(ssl_context, alpn=alpn)
+    root = directory or os.getcwd()
+    bundle_file = getattr(options, 'bundle', None)
+    if bundle_file:
+        # Как и asyncio, модуль бандла нужен только с --bundle
+        from .bundle import open_bundle
+        baked = [flag for flag, name in BUNDLE_BAKED_OPTIONS if getattr(options, name, False)]
+        if baked:
+            print(f"⚠️  С --bundle не действуют {', '.join(baked)}: подмена адресов и "
+                  "сжатие делаются при сборке (python build_bundle.py --vendor --assets), "
+                  "а файлы бандла не меняются")
+        # Бандл - и кэш, и индекс: отображается здесь, до fork() воркеров
+        asset_cache = file_index = open_bundle(
+            os.path.join(root, bundle_file), root, compress=getattr(options, 'compress', True))
+        preload = create_preload(options, directory, source=asset_cache)
+        live_reload = None
+    else:
+        cache_mb = getattr(options, 'cache_size', DEFAULT_CACHE_MB)
+        transforms = []
+        # Путь манифеста -> перечитывание подмены адресов (для --live-reload)
+        reloaders = {}
+        if getattr(options, 'vendor', False):
+            vendor = load_vendor(root)
+            transforms.append(vendor.transform)
+            reloaders[os.path.join(root, VENDOR_DIR, VENDOR_MANIFEST)] = partial(
+                vendor.reload, os.path.join(root, VENDOR_DIR))
+        if getattr(options, 'assets', False):
+            manifest = load_manifest(root)
+            transforms.append(manifest.transform)
+            reloaders[os.path.join(root, ASSETS_DIR, MANIFEST)] = partial(manifest.reload, root)
+        if transforms and cache_mb <= 0:
+            print("⚠️  --vendor и --assets подменяют адреса через кэш: "
+                  "при --cache-size 0 страницы ссылаются на исходные файлы")
+        if getattr(options, 'live_reload', False):
+            if cache_mb <= 0:
+                print("⚠️  Скрипт --live-reload вставляется в HTML через кэш: "
+                      "при --cache-size 0 страницы перезагружаются вручную")
+            transforms.append(inject_snippet)
+        asset_cache = None
+        if cache_mb > 0:
+            asset_cache = AssetCache(
+                int(cache_mb * 1024 * 1024),
+                compress=getattr(options, 'compress', True),
+                persist_gzip=getattr(options, 'gzip_static', False),
+                transforms=transforms)
+            if getattr(options, 'precompress', False) and asset_cache.compress:
+                types = getattr(handler_class, 'extensions_map', None)
+                precompress_tree(
+                    asset_cache, directory or os.getcwd(),
+                    partial(guess_type, extensions_map=types) if types else guess_type)
+
+        file_index = None
+        if getattr(options, 'file_index', True):
+            file_index = shared_index(root)
+        preload = create_preload(options, directory)
+        live_reload = create_live_reload(
+            options, directory, asset_cache, file_index, preload, reloaders)
+
+    build = partial(
+        _build_engine, handler_class=handler_class, options=options,
+        ssl_context=ssl_context, directory=directory, asset_cache=asset_cache,
+        file_index=file_index, preload=preload, live_reload=live_reload, http2=http2)
+    workers = getattr(options, 'workers', 1)
+    if workers > 1:
+        # Как и asyncio, модуль воркеров нужен только с --workers
+        from .workers import WorkerSupervisor, workers_supported
+        if workers_supported():
+            return WorkerSupervisor(
+                server_address, partial(build, reuse_port=True), workers,
+                share_metrics=getattr(options, 'metrics', False))
+        print("⚠️  --workers требует fork() и SO_REUSEPORT: сервер работает одним процессом")
+    httpd = build(server_address)
+    httpd.started_at = started_at
+    return httpd
+
+
+def _build_engine(server_address, worker=None, *, handler_class, options, ssl_context,
+                  directory, asset_cache, file_index, preload, live_reload=None,
+                  http2=False, reuse_port=False):
+    """Сервер движка из --engine; worker - номер воркера в режиме --workers
+
+    Поток --live-reload запускается здесь, после fork(): у каждого воркера
+    свои подписчики, а собирает assets/ только воркер 0.
+    """
+    engine = getattr(options, 'engine', 'threads')
+    timeout = getattr(options, 'timeout', DEFAULT_TIMEOUT)
+    keep_alive_timeout = getattr(options, 'keep_alive_timeout', DEFAULT_KEEP_ALIVE_TIMEOUT)
+    max_requests = getattr(options, 'max_requests', DEFAULT_MAX_REQUESTS)
+    handshake_timeout = getattr(options, 'handshake_timeout', DEFAULT_HANDSHAKE_TIMEOUT)
+    backlog = getattr(options, 'backlog', DEFAULT_BACKLOG)
+    header_timeout = getattr(options, 'header_timeout', DEFAULT_HEADER_TIMEOUT)
+    access_log = create_access_log(options, worker)
+    admission = Admission(
+        max_per_ip=getattr(options, 'max_per_ip', DEFAULT_MAX_PER_IP),
+        rate=getattr(options, 'rate', DEFAULT_RATE),
+        burst=getattr(options, 'burst', DEFAULT_BURST))
+
+    # HTTP/2 сам передаёт обработчику directory, ему нужен исходный класс
+    gateway_class = handler_class
+    if engine == 'asyncio':
+        from .aio import AsyncHTTPServer
+        httpd = AsyncHTTPServer(
+            server_address, handler_class, ssl_context=ssl_context,
+            directory=directory, connection_timeout=timeout,
+            handshake_timeout=handshake_timeout,
+            max_connections=getattr(options, 'max_connections', DEFAULT_MAX_CONNECTIONS),
+            backlog=backlog, asset_cache=asset_cache, access_log=access_log,
+            keep_alive_timeout=keep_alive_timeout, max_requests=max_requests,
+            reuse_port=reuse_port, file_index=file_index, admission=admission,
+            header_timeout=header_timeout)
+    else:
+        if directory is not None:
+            handler_class = partial(handler_class, directory=directory)
+        httpd = ThreadPoolHTTPServer(
+            server_address, handler_class,
+            threads=getattr(options, 'threads', DEFAULT_THREADS),
+            queue_size=getattr(options, 'queue_size', DEFAULT_QUEUE_SIZE),
+            backlog=backlog, connection_timeout=timeout, asset_cache=asset_cache,
+            use_sendfile=getattr(options, 'sendfile', True),
+            ssl_context=ssl_context, handshake_timeout=handshake_timeout,
+            access_log=access_log, keep_alive_timeout=keep_alive_timeout,
+            max_requests=max_requests, reuse_port=reuse_port, file_index=file_index,
+            admission=admission, shed_queue=getattr(options, 'shed_queue', None),
+            header_timeout=header_timeout)
+
+    httpd.log_requests = getattr(options, 'access_log', '-') != 'off'
+    httpd.metrics = Metrics() if getattr(options, 'metrics', False) else None
+    httpd.telemetry = create_telemetry(options, worker)
+    httpd.preload = preload
+    if live_reload is not None:
+        httpd.live_reload = live_reload.start(rebuild=not worker)
+    if http2:
+        from .http2 import HTTP2
+        httpd.http2 = HTTP2(httpd, directory, gateway_class)
+    return httpd
@@ -0,0 +1,486 @@
+"""
+Телеметрия клиентов: POST /__telemetry и компактный журнал замеров на диске
+
+Страницы (debug.html, simple.html, advanced-ar.js) присылают пачки
+замеров: время запуска камеры, FPS, поддержку WebXR. Обработчик только
+кладёт их в ограниченную очередь; фоновый поток дописывает в файл блоки
+до BLOCK_RECORDS замеров. Блок колоночный: замеры сгруппированы по паре
+(метрика, класс устройства), время и значения лежат двумя массивами, а
+в заголовке блока для каждой пары - начало её отрезка и сводка
+count/sum/min/max. Сводный запрос читает только заголовки блоков, запрос
+по одной метрике - ещё и её отрезки значений (8 байт на замер). Журнал
+только дописывается; имена метрик хранятся в самих блоках, поэтому файл
+не требует отдельного словаря.
+"""
+
+import glob
+import json
+import math
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import traceback
+import urllib.parse
+from array import array
+from collections import deque
+
+from .cache import format_size
+from .useragent import device_kind
+
+TELEMETRY_PATH = '/__telemetry'
+# Больше не принимаем: пачка замеров страницы - сотни байт
+MAX_BODY = 64 * 1024
+MAX_SAMPLES = 512
+BLOCK_RECORDS = 4096
+# Ограничение памяти: сверх этого замеры отбрасываются и считаются
+MAX_BUFFERED = 8 * BLOCK_RECORDS
+FLUSH_INTERVAL = 2.0
+METRIC_NAME = re.compile(r'^[a-z][a-z0-9_.]{0,63}$')
+# Значения в журнале - float32 (колонка и min/max отрезка); больше - 400
+MAX_VALUE = struct.unpack('<f', b'\xff\xff\x7f\x7f')[0]
+# Разных имён в журнале (метрики и классы устройств). Словарь файла растёт
+# от присланных имён, а номер имени в отрезке - u16: новые сверх лимита - 400
+MAX_NAMES = 1024
+
+MAGIC = b'ARTL1\n'
+BLOCK_MAGIC = b'BLK1'
+# magic, длина блока после заголовка, замеров, первое и последнее время,
+# новых имён, отрезков
+BLOCK_HEADER = struct.Struct('<4sIIIIHH')
+# Отрезок пары (метрика, устройство): начало, count, sum, min, max
+RUN = struct.Struct('<HHIIdff')
+# За отрезками - колонки блока: время (u32) и значение (f32)
+TIME_SIZE = VALUE_SIZE = 4
+
+
+def parse_report(body):
+    """Замеры из тела запроса: [(метрика, значение)]; ValueError - битый отчёт
+
+    Формат: {"metrics": {"camera_start_ms": 412, "fps": [58.5, 60], "webxr_ar": false}}
+    """
+    report = json.loads(body)
+    metrics = report.get('metrics') if isinstance(report, dict) else None
+    if not isinstance(metrics, dict):
+        raise ValueError('ожидается {"metrics": {...}}')
+    samples = []
+    for name, values in metrics.items():
+        if not isinstance(name, str) or not METRIC_NAME.match(name):
+            raise ValueError(f'имя метрики: {name!r}')
+        if not isinstance(values, list):
+            values = [values]
+        for value in values:
+            if not isinstance(value, (int, float)):
+                raise ValueError(f'значение {name}: {value!r}')
+            try:
+                value = float(value)
+            except OverflowError:
+                # Целое из JSON длиннее double
+                raise ValueError(f'значение {name}: больше double') from None
+            if not math.isfinite(value) or abs(value) > MAX_VALUE:
+                raise ValueError(f'значение {name}: {value!r}')
+            samples.append((name, value))
+    if len(samples) > MAX_SAMPLES:
+        raise ValueError(f'больше {MAX_SAMPLES} замеров')
+    return samples
+
+
+def _column_bytes(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _column(typecode, data):
+    column = array(typecode)
+    column.frombytes(data)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def encode_block(records, names, name_ids):
+    """Блок журнала из [(время, метрика, устройство, значение)]
+
+    names/name_ids - словарь файла; новые имена дописываются в него и в блок.
+    """
+    new_names = []
+
+    def name_id(name):
+        number = name_ids.get(name)
+        if number is None:
+            number = name_ids[name] = len(names)
+            names.append(name)
+            new_names.append(name)
+        return number
+
+    runs = {}
+    for timestamp, metric, device, value in records:
+        key = (name_id(metric), name_id(device))
+        run = runs.get(key)
+        if run is None:
+            run = runs[key] = ([], [])
+        run[0].append(int(timestamp))
+        run[1].append(value)
+    payload = [b''.join(len(encoded).to_bytes(1, 'little') + encoded
+                        for encoded in (name.encode('utf-8') for name in new_names))]
+    times, values = [], []
+    for (metric, device), (run_times, run_values) in runs.items():
+        payload.append(RUN.pack(metric, device, len(times), len(run_values), sum(run_values),
+                                min(run_values), max(run_values)))
+        times.extend(run_times)
+        values.extend(run_values)
+    payload.append(_column_bytes('I', times))
+    payload.append(_column_bytes('f', values))
+    payload = b''.join(payload)
+    header = BLOCK_HEADER.pack(BLOCK_MAGIC, len(payload), len(records), min(times), max(times),
+                               len(new_names), len(runs))
+    return header + payload
+
+
+class _Block:
+    __slots__ = ('first', 'last', 'count', 'runs', 'times_offset')
+
+    def __init__(self, first, last, count, runs, times_offset):
+        self.first = first
+        self.last = last
+        self.count = count
+        self.runs = runs
+        self.times_offset = times_offset
+
+
+class _LogIndex:
+    """Заголовки блоков одного файла; дочитывается по мере роста файла"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.names = []
+        self.blocks = []
+
+    def refresh(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size <= self.offset:
+            return
+        with open(self.path, 'rb') as f:
+            if self.offset == 0:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return
+                self.offset = len(MAGIC)
+            f.seek(self.offset)
+            while self.offset + BLOCK_HEADER.size <= size:
+                header = f.read(BLOCK_HEADER.size)
+                magic, length, count, first, last, new_names, runs = (
+                    BLOCK_HEADER.unpack(header))
+                # Недописанный хвост (воркер пишет прямо сейчас) - в следующий раз
+                if magic != BLOCK_MAGIC or self.offset + BLOCK_HEADER.size + length > size:
+                    return
+                for _ in range(new_names):
+                    self.names.append(f.read(f.read(1)[0]).decode('utf-8'))
+                block_runs = [RUN.unpack(f.read(RUN.size)) for _ in range(runs)]
+                self.offset += BLOCK_HEADER.size + length
+                self.blocks.append(_Block(
+                    first, last, count, block_runs,
+                    self.offset - count * (TIME_SIZE + VALUE_SIZE)))
+                f.seek(self.offset)
+
+    def read_run(self, f, block, start, count, with_times):
+        """Значения отрезка (и время замеров, если with_times)"""
+        times = None
+        if with_times:
+            f.seek(block.times_offset + start * TIME_SIZE)
+            times = _column('I', f.read(count * TIME_SIZE))
+        f.seek(block.times_offset + block.count * TIME_SIZE + start * VALUE_SIZE)
+        return times, _column('f', f.read(count * VALUE_SIZE))
+
+
+class _Aggregate:
+    __slots__ = ('count', 'total', 'low', 'high', 'values')
+
+    def __init__(self, keep_values):
+        self.count = 0
+        self.total = 0.0
+        self.low = math.inf
+        self.high = -math.inf
+        self.values = array('f') if keep_values else None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.low = min(self.low, value)
+        self.high = max(self.high, value)
+        if self.values is not None:
+            self.values.append(value)
+
+    def extend(self, values):
+        if not values:
+            return
+        self.count += len(values)
+        self.total += sum(values)
+        self.low = min(self.low, min(values))
+        self.high = max(self.high, max(values))
+        if self.values is not None:
+            self.values.extend(values)
+
+    def add_summary(self, count, total, low, high):
+        self.count += count
+        self.total += total
+        self.low = min(self.low, low)
+        self.high = max(self.high, high)
+
+    def result(self):
+        result = {'count': self.count, 'mean': round(self.total / self.count, 3),
+                  'min': round(self.low, 3), 'max': round(self.high, 3)}
+        if self.values:
+            values = sorted(self.values)
+            for label, fraction in (('p50', 0.5), ('p95', 0.95)):
+                result[label] = round(values[min(len(values) - 1,
+                                                 int(round(fraction * (len(values) - 1))))], 3)
+        return result
+
+
+class TelemetryLog:
+    """Журнал замеров клиентов с фоновой записью блоками
+
+    query() видит и ещё не записанные замеры этого процесса, и файлы
+    соседних воркеров (telemetry-<номер>.arlog) - с задержкой до
+    FLUSH_INTERVAL.
+    """
+
+    def __init__(self, path, pattern=None, block_records=BLOCK_RECORDS,
+                 max_buffered=MAX_BUFFERED, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        # Файлы, которые читает query(): этот и журналы воркеров
+        self.pattern = pattern or path
+        self.block_records = block_records
+        self.max_buffered = max_buffered
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._records = deque()
+        self._names = []
+        self._name_ids = {}
+        # Имена, принятые add(): словарь файла пополняет только фоновый поток
+        self._accepted = set()
+        self._accepted_lock = threading.Lock()
+        self._indexes = {}
+        self._query_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._file = self._open()
+        self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        # Без буфера: недописанный при ошибке блок не остаётся в памяти до следующего
+        f = open(self.path, 'ab', buffering=0)
+        if f.tell() == 0:
+            f.write(MAGIC)
+            f.flush()
+            return f
+        # Продолжаем словарь имён существующего файла
+        index = _LogIndex(self.path)
+        index.refresh()
+        if index.offset == 0:
+            f.close()
+            raise ValueError(f"{self.path}: не журнал телеметрии")
+        if index.offset < f.tell():
+            # Блок, недописанный при аварийной остановке, отрезаем
+            f.truncate(index.offset)
+        self._names = list(index.names)
+        self._name_ids = {name: number for number, name in enumerate(self._names)}
+        self._accepted.update(self._names)
+        return f
+
+    def add(self, user_agent, samples):
+        """Ставит замеры в очередь; False - очередь полна, замеры отброшены
+
+        ValueError - новые имена метрик сверх MAX_NAMES (отчёт не принят).
+        """
+        if len(self._records) + len(samples) > self.max_buffered:
+            self.dropped += len(samples)
+            return False
+        device = device_kind(user_agent)
+        names = {metric for metric, _ in samples}
+        names.add(device)
+        with self._accepted_lock:
+            new = names - self._accepted
+            if new:
+                if len(self._accepted) + len(new) > MAX_NAMES:
+                    raise ValueError(f'больше {MAX_NAMES} разных метрик')
+                self._accepted.update(new)
+        now = time.time()
+        self._records.extend((now, metric, device, value) for metric, value in samples)
+        if len(self._records) >= self.block_records:
+            self._wakeup.set()
+        return True
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        if self.written:
+            print(f"📈 Телеметрия: записано замеров {self.written} в {self.path} "
+                  f"({format_size(os.path.getsize(self.path))})")
+        if self.dropped:
+            print(f"⚠️  Телеметрия: отброшено замеров при переполнении очереди: {self.dropped}")
+        if self.errors:
+            print(f"⚠️  Телеметрия: не записано замеров из-за ошибок записи: {self.errors}")
+
+    def _run(self):
+        records = self._records
+        while True:
+            # Флаг читаем до выборки: всё, что добавлено раньше, будет записано
+            stopping = self._stopping.is_set()
+            while records:
+                batch = []
+                while records and len(batch) < self.block_records:
+                    batch.append(records.popleft())
+                try:
+                    self._write(batch)
+                except Exception:
+                    # Поток записи не должен умирать: блок теряется, файл и
+                    # словарь перечитываются с диска
+                    print(f"❌ Телеметрия: ошибка записи блока в {self.path}:")
+                    traceback.print_exc()
+                    self.errors += len(batch)
+                    self._recover()
+            if stopping:
+                return
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+
+    def _write(self, batch):
+        """Блок в файл; при ошибке блок отбрасывается, а файл и словарь - как до него"""
+        known = len(self._names)
+        offset = self._file.tell()
+        try:
+            # Один write() на блок: читатели других процессов видят блок целиком
+            self._file.write(encode_block(batch, self._names, self._name_ids))
+            self._file.flush()
+        except (OSError, struct.error, OverflowError) as error:
+            for name in self._names[known:]:
+                del self._name_ids[name]
+            del self._names[known:]
+            try:
+                self._file.truncate(offset)
+            except OSError:
+                pass
+            if not self.errors:
+                print(f"⚠️  Телеметрия: ошибка записи в {self.path}: {error}")
+            self.errors += len(batch)
+            return
+        self.written += len(batch)
+
+    def _recover(self):
+        """Словарь имён и конец файла - по последнему целому блоку на диске"""
+        index = _LogIndex(self.path)
+        index.refresh()
+        try:
+            self._file.truncate(max(index.offset, len(MAGIC)))
+        except OSError:
+            pass
+        self._names = list(index.names)
+        self._name_ids = {name: number for number, name in enumerate(self._names)}
+
+    def query(self, metric=None, since=None):
+        """{метрика: {устройство: {count, mean, min, max[, p50, p95]}}}
+
+        Без metric ответ собирается из сводок в заголовках блоков; с metric
+        читаются колонки только тех блоков, где она есть, и считаются
+        перцентили. since - unix время, с которого учитывать замеры.
+        """
+        aggregates = {}
+
+        def aggregate(metric_name, device):
+            by_device = aggregates.setdefault(metric_name, {})
+            result = by_device.get(device)
+            if result is None:
+                result = by_device[device] = _Aggregate(metric is not None)
+            return result
+
+        with self._query_lock:
+            for path in sorted(set(glob.glob(self.pattern)) | {self.path}):
+                index = self._indexes.get(path)
+                if index is None:
+                    index = self._indexes[path] = _LogIndex(path)
+                index.refresh()
+                self._query_file(index, metric, since, aggregate)
+        for timestamp, name, device, value in list(self._records):
+            if (metric is None or name == metric) and (since is None or timestamp >= since):
+                aggregate(name, device).add(value)
+        return {name: {device: result.result() for device, result in sorted(by_device.items())}
+                for name, by_device in sorted(aggregates.items())}
+
+    def _query_file(self, index, metric, since, aggregate):
+        names = index.names
+        metric_id = None
+        if metric is not None:
+            if metric not in names:
+                return
+            metric_id = names.index(metric)
+        f = None
+        try:
+            for block in index.blocks:
+                if since is not None and block.last < since:
+                    continue
+                # Весь блок в окне - время замеров не нужно
+                whole = since is None or block.first >= since
+                for name_id, device_id, start, count, total, low, high in block.runs:
+                    if metric_id is not None and name_id != metric_id:
+                        continue
+                    target = aggregate(names[name_id], names[device_id])
+                    if whole and metric_id is None:
+                        # Хватает сводки из заголовка
+                        target.add_summary(count, total, low, high)
+                        continue
+                    if f is None:
+                        f = open(index.path, 'rb')
+                    times, values = index.read_run(f, block, start, count, not whole)
+                    if times is not None:
+                        values = array('f', (value for timestamp, value in zip(times, values)
+                                             if timestamp >= since))
+                    target.extend(values)
+        finally:
+            if f is not None:
+                f.close()
+
+    def render(self, query):
+        """Тело ответа GET /__telemetry?metric=fps&since=3600 (since - секунд назад)"""
+        params = urllib.parse.parse_qs(query)
+        metric = params.get('metric', [None])[0]
+        since = params.get('since', [None])[0]
+        try:
+            since = time.time() - float(since) if since else None
+        except ValueError:
+            since = None
+        body = {'metrics': self.query(metric, since)}
+        return json.dumps(body, indent=2, ensure_ascii=False).encode('utf-8'), 'application/json'
+
+
+def create_telemetry(options, worker=None):
+    """Журнал по --telemetry: None - выключен, иначе файл
+
+    С --workers у каждого воркера свой файл (telemetry-<номер>.arlog), а
+    запросы читают их все.
+    """
+    target = getattr(options, 'telemetry', None)
+    if not target:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    root, ext = os.path.splitext(target)
+    pattern = f'{glob.escape(root)}-*{glob.escape(ext)}'
+    if worker is not None:
+        target = f'{root}-{worker}{ext}'
+    return TelemetryLog(target, pattern=pattern)
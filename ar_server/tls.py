@@ -0,0 +1,104 @@
+"""
+TLS: настройка контекста, рукопожатие в рабочем потоке и его статистика
+"""
+
+import ssl
+import threading
+import time
+
+DEFAULT_ALPN = ('http/1.1',)
+# Билетов на соединение: телефон держит несколько параллельных соединений
+SESSION_TICKETS = 2
+# Сколько ждать ответный close_notify при закрытии соединения
+CLOSE_NOTIFY_TIMEOUT = 0.5
+
+
+def configure_server_context(context, alpn=DEFAULT_ALPN):
+    """Включает билеты сессий (возобновление без полного рукопожатия) и ALPN"""
+    context.options &= ~ssl.OP_NO_TICKET
+    if hasattr(context, 'num_tickets'):
+        context.num_tickets = SESSION_TICKETS
+    context.set_alpn_protocols(list(alpn))
+    return context
+
+
+class HandshakeStats:
+    """Счётчики рукопожатий: полные, возобновлённые, неудачные и время"""
+
+    def __init__(self):
+        self.handshakes = 0
+        self.resumed = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, resumed):
+        with self._lock:
+            self.handshakes += 1
+            self.resumed += int(resumed)
+            self.total_seconds += seconds
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'handshakes': self.handshakes,
+                'resumed': self.resumed,
+                'failures': self.failures,
+                'total_seconds': self.total_seconds,
+            }
+
+
+def server_handshake(context, sock, timeout, stats=None):
+    """Оборачивает принятый сокет в TLS и проводит рукопожатие
+
+    Выполняется в рабочем потоке, а не в accept(), поэтому клиент, застрявший
+    на предупреждении о сертификате, держит только свой поток и не дольше
+    timeout. Возвращает SSLSocket или None, если рукопожатие не удалось.
+    """
+    started = time.perf_counter()
+    tls_sock = None
+    try:
+        sock.settimeout(timeout)
+        tls_sock = context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+        tls_sock.do_handshake()
+    except (ssl.SSLError, OSError):
+        if stats is not None:
+            stats.record_failure()
+        (tls_sock or sock).close()
+        return None
+    if stats is not None:
+        stats.record(time.perf_counter() - started, tls_sock.session_reused)
+    return tls_sock
+
+
+def close_tls(sock):
+    """Отправляет close_notify перед закрытием соединения
+
+    Без него клиент считает соединение оборванным и не возобновляет
+    сессию по полученному билету. Возвращает сокет для закрытия.
+    """
+    try:
+        sock.settimeout(CLOSE_NOTIFY_TIMEOUT)
+        return sock.unwrap()
+    except (ssl.SSLError, OSError):
+        return sock
+
+
+def report_handshakes(stats):
+    """Печатает статистику рукопожатий при остановке сервера"""
+    if stats is None:
+        return
+    snapshot = stats.snapshot()
+    if not snapshot['handshakes'] and not snapshot['failures']:
+        return
+    handshakes = snapshot['handshakes'] or 1
+    # asyncio не сообщает длительность рукопожатия - тогда время не печатаем
+    average = (f"среднее {snapshot['total_seconds'] / handshakes * 1000:.1f} мс, "
+               if snapshot['total_seconds'] else '')
+    print(f"🔐 TLS: рукопожатий {snapshot['handshakes']}, возобновлено "
+          f"{snapshot['resumed'] / handshakes * 100:.0f}%, {average}"
+          f"неудачных {snapshot['failures']}")
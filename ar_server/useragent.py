@@ -0,0 +1,21 @@
+"""
+Тип устройства по User-Agent для журнала и метрик
+"""
+
+from functools import lru_cache
+
+MOBILE_MARKERS = ('mobile', 'android', 'iphone')
+# Разных User-Agent на демо немного, а запросов с каждого - сотни
+UA_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=UA_CACHE_SIZE)
+def device_kind(user_agent):
+    """'mobile' или 'desktop'; результат кэшируется для каждой строки User-Agent"""
+    user_agent = (user_agent or '').lower()
+    return 'mobile' if any(marker in user_agent for marker in MOBILE_MARKERS) else 'desktop'
+
+
+def device_icon(user_agent):
+    """Возвращает 📱 для мобильного User-Agent и 💻 для остальных"""
+    return "📱" if device_kind(user_agent) == 'mobile' else "💻"
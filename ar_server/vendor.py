@@ -0,0 +1,172 @@
+"""
+Локальные копии библиотек и текстур с CDN (режим --vendor)
+
+Файлы лежат в vendor/<хост>/<путь URL>: версия уже входит в путь, поэтому
+копии неизменяемы и отдаются с долгим Cache-Control. vendor/manifest.json
+хранит SRI хэш каждой копии.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import urllib.parse
+
+# Всё, что страницы загружают с CDN
+VENDOR_ASSETS = (
+    'https://aframe.io/releases/1.4.0/aframe.min.js',
+    'https://cdn.jsdelivr.net/gh/AR-js-org/AR.js@3.4.5/aframe/build/aframe-ar.min.js',
+    'https://cdn.jsdelivr.net/gh/donmccurdy/aframe-extras@v6.1.1/dist/aframe-extras.min.js',
+    'https://cdn.jsdelivr.net/gh/n5ro/aframe-physics-system@v4.0.1/dist/aframe-physics-system.min.js',
+    'https://cdn.aframe.io/examples/sky/environment/pisa-posx.jpg',
+    'https://cdn.aframe.io/examples/sky/environment/pisa-negx.jpg',
+    'https://cdn.aframe.io/examples/sky/environment/pisa-posy.jpg',
+    'https://cdn.aframe.io/examples/sky/environment/pisa-negy.jpg',
+    'https://cdn.aframe.io/examples/sky/environment/pisa-posz.jpg',
+    'https://cdn.aframe.io/examples/sky/environment/pisa-negz.jpg',
+)
+VENDOR_DIR = 'vendor'
+VENDOR_PREFIX = '/vendor/'
+MANIFEST = 'manifest.json'
+FETCH_TIMEOUT = 30
+VENDOR_HOSTS = frozenset(urllib.parse.urlsplit(url).netloc for url in VENDOR_ASSETS)
+
+
+def local_path(url):
+    """Путь копии относительно vendor/: <хост>/<путь URL>"""
+    parts = urllib.parse.urlsplit(url)
+    return parts.netloc + parts.path
+
+
+def integrity(data):
+    """SRI хэш в формате атрибута integrity"""
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode('ascii')
+
+
+def origin_url(url_path):
+    """Адрес на CDN для отсутствующей копии (только известные хосты)"""
+    path = urllib.parse.urlsplit(url_path).path
+    if not path.startswith(VENDOR_PREFIX):
+        return None
+    host, _, rest = path[len(VENDOR_PREFIX):].partition('/')
+    if host not in VENDOR_HOSTS:
+        return None
+    return f'https://{host}/{rest}'
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f).get('assets', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(directory, assets):
+    fd, tmp_path = tempfile.mkstemp(prefix='.manifest-', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'assets': assets}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+
+def open_source(url, mirror):
+    """Открывает URL на CDN или его копию в зеркале (каталог или базовый URL)"""
+    # urllib.request нужен только fetch_vendor.py, а не серверу
+    import urllib.request
+
+    if mirror is None:
+        return urllib.request.urlopen(url, timeout=FETCH_TIMEOUT)
+    if '://' in mirror:
+        return urllib.request.urlopen(
+            mirror.rstrip('/') + '/' + local_path(url), timeout=FETCH_TIMEOUT)
+    return open(os.path.join(mirror, local_path(url)), 'rb')
+
+
+def fetch_assets(directory=VENDOR_DIR, mirror=None, urls=VENDOR_ASSETS, force=False):
+    """Скачивает недостающие копии и проверяет их по хэшам из манифеста
+
+    Хэш фиксируется при первой загрузке; если источник позже отдаёт
+    другие байты, копия не заменяется. Возвращает число ошибок.
+    """
+    os.makedirs(directory, exist_ok=True)
+    assets = read_manifest(directory)
+    errors = 0
+    for url in urls:
+        path = os.path.join(directory, local_path(url))
+        known = assets.get(url)
+        if known and not force and os.path.isfile(path):
+            print(f"   ✅ {local_path(url)}")
+            continue
+        try:
+            with open_source(url, mirror) as source:
+                data = source.read()
+        except OSError as e:
+            print(f"   ❌ {url}: {e}")
+            errors += 1
+            continue
+        digest = integrity(data)
+        if known and known['integrity'] != digest:
+            print(f"   ❌ {url}: хэш не совпадает с манифестом")
+            errors += 1
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.vendor-', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        assets[url] = {'path': local_path(url), 'integrity': digest, 'size': len(data)}
+        print(f"   ⬇️  {local_path(url)} ({len(data) / 1024:.1f} КБ)")
+    write_manifest(directory, assets)
+    return errors
+
+
+class VendorMap:
+    """Подмена адресов CDN на локальные копии в HTML страницах
+
+    Берутся только копии, прошедшие проверку хэша; для остальных в
+    странице остаётся адрес CDN.
+    """
+
+    def __init__(self, urls):
+        self.urls = dict(urls)
+        self._replacements = [(url.encode(), local.encode()) for url, local in self.urls.items()]
+
+    @classmethod
+    def load(cls, directory):
+        urls = {}
+        for url, asset in read_manifest(directory).items():
+            try:
+                with open(os.path.join(directory, asset['path']), 'rb') as f:
+                    data = f.read()
+            except (OSError, KeyError):
+                continue
+            if integrity(data) == asset.get('integrity'):
+                urls[url] = VENDOR_PREFIX + asset['path']
+        return cls(urls)
+
+    def reload(self, directory):
+        """Перечитывает манифест копий (--live-reload)"""
+        fresh = self.load(directory)
+        self.urls = fresh.urls
+        self._replacements = fresh._replacements
+
+    def __len__(self):
+        return len(self.urls)
+
+    def transform(self, path, content_type, body):
+        """Переписывает адреса в HTML; остальные файлы возвращает как есть"""
+        if not content_type.startswith('text/html'):
+            return body
+        for url, local in self._replacements:
+            body = body.replace(url, local)
+        return body
+
+
+def load_vendor(root):
+    """Загружает копии из <root>/vendor и печатает, сколько их найдено"""
+    vendor = VendorMap.load(os.path.join(root, VENDOR_DIR))
+    missing = len(VENDOR_ASSETS) - len(vendor)
+    hint = f", {missing} с CDN (python fetch_vendor.py)" if missing else ""
+    print(f"📚 Локальные копии CDN: {len(vendor)} из {len(VENDOR_ASSETS)}{hint}")
+    return vendor
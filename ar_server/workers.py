@@ -0,0 +1,256 @@
+"""
+Несколько процессов на одном порту (--workers N, SO_REUSEPORT)
+
+Каждый воркер - сервер выбранного движка со своим слушающим сокетом на
+общем порту; ядро само раскладывает новые соединения между ними, поэтому
+TLS и код обработчиков выполняются на нескольких ядрах, а не под одним
+GIL. Родитель ничего не обслуживает: держит порт, перезапускает упавшие
+воркеры и останавливает их по Ctrl+C.
+"""
+
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from .metrics import retire_shared
+from .qr import QRCodes
+
+# Сколько ждать воркеры после SIGTERM, прежде чем SIGKILL
+STOP_TIMEOUT = 5.0
+# Воркер, упавший быстрее MIN_UPTIME после запуска, перезапускается с паузой:
+# ошибка при старте не должна превращаться в бесконечный цикл fork()
+MIN_UPTIME = 1.0
+RESTART_DELAY = 1.0
+POLL_INTERVAL = 0.2
+
+
+def workers_supported():
+    """fork() и SO_REUSEPORT есть в Linux и macOS, но не в Windows"""
+    return hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')
+
+
+def reserve_port(server_address):
+    """Проверяет, что порт свободен, и закрепляет его за воркерами
+
+    Пробный сокет без SO_REUSEPORT не привяжется к занятому порту, даже
+    если его держит другой сервер с --workers, - отсюда обычная ошибка
+    "Address already in use". Затем порт занимает сокет с SO_REUSEPORT
+    без listen(): соединения на него ядро не направляет, а порт 0
+    превращается в конкретный номер для всех воркеров.
+    """
+    host, port = server_address[:2]
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    with socket.socket(family) as probe:
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        probe.bind((host, port))
+        port = probe.getsockname()[1]
+    sock = socket.socket(family)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _stop_worker(signum, frame):
+    # Второй SIGTERM (например, и от родителя, и по закрытию канала) не
+    # должен прервать уже идущую остановку
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def _control_loop(control, httpd):
+    """Команды родителя по каналу; конец канала - родитель завершился"""
+    with os.fdopen(control, 'rb') as pipe:
+        for line in pipe:
+            message = json.loads(line)
+            if 'qr_urls' in message:
+                httpd.qr_codes = QRCodes(message['qr_urls'])
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+class _Worker:
+    __slots__ = ('index', 'started', 'control')
+
+    def __init__(self, index, started, control):
+        self.index = index
+        self.started = started
+        self.control = control
+
+
+class WorkerSupervisor:
+    """Родительский процесс --workers с интерфейсом socketserver
+
+    serve_forever, shutdown, server_close и контекстный менеджер ведут себя
+    как у одиночного сервера, а порт занимается в конструкторе, поэтому
+    запускающие скрипты обрабатывают Ctrl+C и "Address already in use"
+    без изменений. build(server_address, worker) создаёт сервер воркера
+    уже в дочернем процессе, с SO_REUSEPORT.
+    """
+
+    def __init__(self, server_address, build, count, share_metrics=False):
+        self._socket = reserve_port(server_address)
+        self.server_address = self._socket.getsockname()[:2]
+        self.count = count
+        self._build = build
+        self.metrics_dir = tempfile.mkdtemp(prefix='ar-metrics-') if share_metrics else None
+        self._qr_codes = None
+        self._workers = {}
+        self._stopping = threading.Event()
+        self._finished = threading.Event()
+        self._finished.set()
+        # Воркеры запускаются сразу: пока в родителе нет других потоков,
+        # fork() безопасен
+        for index in range(count):
+            self._spawn(index)
+        print(f"👷 Воркеров: {count} на порту {self.server_address[1]} (SO_REUSEPORT)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+    @property
+    def qr_codes(self):
+        return self._qr_codes
+
+    @qr_codes.setter
+    def qr_codes(self, qr_codes):
+        # Скрипт задаёт коды после запуска воркеров: адреса уходят им по
+        # каналу, а перезапущенные воркеры получают их при fork()
+        self._qr_codes = qr_codes
+        message = (json.dumps({'qr_urls': qr_codes.urls}) + '\n').encode('utf-8')
+        for worker in list(self._workers.values()):
+            try:
+                os.write(worker.control, message)
+            except OSError:
+                pass
+
+    def _metrics_name(self, index, pid):
+        return f'worker-{index}-{pid}'
+
+    def _spawn(self, index):
+        control_read, control_write = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            os.close(control_write)
+            code = 1
+            try:
+                code = self._run_worker(index, control_read)
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        os.close(control_read)
+        self._workers[pid] = _Worker(index, time.monotonic(), control_write)
+
+    def _run_worker(self, index, control):
+        """Тело дочернего процесса; возвращает код выхода"""
+        # Ctrl+C получает вся группа процессов: воркер ждёт SIGTERM от родителя
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, _stop_worker)
+        self._socket.close()
+        # Чужие каналы закрываем, иначе воркер не увидит конец своего
+        for worker in self._workers.values():
+            os.close(worker.control)
+        try:
+            httpd = self._build(self.server_address, index)
+        except KeyboardInterrupt:
+            return 0
+        except Exception:
+            traceback.print_exc()
+            return 1
+        if httpd.metrics is not None and self.metrics_dir is not None:
+            httpd.metrics.share(
+                self.metrics_dir, self._metrics_name(index, os.getpid()), httpd.tls_stats,
+                httpd.admission)
+        if self._qr_codes is not None:
+            httpd.qr_codes = QRCodes(self._qr_codes.urls)
+        threading.Thread(
+            target=_control_loop, args=(control, httpd), name='worker-control',
+            daemon=True).start()
+        try:
+            with httpd:
+                httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    def _reap(self):
+        """Забирает завершившиеся воркеры и, если сервер не останавливается, заменяет их"""
+        for pid in list(self._workers):
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status = pid, 0
+            if done == 0:
+                continue
+            worker = self._workers.pop(pid)
+            os.close(worker.control)
+            if self.metrics_dir is not None:
+                retire_shared(self.metrics_dir, self._metrics_name(worker.index, pid))
+            if self._stopping.is_set():
+                continue
+            print(f"⚠️  Воркер {worker.index} (pid {pid}) завершился с кодом "
+                  f"{os.waitstatus_to_exitcode(status)}, перезапуск")
+            if time.monotonic() - worker.started < MIN_UPTIME:
+                time.sleep(RESTART_DELAY)
+            self._spawn(worker.index)
+
+    def serve_forever(self):
+        self._finished.clear()
+        self._stopping.clear()
+        # SIGTERM родителю (systemd, docker stop) - та же остановка, что по Ctrl+C
+        previous = None
+        if threading.current_thread() is threading.main_thread():
+            previous = signal.signal(signal.SIGTERM, _stop_worker)
+        try:
+            while not self._stopping.is_set():
+                self._reap()
+                self._stopping.wait(POLL_INTERVAL)
+        finally:
+            if previous is not None:
+                signal.signal(signal.SIGTERM, previous)
+            self._finished.set()
+
+    def shutdown(self):
+        self._stopping.set()
+        self._finished.wait()
+
+    def server_close(self):
+        self._stopping.set()
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + STOP_TIMEOUT
+        while self._workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid, worker in list(self._workers.items()):
+            print(f"⚠️  Воркер {worker.index} (pid {pid}) не остановился за "
+                  f"{STOP_TIMEOUT:g} с, SIGKILL")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            os.close(worker.control)
+        self._workers = {}
+        self._socket.close()
+        if self.metrics_dir is not None:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
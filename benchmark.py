@@ -0,0 +1,2313 @@
+#!/usr/bin/env python3
+"""
+Замеры и проверки серверного слоя веб-AR
+Каждый сценарий поднимает сервер на свободном порту 127.0.0.1
+"""
+
+import argparse
+import asyncio
+import builtins
+import html
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from functools import partial
+
+from ar_server import (
+    CAMERA_HEADERS, CORS_HEADERS, ISOLATION_HEADERS, ARRequestHandler, CertificateManager,
+    ThreadPoolHTTPServer, create_server,
+)
+from ar_server.accesslog import AccessLog
+from ar_server.metrics import Metrics
+from ar_server.useragent import device_kind
+from ar_server.options import parse_server_args
+from ar_server.qr import QRCodes, encode_matrix, qr_urls
+from ar_server.vendor import VENDOR_DIR, VendorMap
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class QuietHandler(ARRequestHandler):
+    """Обработчик с заголовками start_server.py без вывода в консоль"""
+
+    extra_headers = CORS_HEADERS + ISOLATION_HEADERS
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MobileQuietHandler(QuietHandler):
+    """Заголовки start_mobile_server.py"""
+
+    extra_headers = CORS_HEADERS + CAMERA_HEADERS + ISOLATION_HEADERS
+
+
+class HTTPSQuietHandler(QuietHandler):
+    """Заголовки start_https.py"""
+
+    extra_headers = CORS_HEADERS + CAMERA_HEADERS
+
+
+class SimpleHTTPSQuietHandler(QuietHandler):
+    """Заголовки simple_https.py"""
+
+    extra_headers = (
+        ('Access-Control-Allow-Origin', '*'),
+        ('Permissions-Policy', 'camera=*, microphone=*'),
+    )
+
+
+# Скрипт запуска -> (обработчик с его заголовками, TLS)
+LAUNCHERS = {
+    'start_server': (QuietHandler, False),
+    'start_mobile_server': (MobileQuietHandler, False),
+    'start_https': (HTTPSQuietHandler, True),
+    'simple_https': (SimpleHTTPSQuietHandler, True),
+}
+PHONE_USER_AGENT = ('Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 '
+                    '(KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36')
+PAGE_REFERENCE = re.compile(r'\b(?:src|href)="([^"]+)"')
+
+
+class StdlibCopyHandler(QuietHandler):
+    """Исходный путь копирования через shutil.copyfileobj (только целые файлы)"""
+
+    def copy_range(self, source, offset, count, outputfile):
+        source.seek(offset)
+        shutil.copyfileobj(source, outputfile)
+
+
+def _serve_in_child(argv, ports, directory, handler_class, ssl_files):
+    options = parse_server_args('benchmark', argv)
+    context = None
+    if ssl_files is not None:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*ssl_files)
+    server = create_server(('127.0.0.1', 0), handler_class, options,
+                           ssl_context=context, directory=directory)
+    server.log_requests = False
+    ports.put(server.server_address[1])
+    # terminate() - SIGTERM: сервер с --workers останавливает воркеры сам
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+class ServerProcess:
+    """Сервер в отдельном процессе, чтобы клиенты не делили с ним GIL"""
+
+    def __init__(self, argv, directory=ROOT, handler_class=QuietHandler, ssl_files=None):
+        self.argv = list(argv)
+        self.directory = directory
+        self.handler_class = handler_class
+        self.ssl_files = ssl_files
+        self.port = None
+        self._process = None
+
+    def __enter__(self):
+        ports = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_serve_in_child,
+            args=(self.argv, ports, self.directory, self.handler_class, self.ssl_files),
+            daemon=True)
+        self._process.start()
+        self.port = ports.get(timeout=10)
+        return self
+
+    def __exit__(self, *args):
+        self._process.terminate()
+        self._process.join()
+
+    def processes(self):
+        """pid сервера и его воркеров (--workers) по /proc"""
+        pids = [self._process.pid]
+        for name in os.listdir('/proc'):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            if int(fields[1]) == self._process.pid:
+                pids.append(int(name))
+        return pids
+
+    def cpu_seconds(self):
+        """Процессорное время сервера и воркеров (user + system) из /proc"""
+        total = 0
+        for pid in self.processes():
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            # utime и stime - 14-е и 15-е поля, считая от pid
+            total += int(fields[11]) + int(fields[12])
+        return total / os.sysconf('SC_CLK_TCK')
+
+    def memory(self):
+        """Текущий и пиковый RSS сервера в байтах из /proc (с воркерами - сумма)"""
+        values = {}
+        for pid in self.processes():
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    for line in f:
+                        name, _, value = line.partition(':')
+                        if name in ('VmRSS', 'VmHWM'):
+                            values[name] = values.get(name, 0) + int(value.split()[0]) * 1024
+            except OSError:
+                pass
+        return values.get('VmRSS', float('nan')), values.get('VmHWM', float('nan'))
+
+    def proportional_memory(self):
+        """PSS и личная память сервера с воркерами (/proc/*/smaps_rollup), байты
+
+        В RSS каждого воркера целиком входят общие страницы (бандл в кэше
+        ядра), в PSS - их доля: сумма PSS - честный расход памяти.
+        """
+        values = {}
+        for pid in self.processes():
+            try:
+                with open(f'/proc/{pid}/smaps_rollup') as f:
+                    for line in f:
+                        name, _, value = line.partition(':')
+                        if name in ('Pss', 'Private_Clean', 'Private_Dirty'):
+                            values[name] = values.get(name, 0) + int(value.split()[0]) * 1024
+            except OSError:
+                pass
+        return (values.get('Pss', float('nan')),
+                values.get('Private_Clean', 0) + values.get('Private_Dirty', 0))
+
+
+def percentile(values, fraction):
+    """Перцентиль по отсортированной выборке (ближайший ранг)"""
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def start_background(server):
+    """Запускает serve_forever в фоновом потоке"""
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def fetch(url, timeout):
+    """Возвращает время загрузки URL в секундах или None по таймауту"""
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+    except (OSError, socket.timeout):
+        return None
+    return time.perf_counter() - started
+
+
+def open_slow_clients(port, count):
+    """Открывает соединения, которые так и не дописывают запрос"""
+    clients = []
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(b'GET /index.html HTTP/1.1\r\nHost: localhost\r\n')
+        clients.append(sock)
+    return clients
+
+
+def run_slow_clients(threads, slow, timeout):
+    handler = partial(QuietHandler, directory=ROOT)
+    server = ThreadPoolHTTPServer(('127.0.0.1', 0), handler, threads=threads)
+    port = server.server_address[1]
+    start_background(server)
+    clients = open_slow_clients(port, slow)
+    try:
+        # Даём пулу разобрать медленные соединения
+        time.sleep(0.2)
+        return fetch(f'http://127.0.0.1:{port}/index.html', timeout)
+    finally:
+        for sock in clients:
+            sock.close()
+        server.shutdown()
+        server.server_close()
+
+
+def bench_slow_clients(args):
+    """N медленных клиентов не должны блокировать быстрого"""
+    print(f"🐢 Медленных клиентов: {args.slow}, таймаут быстрого запроса: {args.timeout} с")
+    failed = False
+    for threads in (1, args.slow + 2):
+        elapsed = run_slow_clients(threads, args.slow, args.timeout)
+        if elapsed is None:
+            result = "❌ таймаут"
+            failed = failed or threads > args.slow
+        else:
+            result = f"✅ {elapsed * 1000:.1f} мс"
+        print(f"   🧵 потоков: {threads:3d} -> {result}")
+    return 1 if failed else 0
+
+
+async def keepalive_client(port, path, requests, timeout):
+    """Открывает соединение и делает несколько keep-alive запросов подряд"""
+    latencies = []
+    writer = None
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            if writer is None:
+                # Сервер без keep-alive закрывает соединение после ответа
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection('127.0.0.1', port), timeout)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+            length = 0
+            reuse = head.startswith(b'HTTP/1.1')
+            for line in head.lower().split(b'\r\n'):
+                if line.startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+                elif line.startswith(b'connection:'):
+                    reuse = b'close' not in line
+            await asyncio.wait_for(reader.readexactly(length), timeout)
+            if not head.split(b' ', 2)[1] == b'200':
+                raise ConnectionError(head.split(b'\r\n', 1)[0].decode())
+            latencies.append(time.perf_counter() - started)
+            if not reuse:
+                writer.close()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+    return latencies
+
+
+async def concurrency_level(port, clients, requests, timeout):
+    tasks = [keepalive_client(port, '/style.css', requests, timeout)
+             for _ in range(clients)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    latencies = [value for result in results if isinstance(result, list) for value in result]
+    failures = sum(1 for result in results if isinstance(result, BaseException))
+    return elapsed, latencies, failures
+
+
+def bench_concurrency(args):
+    """Потолок одновременных keep-alive клиентов для движка"""
+    levels = [int(level) for level in args.levels.split(',')]
+    argv = ['--engine', args.engine, '--timeout', str(args.timeout),
+            '--max-connections', str(max(levels)), '--backlog', str(max(levels))]
+    print(f"⚙️  Движок: {args.engine}, запросов на соединение: {args.requests}")
+    ceiling = 0
+    with ServerProcess(argv) as server:
+        for clients in levels:
+            elapsed, latencies, failures = asyncio.run(
+                concurrency_level(server.port, clients, args.requests, args.timeout))
+            ok = failures == 0 and percentile(latencies, 0.95) < args.slo
+            if ok:
+                ceiling = clients
+            print(f"   {'✅' if ok else '❌'} клиентов: {clients:5d}  "
+                  f"ошибок: {failures:4d}  "
+                  f"p50: {percentile(latencies, 0.5) * 1000:7.1f} мс  "
+                  f"p95: {percentile(latencies, 0.95) * 1000:7.1f} мс  "
+                  f"запросов/с: {len(latencies) / elapsed:8.0f}")
+    print(f"📈 Потолок при p95 < {args.slo * 1000:.0f} мс без ошибок: {ceiling} клиентов")
+    return 0
+
+
+def download(port, path, count):
+    """Скачивает файл count раз по одному соединению на запрос"""
+    total = 0
+    for _ in range(count):
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}') as response:
+            while True:
+                chunk = response.read(1024 * 1024)
+                if not chunk:
+                    break
+                total += len(chunk)
+    return total
+
+
+def bench_sendfile(args):
+    """Процессорное время сервера на гигабайт: os.sendfile против буфера"""
+    size = args.size * 1024 * 1024
+    count = max(1, args.total * 1024 // args.size)
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'texture.bin'), 'wb') as f:
+            f.write(os.urandom(size))
+        print(f"📦 Файл {args.size} МБ x {count} загрузок по HTTP")
+        variants = (
+            ('os.sendfile', [], QuietHandler),
+            ('буфер memoryview', ['--no-sendfile'], QuietHandler),
+            ('shutil.copyfileobj', [], StdlibCopyHandler),
+        )
+        for label, argv, handler_class in variants:
+            argv = argv + ['--cache-size', '0']
+            with ServerProcess(argv, directory, handler_class) as server:
+                cpu_before = server.cpu_seconds()
+                started = time.perf_counter()
+                total = download(server.port, '/texture.bin', count)
+                elapsed = time.perf_counter() - started
+                cpu = server.cpu_seconds() - cpu_before
+            gigabytes = total / 1024 ** 3
+            print(f"   {label:18s} CPU сервера: {cpu / gigabytes:6.2f} с/ГБ  "
+                  f"скорость: {gigabytes / elapsed * 1024:7.0f} МБ/с")
+    return 0
+
+
+def tls_request(context, port, session=None, timeout=5.0):
+    """Рукопожатие и один запрос; возвращает (время рукопожатия, сессия, возобновлена)"""
+    with socket.create_connection(('127.0.0.1', port), timeout=timeout) as raw:
+        started = time.perf_counter()
+        with context.wrap_socket(raw, server_hostname='localhost', session=session) as sock:
+            elapsed = time.perf_counter() - started
+            sock.sendall(b'GET /index.html HTTP/1.0\r\nHost: localhost\r\n\r\n')
+            # Билеты TLS 1.3 приходят после рукопожатия - читаем ответ до конца
+            while sock.recv(65536):
+                pass
+            return elapsed, sock.session, sock.session_reused
+
+
+def bench_tls(args):
+    """Время TLS рукопожатия, доля возобновлений и зависшие клиенты"""
+    with tempfile.TemporaryDirectory() as directory:
+        manager = CertificateManager(directory, hosts=['localhost', '127.0.0.1'])
+        server_context = manager.create_context()
+        if server_context is None:
+            return 1
+        client_context = ssl.create_default_context(cafile=manager.cert_file)
+
+        options = parse_server_args('benchmark', [
+            '--engine', args.engine, '--handshake-timeout', str(args.handshake_timeout),
+            '--access-log', 'off'])
+        server = create_server(('127.0.0.1', 0), QuietHandler, options,
+                               ssl_context=server_context, directory=ROOT)
+        port = server.server_address[1]
+        start_background(server)
+        # Клиенты, которые подключились и молчат, как телефон на экране
+        # предупреждения о сертификате
+        stalled = [socket.create_connection(('127.0.0.1', port)) for _ in range(args.stalled)]
+        try:
+            print(f"🔐 Движок: {args.engine}, зависших клиентов: {args.stalled}, "
+                  f"рукопожатий: {args.requests}")
+            full, resumed, reused = [], [], 0
+            for _ in range(args.requests):
+                elapsed, session, _ = tls_request(client_context, port)
+                full.append(elapsed)
+                elapsed, _, was_reused = tls_request(client_context, port, session)
+                resumed.append(elapsed)
+                reused += was_reused
+            for label, values in (('полное', full), ('с билетом', resumed)):
+                print(f"   {label:10s} p50: {percentile(values, 0.5) * 1000:6.2f} мс  "
+                      f"p95: {percentile(values, 0.95) * 1000:6.2f} мс")
+            print(f"   ♻️  возобновлено: {reused}/{args.requests} "
+                  f"({reused / args.requests * 100:.0f}%)")
+        finally:
+            for sock in stalled:
+                sock.close()
+            server.shutdown()
+            server.server_close()
+    return 0 if reused else 1
+
+
+def legacy_rsa_certificate(directory):
+    """Прежний сертификат start_https.py: RSA 4096 без SAN"""
+    cert_file = os.path.join(directory, 'cert.pem')
+    key_file = os.path.join(directory, 'key.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:4096', '-keyout', key_file,
+        '-out', cert_file, '-days', '365', '-nodes', '-subj', '/CN=localhost',
+    ], check=True, capture_output=True)
+    return cert_file, key_file
+
+
+def full_handshakes(cert_file, key_file, count):
+    """Время полных рукопожатий (без билетов) с данным сертификатом"""
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert_file, key_file)
+    client_context = ssl.create_default_context(cafile=cert_file)
+    client_context.check_hostname = False
+    options = parse_server_args('benchmark', ['--access-log', 'off'])
+    server = create_server(('127.0.0.1', 0), QuietHandler, options,
+                           ssl_context=server_context, directory=ROOT)
+    start_background(server)
+    try:
+        return [tls_request(client_context, server.server_address[1])[0] for _ in range(count)]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_certs(args):
+    """Холодный и тёплый старт сертификата и цена рукопожатия: RSA 4096 против ECDSA P-256"""
+    with tempfile.TemporaryDirectory() as directory:
+        rsa_dir = os.path.join(directory, 'rsa')
+        os.mkdir(rsa_dir)
+        started = time.perf_counter()
+        try:
+            rsa_files = legacy_rsa_certificate(rsa_dir)
+        except (OSError, subprocess.CalledProcessError):
+            print("❌ Нужен openssl")
+            return 1
+        rsa_cold = time.perf_counter() - started
+
+        manager = CertificateManager(os.path.join(directory, 'ecdsa'))
+        started = time.perf_counter()
+        manager.ensure()
+        ecdsa_cold = time.perf_counter() - started
+        started = time.perf_counter()
+        manager.ensure()
+        ecdsa_warm = time.perf_counter() - started
+
+        print(f"⏱️  Выпуск сертификата: RSA 4096 {rsa_cold * 1000:.0f} мс, "
+              f"ECDSA P-256 {ecdsa_cold * 1000:.0f} мс, из кэша {ecdsa_warm * 1000:.2f} мс")
+        for label, files in (('RSA 4096', rsa_files),
+                             ('ECDSA P-256', (manager.cert_file, manager.key_file))):
+            latencies = full_handshakes(*files, args.requests)
+            print(f"   🤝 {label:12s} полное рукопожатие p50: "
+                  f"{percentile(latencies, 0.5) * 1000:6.2f} мс  "
+                  f"p95: {percentile(latencies, 0.95) * 1000:6.2f} мс")
+    return 0
+
+
+def legacy_log_line(client, user_agent, requestline, status, size):
+    """Прежний log_message: классификация User-Agent и print на каждый запрос"""
+    user_agent = user_agent.lower()
+    icon = "📱" if any(marker in user_agent for marker in ('mobile', 'android', 'iphone')) else "💻"
+    print(f'{icon} {client} - "{requestline}" {status} {size}', flush=True)
+
+
+def bench_logging(args):
+    """Цена журнала на запрос: print в обработчике против очереди AccessLog"""
+    agents = [f'Mozilla/5.0 (Linux; Android 13; Pixel {index}) AppleWebKit/537.36 '
+              f'Chrome/120.0 Mobile Safari/537.36' for index in range(args.agents)]
+    records = [('192.168.1.%d' % (index % 250), agents[index % len(agents)],
+                'GET /ar-app.js HTTP/1.1', 200, 13508) for index in range(args.records)]
+    with tempfile.TemporaryDirectory() as directory:
+        stdout = sys.stdout
+        with open(os.devnull, 'w') as sink:
+            sys.stdout = sink
+            try:
+                started = time.perf_counter()
+                for record in records:
+                    legacy_log_line(*record)
+                legacy = time.perf_counter() - started
+            finally:
+                sys.stdout = stdout
+
+        for log_format in ('text', 'json'):
+            access_log = AccessLog(os.path.join(directory, f'access.{log_format}'), log_format,
+                                   queue_size=len(records))
+            started = time.perf_counter()
+            for record in records:
+                access_log.log(*record)
+            enqueue = time.perf_counter() - started
+            access_log.close()
+            drained = time.perf_counter() - started
+            print(f"   📝 AccessLog {log_format:4s}: в обработчике "
+                  f"{enqueue / len(records) * 1e6:5.2f} мкс/запрос, "
+                  f"запись в фоне {drained / len(records) * 1e6:5.2f} мкс/запрос")
+    print(f"   🐌 print на запрос:     в обработчике {legacy / len(records) * 1e6:5.2f} мкс/запрос")
+
+    device_kind.cache_clear()
+    started = time.perf_counter()
+    for record in records:
+        device_kind(record[1])
+    cached = time.perf_counter() - started
+    started = time.perf_counter()
+    for record in records:
+        device_kind.__wrapped__(record[1])
+    uncached = time.perf_counter() - started
+    print(f"   📱 Классификация User-Agent ({args.agents} разных): "
+          f"без кэша {uncached / len(records) * 1e9:4.0f} нс, "
+          f"LRU {cached / len(records) * 1e9:4.0f} нс")
+    return 0
+
+
+class LockedMetrics(Metrics):
+    """Для сравнения: общие счётчики под одной блокировкой"""
+
+    def __init__(self):
+        super().__init__()
+        self._shared = None
+        self._record_lock = threading.Lock()
+
+    def _shard(self):
+        if self._shared is None:
+            self._shared = super()._shard()
+        return self._shared
+
+    def record(self, *args):
+        with self._record_lock:
+            super().record(*args)
+
+
+def bench_metrics(args):
+    """Цена учёта запроса в /__metrics при нескольких рабочих потоках"""
+    agents = ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_0) Mobile/15E148',
+              'Mozilla/5.0 (X11; Linux x86_64) Chrome/120.0')
+    paths = [f'/file{index}.js' for index in range(args.paths)]
+
+    def worker(metrics, offset):
+        for index in range(args.records):
+            metrics.record(paths[(offset + index) % len(paths)], 200, 13508,
+                           0.002, agents[index % 2])
+
+    for name, metrics in (('по потокам', Metrics()), ('одна блокировка', LockedMetrics())):
+        threads = [threading.Thread(target=worker, args=(metrics, index))
+                   for index in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        total = args.records * args.threads
+        print(f"   📈 {name:15s}: {elapsed / total * 1e9:5.0f} нс/запрос "
+              f"({args.threads} потоков, {total} запросов)")
+    started = time.perf_counter()
+    body, _ = metrics.render('')
+    print(f"   🧾 /__metrics: {len(body) / 1024:.1f} КБ за "
+          f"{(time.perf_counter() - started) * 1000:.1f} мс ({args.paths} путей)")
+    return 0
+
+
+def bench_qr(args):
+    """QR коды адресов: кодирование, чтение из .qr-cache/ и отдача картинок"""
+    urls = qr_urls(['192.168.1.%d' % index for index in range(2, 2 + args.addresses)],
+                   8000, https_port=8443)
+    started = time.perf_counter()
+    matrices = [encode_matrix(url) for url in urls]
+    encoded = time.perf_counter() - started
+    if None in matrices:
+        print("   ❌ Нужен пакет qrcode: pip install qrcode")
+        return 1
+    with tempfile.TemporaryDirectory() as directory:
+        QRCodes(urls, directory).matrix(urls[0])
+        for url in urls[1:]:
+            QRCodes(urls, directory).matrix(url)
+        # Новый запуск: матрицы читаются из кэша, а не кодируются
+        started = time.perf_counter()
+        codes = QRCodes(urls, directory)
+        for url in urls:
+            codes.matrix(url)
+        cached = time.perf_counter() - started
+        print(f"   🔳 {len(urls)} адресов: кодирование {encoded * 1000:6.1f} мс, "
+              f"из кэша {cached * 1000:5.1f} мс")
+        for path in ('/__qr.svg', '/__qr.png'):
+            started = time.perf_counter()
+            body, _ = codes.render(path)
+            first = time.perf_counter() - started
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                codes.render(path)
+            repeat = (time.perf_counter() - started) / args.requests
+            print(f"   🖼️  {path}: {len(body)} байт, первый раз {first * 1000:.2f} мс, "
+                  f"дальше {repeat * 1e6:.1f} мкс")
+    rows = len(matrices[0])
+    print(f"   📟 В терминале: {(rows + 1) // 2} строк вместо {rows}, "
+          f"ширина {rows} символов вместо {rows * 2}")
+    return 0
+
+
+class FsCallCounter:
+    """Считает обращения к файловой системе из Python (stat, open, listdir...)
+
+    Подменяет функции os и builtins.open на время блока, поэтому в счёт
+    входят и os.path.isdir/isfile (они вызывают os.stat).
+    """
+
+    FUNCTIONS = ((os, 'stat'), (os, 'lstat'), (os, 'fstat'), (os, 'listdir'),
+                 (os, 'scandir'), (builtins, 'open'))
+
+    def __init__(self):
+        self.calls = {}
+        self._originals = []
+
+    def __enter__(self):
+        for module, name in self.FUNCTIONS:
+            original = getattr(module, name)
+            self._originals.append((module, name, original))
+            setattr(module, name, self._counting(name, original))
+        return self
+
+    def __exit__(self, *args):
+        for module, name, original in self._originals:
+            setattr(module, name, original)
+        self._originals = []
+
+    def _counting(self, name, original):
+        def counted(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return original(*args, **kwargs)
+        return counted
+
+    def total(self):
+        return sum(self.calls.values())
+
+
+ROUNDS = 5
+FS_PATHS = ('/', '/index.html', '/ar-app.js', '/missing.js', '/ar_server/', '/ar_server')
+
+
+def bench_fs(args):
+    """Обращения к файловой системе на запрос: с индексом каталога и без"""
+    timings = {}
+    for label, argv in (('без индекса', ['--no-file-index']), ('с индексом', [])):
+        options = parse_server_args('benchmark', argv + [
+            '--engine', args.engine, '--access-log', 'off'])
+        server = create_server(('127.0.0.1', 0), QuietHandler, options, directory=ROOT)
+        start_background(server)
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1],
+                                                timeout=10)
+        print(f"📂 {label} ({args.engine}):")
+        for path in FS_PATHS:
+            # Прогрев: кэш файлов и первое сканирование каталога
+            for _ in range(2):
+                connection.request('GET', path)
+                connection.getresponse().read()
+            with FsCallCounter() as counter:
+                for _ in range(args.requests):
+                    connection.request('GET', path)
+                    response = connection.getresponse()
+                    response.read()
+            # Время - отдельно от счётчика (подмена функций замедляет вызовы),
+            # лучший из нескольких прогонов
+            elapsed = float('inf')
+            for _ in range(ROUNDS):
+                started = time.perf_counter()
+                for _ in range(args.requests):
+                    connection.request('GET', path)
+                    connection.getresponse().read()
+                elapsed = min(elapsed, time.perf_counter() - started)
+            per_request = counter.total() / args.requests
+            timings.setdefault(path, []).append(elapsed / args.requests)
+            calls = ', '.join(f"{name} {count / args.requests:g}"
+                              for name, count in sorted(counter.calls.items()))
+            print(f"   {path:14s} {response.status}  {per_request:4.1f} на запрос"
+                  f"{f' ({calls})' if calls else ''}  {elapsed / args.requests * 1e6:6.0f} мкс")
+        index = getattr(server, 'file_index', None)
+        if index is not None:
+            with FsCallCounter() as counter:
+                index.refresh()
+            print(f"   🔄 обновление индекса: {counter.total()} обращений раз в "
+                  f"{index.interval:g} с ({index.stats()['directories']} каталогов)")
+        connection.close()
+        server.shutdown()
+        server.server_close()
+    print("⏱️  Время запроса с индексом:")
+    for path, (before, after) in timings.items():
+        print(f"   {path:14s} {before * 1e6:6.0f} -> {after * 1e6:6.0f} мкс "
+              f"({(after / before - 1) * 100:+.0f}%)")
+    return 0
+
+
+# Разные адреса 127.0.0.0/8: для сервера - разные клиенты Wi-Fi
+ABUSER_ADDRESS = '127.0.0.2'
+VISITOR_ADDRESS = '127.0.0.3'
+ADMISSION_OFF = ['--max-per-ip', '0', '--rate', '0', '--shed-queue', '0', '--header-timeout', '0']
+
+
+def client_request(port, source, path='/index.html', timeout=10.0):
+    """GET с заданного адреса: статус и время ответа (None - таймаут)"""
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection(
+        '127.0.0.1', port, timeout=timeout, source_address=(source, 0))
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - started
+    except (OSError, http.client.HTTPException):
+        return None, time.perf_counter() - started
+    finally:
+        connection.close()
+
+
+def reload_loop(port, duration, statuses, latencies):
+    """Клиент, перезагружающий страницу без пауз по одному keep-alive соединению"""
+    connection = None
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        if connection is None:
+            connection = http.client.HTTPConnection(
+                '127.0.0.1', port, timeout=10, source_address=(ABUSER_ADDRESS, 0))
+        started = time.perf_counter()
+        try:
+            connection.request('GET', '/index.html')
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = None
+            continue
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        latencies.setdefault(response.status, []).append(time.perf_counter() - started)
+        if response.will_close:
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+
+
+def trickle_clients(port, count, stop, closed):
+    """Slow loris: по байту заголовка раз в 0.5 с с count разных адресов"""
+    started = time.monotonic()
+    clients = []
+    for number in range(count):
+        sock = socket.create_connection(
+            ('127.0.0.1', port), source_address=(f'127.0.1.{number + 1}', 0))
+        sock.sendall(b'GET /index.html HTTP/1.1\r\n')
+        clients.append(sock)
+    while clients and not stop.wait(0.5):
+        for sock in list(clients):
+            try:
+                sock.sendall(b'X')
+                sock.setblocking(False)
+                try:
+                    if sock.recv(4096) == b'':
+                        raise ConnectionResetError
+                except BlockingIOError:
+                    pass
+                finally:
+                    sock.setblocking(True)
+            except OSError:
+                closed.append(time.monotonic() - started)
+                clients.remove(sock)
+                sock.close()
+    for sock in clients:
+        sock.close()
+
+
+def visitor_wait(port, deadline):
+    """Сколько посетитель ждёт 200, повторяя запрос после 503: (время, число 503)"""
+    started = time.perf_counter()
+    rejected = 0
+    while time.perf_counter() - started < deadline:
+        status, _ = client_request(port, VISITOR_ADDRESS,
+                                   timeout=deadline - (time.perf_counter() - started))
+        if status == 200:
+            return time.perf_counter() - started, rejected
+        if status == 503:
+            rejected += 1
+            time.sleep(0.1)
+    return None, rejected
+
+
+def bench_admission(args):
+    """Допуск клиентов: цикл перезагрузок и slow loris против обычного посетителя"""
+    failed = False
+    for label, argv in (('без допуска', ADMISSION_OFF), ('с допуском', [
+            '--header-timeout', str(args.header_timeout)])):
+        options = parse_server_args('benchmark', argv + [
+            '--engine', args.engine, '--threads', str(args.threads),
+            '--queue-size', str(args.threads), '--access-log', 'off'])
+        server = create_server(('127.0.0.1', 0), QuietHandler, options, directory=ROOT)
+        # Иначе loopback адреса benchmark.py в лимиты не попадают
+        server.admission.exempt_loopback = False
+        port = server.server_address[1]
+        start_background(server)
+        print(f"🚦 {label} ({args.engine}, потоков {args.threads}):")
+
+        statuses, latencies = {}, {}
+        abuser = threading.Thread(
+            target=reload_loop, args=(port, args.duration, statuses, latencies))
+        abuser.start()
+        visits = []
+        while abuser.is_alive():
+            visits.append(client_request(port, VISITOR_ADDRESS))
+            time.sleep(0.1)
+        abuser.join()
+        served = [elapsed for status, elapsed in visits if status == 200]
+        print("   🔁 перезагрузки: " + ", ".join(
+            f"{status} x{count} ({percentile(latencies[status], 0.5) * 1e3:.2f} мс)"
+            for status, count in sorted(statuses.items())))
+        print(f"   🙂 посетитель: {len(served)}/{len(visits)} страниц, "
+              f"p50 {percentile(served, 0.5) * 1e3:.1f} мс, "
+              f"p95 {percentile(served, 0.95) * 1e3:.1f} мс")
+
+        stop, closed = threading.Event(), []
+        loris = threading.Thread(
+            target=trickle_clients, args=(port, args.slow, stop, closed))
+        loris.start()
+        # Даём медленным клиентам занять пул
+        time.sleep(0.5)
+        waited, rejected = visitor_wait(port, args.deadline)
+        stop.set()
+        loris.join()
+        if waited is None:
+            result = f"❌ не обслужен за {args.deadline:g} с"
+            failed = failed or label == 'с допуском'
+        else:
+            result = f"✅ 200 через {waited:.2f} с"
+        print(f"   🐌 slow loris x{args.slow}: посетитель {result}, 503 по пути: {rejected}, "
+              f"оборвано медленных: {len(closed)}")
+        rejected_counts = server.admission.snapshot()
+        print("   📊 отказы: " + ", ".join(
+            f"{reason} {count}" for reason, count in rejected_counts.items()))
+        server.shutdown()
+        server.server_close()
+    return 1 if failed else 0
+
+
+TELEMETRY_METRICS = ('fps', 'camera_start_ms', 'webxr_ar', 'camera_ok', 'cameras',
+                     'secure_context', 'getusermedia_supported', 'hit_test_ms')
+TELEMETRY_AGENTS = (PHONE_USER_AGENT, 'Mozilla/5.0 (X11; Linux x86_64) Chrome/120.0')
+
+
+def telemetry_reports(count):
+    """Пачки замеров как от страниц: по 8 метрик, FPS несколькими значениями"""
+    for number in range(count):
+        yield TELEMETRY_AGENTS[number % 2], [
+            (metric, float((number * 7 + index * 13) % 120))
+            for index, metric in enumerate(TELEMETRY_METRICS)]
+
+
+def jsonl_query(path, metric):
+    """То же, что TelemetryLog.query(metric), по журналу JSON Lines: весь файл"""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record['metric'] == metric:
+                values.setdefault(record['device'], []).append(record['value'])
+    return {device: (len(found), sum(found) / len(found), percentile(found, 0.95))
+            for device, found in values.items()}
+
+
+def bench_telemetry(args):
+    """Журнал телеметрии: приём пачек, размер на диске и запросы по устройствам"""
+    import tracemalloc
+
+    from ar_server.telemetry import TelemetryLog
+    directory = tempfile.mkdtemp(prefix='ar-telemetry-')
+    try:
+        path = os.path.join(directory, 'telemetry.arlog')
+        jsonl_path = os.path.join(directory, 'telemetry.jsonl')
+        log = TelemetryLog(path, max_buffered=args.reports * len(TELEMETRY_METRICS))
+        reports = list(telemetry_reports(args.reports))
+        started = time.perf_counter()
+        for user_agent, samples in reports:
+            log.add(user_agent, samples)
+        added = time.perf_counter() - started
+        log.close()
+        flushed = time.perf_counter() - started
+        samples_total = args.reports * len(TELEMETRY_METRICS)
+        with open(jsonl_path, 'w') as f:
+            now = time.time()
+            for user_agent, samples in reports:
+                device = device_kind(user_agent)
+                for metric, value in samples:
+                    f.write(json.dumps({'time': now, 'metric': metric, 'device': device,
+                                        'value': value}) + '\n')
+        size, jsonl_size = os.path.getsize(path), os.path.getsize(jsonl_path)
+        print(f"📈 Замеров: {samples_total} ({args.reports} пачек по {len(TELEMETRY_METRICS)})")
+        print(f"   📥 в обработчике: {added / args.reports * 1e6:.1f} мкс на пачку, "
+              f"запись блоками: {flushed:.2f} с всего")
+        print(f"   💾 на диске: {size / samples_total:.1f} байт на замер "
+              f"({size / 1024 / 1024:.1f} МБ) против {jsonl_size / samples_total:.1f} "
+              f"в JSON Lines ({jsonl_size / 1024 / 1024:.1f} МБ)")
+
+        reader = TelemetryLog(path)
+        try:
+            for label, call in (
+                    ('сводка по всем метрикам', lambda: reader.query()),
+                    ('fps с перцентилями', lambda: reader.query('fps')),
+                    ('fps по JSON Lines', lambda: jsonl_query(jsonl_path, 'fps'))):
+                call()
+                tracemalloc.start()
+                started = time.perf_counter()
+                call()
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"   🔎 {label:24s} {elapsed * 1000:8.1f} мс, "
+                      f"пик памяти {peak / 1024 / 1024:6.1f} МБ")
+        finally:
+            reader.close()
+
+        options = parse_server_args('benchmark', [
+            '--engine', args.engine, '--access-log', 'off',
+            '--telemetry', os.path.join(directory, 'http.arlog')])
+        server = create_server(('127.0.0.1', 0), QuietHandler, options, directory=ROOT)
+        start_background(server)
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1],
+                                                timeout=10)
+        body = json.dumps({'metrics': {metric: value for metric, value in reports[0][1]}})
+        started = time.perf_counter()
+        for _ in range(args.posts):
+            connection.request('POST', '/__telemetry', body=body,
+                               headers={'User-Agent': PHONE_USER_AGENT})
+            response = connection.getresponse()
+            response.read()
+        elapsed = time.perf_counter() - started
+        connection.close()
+        server.shutdown()
+        server.server_close()
+        print(f"   🌐 POST /__telemetry ({args.engine}): {args.posts / elapsed:.0f} пачек/с "
+              f"по keep-alive, статус {response.status}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+# Примерные размеры библиотек CDN (минифицированные), байт
+VENDOR_SCRIPT_SIZES = {
+    'aframe.min.js': 1300 * 1024,
+    'aframe-ar.min.js': 900 * 1024,
+    'aframe-extras.min.js': 170 * 1024,
+    'aframe-physics-system.min.js': 350 * 1024,
+}
+PRELOAD_MODES = (
+    ('без подсказок', []),
+    ('Link в 200', ['--preload']),
+    ('Link + 103', ['--early-hints']),
+)
+# Что находит сканер предзагрузки браузера в ещё не разобранном HTML
+PRELOAD_SCANNER = re.compile(
+    rb'<(?:script|img)\b[^>]*?\bsrc="([^"]+)"'
+    rb'|<link\b[^>]*?\brel="stylesheet"[^>]*?\bhref="([^"]+)"')
+LINK_PRELOAD = re.compile(r'<(/[^>]*)>;\s*rel=(?:preload|modulepreload)')
+
+
+def preload_site(pages, padding=0, vendor=True):
+    """Каталог со страницами, их файлами и копиями библиотек в vendor/ нужного размера
+
+    padding - КБ разметки в начале <body>: скрипты в конце страницы
+    приходят уже не с первыми пакетами.
+    """
+    import random
+
+    from ar_server.vendor import VENDOR_ASSETS, integrity, local_path, write_manifest
+    directory = tempfile.mkdtemp(prefix='ar-preload-')
+    for name in {'style.css', 'telemetry.js', 'ar-app.js', 'advanced-ar.js'}:
+        shutil.copy(os.path.join(ROOT, name), directory)
+    # Похожий на JS текст: сжимается примерно как настоящие библиотеки
+    words = re.findall(r'[A-Za-z_]\w+|\S', open(os.path.join(ROOT, 'ar-app.js')).read())
+    generator = random.Random(1)
+    for name in set(pages):
+        with open(os.path.join(ROOT, name)) as f:
+            page = f.read()
+        if padding:
+            filler = ' '.join(generator.choice(words) for _ in range(padding * 256))
+            # Сразу после <body>: ссылки из <head> приходят с первыми пакетами
+            body = page.index('>', page.index('<body')) + 1
+            page = f'{page[:body]}\n<div hidden>{html.escape(filler)}</div>{page[body:]}'
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(page)
+    assets = {}
+    for url in VENDOR_ASSETS if vendor else ():
+        size = VENDOR_SCRIPT_SIZES.get(url.rsplit('/', 1)[1])
+        if size is None:
+            continue
+        data = ' '.join(generator.choice(words) for _ in range(size // 4)).encode()[:size]
+        path = os.path.join(directory, VENDOR_DIR, local_path(url))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        assets[url] = {'path': local_path(url), 'integrity': integrity(data), 'size': size}
+    if assets:
+        write_manifest(os.path.join(directory, VENDOR_DIR), assets)
+    return directory
+
+
+class MobileLink:
+    """Мобильный канал: задержка rtt/2 в каждую сторону и общая полоса к телефону"""
+
+    def __init__(self, rtt, bandwidth):
+        self.delay = rtt / 2
+        self.rate = bandwidth
+        self.free_at = 0.0
+
+    def arrival(self, size, downstream):
+        now = asyncio.get_running_loop().time()
+        if not downstream:
+            return now + self.delay
+        # Байты к телефону идут по одному каналу друг за другом
+        self.free_at = max(now, self.free_at) + size / self.rate
+        return self.free_at + self.delay
+
+    async def pipe(self, reader, writer, downstream):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await chunks.get()
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                if not data:
+                    writer.close()
+                    return
+                writer.write(data)
+                await writer.drain()
+
+        sender = asyncio.ensure_future(deliver())
+        try:
+            while True:
+                data = await reader.read(16384)
+                chunks.put_nowait((self.arrival(len(data), downstream), data))
+                if not data:
+                    break
+            await sender
+        except (ConnectionError, asyncio.CancelledError):
+            sender.cancel()
+            writer.close()
+
+    async def serve(self, target_port):
+        """Прокси на 127.0.0.1: телефон <-> канал <-> сервер"""
+        async def relay(client_reader, client_writer):
+            try:
+                server_reader, server_writer = await asyncio.open_connection(
+                    '127.0.0.1', target_port)
+                await asyncio.gather(self.pipe(client_reader, server_writer, False),
+                                     self.pipe(server_reader, client_writer, True),
+                                     return_exceptions=True)
+            except (OSError, asyncio.CancelledError):
+                # Соединения, оставшиеся к концу замера
+                client_writer.close()
+
+        return await asyncio.start_server(relay, '127.0.0.1', 0)
+
+
+async def read_response(reader, on_link, on_chunk=None):
+    """Ответ сервера: 103 передаёт Link сразу, тело (gzip) - кусками в on_chunk"""
+    import zlib
+
+    while True:
+        head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+        headers = {}
+        for line in head.split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'link' in headers:
+            on_link(headers['link'])
+        if not head.startswith('HTTP/1.1 103'):
+            break
+    status = int(head.split(' ', 2)[1])
+    remaining = int(headers.get('content-length', 0))
+    decoder = zlib.decompressobj(31) if headers.get('content-encoding') == 'gzip' else None
+    while remaining:
+        data = await reader.read(min(remaining, 65536))
+        if not data:
+            raise ConnectionError('ответ оборван')
+        remaining -= len(data)
+        if on_chunk is not None:
+            on_chunk(decoder.decompress(data) if decoder else data)
+    return status
+
+
+async def browser_load(port, page, rtt, connections=6, ssl_context=None):
+    """Загрузка страницы браузером без кэша через канал: (до HTML, до всех файлов)
+
+    Как у браузера: до connections соединений на сервер, новое соединение
+    стоит rtt (TCP) и, с ssl_context, своё TLS рукопожатие через канал;
+    файлы запрашиваются, как только о них известно - из 103, из Link
+    ответа или из уже полученной части HTML.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    slots = asyncio.Semaphore(connections)
+    idle, tasks, requested = [], [], set()
+
+    async def open_connection():
+        await asyncio.sleep(rtt)
+        return await asyncio.open_connection(
+            '127.0.0.1', port, ssl=ssl_context,
+            server_hostname='localhost' if ssl_context else None)
+
+    async def connect():
+        if idle:
+            return idle.pop()
+        return await open_connection()
+
+    async def get(path, on_chunk=None):
+        request = (f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+                   f'User-Agent: {PHONE_USER_AGENT}\r\n'
+                   'Accept-Encoding: gzip\r\n\r\n').encode()
+        async with slots:
+            reused = bool(idle)
+            reader, writer = await connect()
+            writer.write(request)
+            try:
+                status = await read_response(reader, on_link, on_chunk)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                # Сервер закрыл простаивавшее keep-alive соединение: браузер повторяет
+                writer.close()
+                reader, writer = await open_connection()
+                writer.write(request)
+                status = await read_response(reader, on_link, on_chunk)
+            if status != 200:
+                raise ConnectionError(f'{path}: {status}')
+            idle.append((reader, writer))
+
+    def request(path):
+        if path not in requested:
+            requested.add(path)
+            tasks.append(asyncio.ensure_future(get(path)))
+
+    def on_link(value):
+        for path in LINK_PRELOAD.findall(value):
+            request(path)
+
+    html = bytearray()
+
+    def on_html(data):
+        html.extend(data)
+        for match in PRELOAD_SCANNER.finditer(html):
+            reference = (match.group(1) or match.group(2)).decode()
+            if '://' not in reference:
+                request(urllib.parse.urljoin('/' + page, reference))
+
+    requested.add('/' + page)
+    await get('/' + page, on_html)
+    html_done = loop.time() - started
+    while tasks:
+        pending, tasks[:] = list(tasks), []
+        await asyncio.gather(*pending)
+    all_done = loop.time() - started
+    for _, writer in idle:
+        writer.close()
+    return html_done, all_done, len(requested)
+
+
+async def preload_runs(port, page, loads, rtt, bandwidth):
+    link = MobileLink(rtt, bandwidth)
+    proxy = await link.serve(port)
+    proxy_port = proxy.sockets[0].getsockname()[1]
+    try:
+        return [await browser_load(proxy_port, page, rtt) for _ in range(loads)]
+    finally:
+        proxy.close()
+
+
+def bench_preload(args):
+    """Link rel=preload и 103 Early Hints: время до всех файлов страницы на мобильном канале"""
+    from ar_server.cache import FileEntry
+    from ar_server.preload import PreloadHints
+
+    pages = args.pages.split(',')
+    directory = preload_site(pages, args.padding, args.vendor)
+    bandwidth = args.bandwidth * 1e6 / 8
+    padding = f", +{args.padding} КБ разметки в <body>" if args.padding else ""
+    if not args.vendor:
+        padding += ", библиотеки с CDN (не входят в замер)"
+    print(f"📶 Канал: RTT {args.rtt:g} мс, {args.bandwidth:g} Мбит/с к телефону, "
+          f"до 6 соединений, загрузок: {args.loads}{padding}")
+    try:
+        for page in pages:
+            baseline = None
+            for label, argv in PRELOAD_MODES:
+                argv = argv + ['--access-log', 'off', '--engine', args.engine]
+                with ServerProcess(argv + ['--vendor'] if args.vendor else argv,
+                                   directory) as server:
+                    # Прогрев: кэш, сжатие и разобранная страница (для 103)
+                    for _ in range(2):
+                        asyncio.run(browser_load(server.port, page, 0))
+                    runs = asyncio.run(preload_runs(
+                        server.port, page, args.loads, args.rtt / 1000, bandwidth))
+                html_done = percentile([run[0] for run in runs], 0.5) * 1000
+                all_done = percentile([run[1] for run in runs], 0.5) * 1000
+                change = ''
+                if baseline is None:
+                    baseline = all_done
+                else:
+                    change = f" ({(all_done - baseline) / baseline * 100:+.0f}%)"
+                print(f"   {page:14s} {label:14s} HTML {html_done:6.0f} мс, "
+                      f"все {runs[0][2]} файлов {all_done:6.0f} мс{change}")
+
+        hints = PreloadHints(directory)
+        entry = FileEntry.open(os.path.join(directory, pages[0]), lambda path: 'text/html')
+        try:
+            started = time.perf_counter()
+            hints.link(entry.path, '/' + pages[0], entry)
+            parsed = time.perf_counter() - started
+            started = time.perf_counter()
+            for _ in range(args.lookups):
+                hints.link(entry.path, '/' + pages[0], entry)
+            lookup = (time.perf_counter() - started) / args.lookups
+        finally:
+            entry.close()
+        print(f"   ⏱️  разбор {pages[0]}: {parsed * 1000:.2f} мс один раз, "
+              f"Link на ответ: {lookup * 1e6:.2f} мкс")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+LIVE_RELOAD_SITE = {
+    'index.html': '<!DOCTYPE html><html><head><link rel="stylesheet" href="style.css">'
+                  '</head><body><script src="app.js"></script></body></html>',
+    'app.js': 'console.log(0);\n',
+    'style.css': 'body { margin: 0; }\n',
+}
+
+
+def open_event_streams(port, count, timeout):
+    """count подписок на /__livereload; ждёт у каждой событие hello"""
+    streams = []
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+        sock.sendall(b'GET /__livereload HTTP/1.1\r\nHost: localhost\r\n'
+                     b'Accept: text/event-stream\r\n\r\n')
+        streams.append(sock)
+    for sock in streams:
+        received = b''
+        while b'event: hello' not in received:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError('поток событий закрыт')
+            received += chunk
+    return streams
+
+
+def wait_for_event(streams, event, timeout):
+    """Время прихода события на каждый поток (time.perf_counter())"""
+    import selectors
+
+    selector = selectors.DefaultSelector()
+    for sock in streams:
+        selector.register(sock, selectors.EVENT_READ, [b''])
+    arrivals = []
+    deadline = time.perf_counter() + timeout
+    while len(arrivals) < len(streams) and time.perf_counter() < deadline:
+        for key, _ in selector.select(deadline - time.perf_counter()):
+            buffer = key.data
+            buffer[0] += key.fileobj.recv(4096)
+            if event in buffer[0]:
+                arrivals.append(time.perf_counter())
+                selector.unregister(key.fileobj)
+    selector.close()
+    return arrivals
+
+
+def bench_livereload(args):
+    """--live-reload: CPU сервера с открытыми страницами и время от правки файла до события"""
+    directory = tempfile.mkdtemp(prefix='ar-livereload-')
+    try:
+        for name, text in LIVE_RELOAD_SITE.items():
+            with open(os.path.join(directory, name), 'w') as f:
+                f.write(text)
+        argv = (['--engine', args.engine, '--access-log', 'off', '--live-reload',
+                 '--max-connections', str(args.clients * 2)] + ADMISSION_OFF)
+        print(f"🔄 Движок: {args.engine}, подписок: {args.clients}, "
+              f"простой: {args.idle:g} с, правок: {args.changes}")
+        with ServerProcess(argv, directory) as server:
+            for path in ('/', '/app.js', '/style.css'):
+                fetch(f'http://127.0.0.1:{server.port}{path}', 5)
+            time.sleep(1)
+            cpu_before = server.cpu_seconds()
+            time.sleep(args.idle)
+            idle_empty = (server.cpu_seconds() - cpu_before) / args.idle
+            streams = open_event_streams(server.port, args.clients, 10)
+            try:
+                rss, _ = server.memory()
+                time.sleep(1)
+                cpu_before = server.cpu_seconds()
+                time.sleep(args.idle)
+                idle_busy = (server.cpu_seconds() - cpu_before) / args.idle
+                print(f"   💤 CPU сервера в простое: {idle_empty * 100:.2f}% без страниц, "
+                      f"{idle_busy * 100:.2f}% с {args.clients} "
+                      f"(RSS {rss / 1024 ** 2:.1f} МБ)")
+                delays, spreads = [], []
+                for number in range(args.changes):
+                    # Правка в случайный момент прохода слежения
+                    time.sleep(0.2 + (0.37 * number) % 0.5)
+                    changed = time.perf_counter()
+                    with open(os.path.join(directory, 'app.js'), 'w') as f:
+                        f.write(f'console.log({number + 1});\n')
+                    arrivals = wait_for_event(streams, b'event: change', 5)
+                    if len(arrivals) < len(streams):
+                        print(f"   ❌ событие получили {len(arrivals)} из {len(streams)}")
+                        return 1
+                    delays.append(max(arrivals) - changed)
+                    spreads.append(max(arrivals) - min(arrivals))
+                print(f"   ⚡ от правки до события у всех: медиана "
+                      f"{percentile(delays, 0.5) * 1000:.0f} мс, максимум "
+                      f"{max(delays) * 1000:.0f} мс (проверка раз в 500 мс); рассылка "
+                      f"{args.clients} страницам {percentile(spreads, 0.5) * 1000:.1f} мс")
+                body = urllib.request.urlopen(
+                    f'http://127.0.0.1:{server.port}/app.js', timeout=5).read()
+                print(f"   📦 после правок отдаётся {body.decode().strip()!r}")
+            finally:
+                for sock in streams:
+                    sock.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+HTTP2_MODES = (
+    ('HTTP/1.1, 6 соединений', []),
+    ('HTTP/2, 1 соединение', ['--http2']),
+)
+# Окна управления потоком, которые объявляет Chrome
+CHROME_CONNECTION_WINDOW = 15 * 1024 * 1024
+CHROME_STREAM_WINDOW = 6 * 1024 * 1024
+# Клиент HTTP/2 на node: путь, статус и sha256 тела (gzip раскрыт) построчно
+NODE_HTTP2_CLIENT = r"""
+const http2 = require('http2'), fs = require('fs'), zlib = require('zlib'),
+      crypto = require('crypto');
+const [port, ca, ...paths] = process.argv.slice(1);
+const client = http2.connect('https://localhost:' + port, {ca: fs.readFileSync(ca)});
+client.on('error', error => { console.error(error.message); process.exit(1); });
+let left = paths.length;
+for (const path of paths) {
+  const request = client.request({':path': path, 'accept-encoding': 'gzip'});
+  const chunks = [];
+  let headers = {};
+  request.on('response', value => { headers = value; });
+  request.on('data', chunk => chunks.push(chunk));
+  request.on('end', () => {
+    let body = Buffer.concat(chunks);
+    if (headers['content-encoding'] === 'gzip') body = zlib.gunzipSync(body);
+    const digest = crypto.createHash('sha256').update(body).digest('hex');
+    console.log(path, headers[':status'], digest);
+    if (--left === 0) client.close();
+  });
+}
+"""
+
+
+def add_textures(directory, pages, count, size):
+    """count текстур по size КБ в <a-assets> каждой страницы (картинки не сжимаются)"""
+    import random
+
+    generator = random.Random(2)
+    os.makedirs(os.path.join(directory, 'textures'), exist_ok=True)
+    images = []
+    for number in range(count):
+        name = f'textures/texture-{number}.png'
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(generator.randbytes(size * 1024))
+        images.append(f'<img id="texture-{number}" src="{name}">')
+    for page in set(pages):
+        path = os.path.join(directory, page)
+        with open(path) as f:
+            text = f.read()
+        body = text.index('>', text.index('<body')) + 1
+        with open(path, 'w') as f:
+            f.write(f'{text[:body]}\n<a-assets>{"".join(images)}</a-assets>{text[body:]}')
+
+
+async def browser_load_h2(port, page, rtt, ssl_context):
+    """То же, что browser_load, но по HTTP/2: все файлы - потоки одного соединения"""
+    import zlib
+
+    from h2.config import H2Configuration
+    from h2.connection import H2Connection
+    from h2.events import (
+        DataReceived, InformationalResponseReceived, ResponseReceived, StreamEnded,
+        StreamReset,
+    )
+    from h2.settings import SettingCodes
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await asyncio.sleep(rtt)
+    reader, writer = await asyncio.open_connection(
+        '127.0.0.1', port, ssl=ssl_context, server_hostname='localhost')
+    if writer.get_extra_info('ssl_object').selected_alpn_protocol() != 'h2':
+        writer.close()
+        raise ConnectionError('сервер не выбрал h2 в ALPN')
+    conn = H2Connection(H2Configuration(client_side=True, header_encoding='utf-8'))
+    conn.initiate_connection()
+    conn.update_settings({SettingCodes.INITIAL_WINDOW_SIZE: CHROME_STREAM_WINDOW})
+    conn.increment_flow_control_window(CHROME_CONNECTION_WINDOW - 65535)
+    writer.write(conn.data_to_send())
+    # stream_id -> [future, статус, распаковщик gzip, on_chunk]
+    streams = {}
+    tasks, requested = [], set()
+
+    def get(path, on_chunk=None):
+        stream_id = conn.get_next_available_stream_id()
+        conn.send_headers(stream_id, [
+            (':method', 'GET'), (':scheme', 'https'), (':authority', 'localhost'),
+            (':path', path), ('user-agent', PHONE_USER_AGENT),
+            ('accept-encoding', 'gzip')], end_stream=True)
+        writer.write(conn.data_to_send())
+        future = loop.create_future()
+        streams[stream_id] = [future, None, None, on_chunk]
+        return future
+
+    def request(path):
+        if path not in requested:
+            requested.add(path)
+            tasks.append(get(path))
+
+    def on_link(value):
+        for path in LINK_PRELOAD.findall(value):
+            request(path)
+
+    def on_event(event):
+        stream = streams.get(getattr(event, 'stream_id', None))
+        if stream is None:
+            return
+        if isinstance(event, InformationalResponseReceived):
+            headers = dict(event.headers)
+            if 'link' in headers:
+                on_link(headers['link'])
+        elif isinstance(event, ResponseReceived):
+            headers = dict(event.headers)
+            stream[1] = int(headers[':status'])
+            if headers.get('content-encoding') == 'gzip':
+                stream[2] = zlib.decompressobj(31)
+            if 'link' in headers:
+                on_link(headers['link'])
+        elif isinstance(event, DataReceived):
+            conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            if stream[3] is not None:
+                stream[3](stream[2].decompress(event.data) if stream[2] else event.data)
+        elif isinstance(event, StreamEnded):
+            streams.pop(event.stream_id)
+            if stream[1] == 200:
+                stream[0].set_result(stream[1])
+            else:
+                stream[0].set_exception(ConnectionError(f'поток {event.stream_id}: {stream[1]}'))
+        elif isinstance(event, StreamReset):
+            streams.pop(event.stream_id)
+            stream[0].set_exception(ConnectionError(f'поток {event.stream_id} сброшен'))
+
+    async def receive():
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                for future, *_ in streams.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError('соединение закрыто'))
+                return
+            for event in conn.receive_data(data):
+                on_event(event)
+            writer.write(conn.data_to_send())
+
+    html = bytearray()
+
+    def on_html(data):
+        html.extend(data)
+        for match in PRELOAD_SCANNER.finditer(html):
+            reference = (match.group(1) or match.group(2)).decode()
+            if '://' not in reference:
+                request(urllib.parse.urljoin('/' + page, reference))
+
+    receiver = asyncio.ensure_future(receive())
+    try:
+        requested.add('/' + page)
+        await get('/' + page, on_html)
+        html_done = loop.time() - started
+        while tasks:
+            pending, tasks[:] = list(tasks), []
+            await asyncio.gather(*pending)
+        all_done = loop.time() - started
+        conn.close_connection()
+        writer.write(conn.data_to_send())
+    finally:
+        receiver.cancel()
+        writer.close()
+    return html_done, all_done, len(requested)
+
+
+async def http2_runs(port, page, loads, rtt, bandwidth, ssl_context, http2):
+    link = MobileLink(rtt, bandwidth)
+    proxy = await link.serve(port)
+    proxy_port = proxy.sockets[0].getsockname()[1]
+    try:
+        if http2:
+            return [await browser_load_h2(proxy_port, page, rtt, ssl_context)
+                    for _ in range(loads)]
+        return [await browser_load(proxy_port, page, rtt, ssl_context=ssl_context)
+                for _ in range(loads)]
+    finally:
+        proxy.close()
+
+
+def site_files(directory):
+    """Адреса всех файлов каталога сайта"""
+    paths = []
+    for base, _, names in os.walk(directory):
+        for name in names:
+            relative = os.path.relpath(os.path.join(base, name), directory)
+            paths.append('/' + relative.replace(os.sep, '/'))
+    return sorted(paths)
+
+
+def file_digest(directory, path):
+    import hashlib
+
+    with open(os.path.join(directory, path.lstrip('/')), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def interop_curl(port, ca_file, directory, paths):
+    """Все файлы одним вызовом curl --http2 --parallel (nghttp2); ошибки - список строк"""
+    output = tempfile.mkdtemp(prefix='ar-curl-')
+    command = ['curl', '-s', '--http2', '--cacert', ca_file, '--compressed', '--parallel',
+               '--parallel-max', '100', '-w', '%{http_version} %{http_code} %{url_effective}\\n']
+    for number, path in enumerate(paths):
+        command += [f'https://localhost:{port}{path}', '-o', os.path.join(output, str(number))]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=60)
+        errors = []
+        for line in result.stdout.splitlines():
+            version, status, url = line.split(' ', 2)
+            if version != '2' or status != '200':
+                errors.append(f'{url}: HTTP/{version} {status}')
+        for number, path in enumerate(paths):
+            if file_digest(output, f'/{number}') != file_digest(directory, path):
+                errors.append(f'{path}: тело не совпадает с файлом')
+        return errors
+    finally:
+        shutil.rmtree(output, ignore_errors=True)
+
+
+def interop_node(port, ca_file, directory, paths):
+    """Все файлы клиентом http2 из node по одному соединению; ошибки - список строк"""
+    result = subprocess.run(['node', '-e', NODE_HTTP2_CLIENT, str(port), ca_file] + paths,
+                            capture_output=True, text=True, timeout=60)
+    if result.returncode:
+        return [result.stderr.strip() or f'node: код {result.returncode}']
+    errors = []
+    for line in result.stdout.splitlines():
+        path, status, digest = line.split()
+        if status != '200' or digest != file_digest(directory, path):
+            errors.append(f'{path}: {status}')
+    return errors
+
+
+def header_overhead(port, ssl_context, paths, http2):
+    """Байт ответа сверх тел (заголовки, кадры) на запрос по одному соединению"""
+    sock = ssl_context.wrap_socket(socket.create_connection(('127.0.0.1', port)),
+                                   server_hostname='localhost')
+    received = body = 0
+    try:
+        if not http2:
+            reader = sock.makefile('rb')
+            for path in paths:
+                sock.sendall(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+                             f'User-Agent: {PHONE_USER_AGENT}\r\n\r\n'.encode())
+                length = 0
+                while True:
+                    line = reader.readline()
+                    received += len(line)
+                    if line in (b'\r\n', b''):
+                        break
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':')[1])
+                received += len(reader.read(length))
+                body += length
+            return (received - body) / len(paths)
+
+        from h2.config import H2Configuration
+        from h2.connection import H2Connection
+        from h2.events import DataReceived, StreamEnded
+
+        conn = H2Connection(H2Configuration(client_side=True, header_encoding='utf-8'))
+        conn.initiate_connection()
+        conn.increment_flow_control_window(CHROME_CONNECTION_WINDOW - 65535)
+        for path in paths:
+            stream_id = conn.get_next_available_stream_id()
+            conn.send_headers(stream_id, [
+                (':method', 'GET'), (':scheme', 'https'), (':authority', 'localhost'),
+                (':path', path), ('user-agent', PHONE_USER_AGENT)], end_stream=True)
+            sock.sendall(conn.data_to_send())
+            ended = False
+            while not ended:
+                data = sock.recv(65536)
+                if not data:
+                    raise ConnectionError('соединение закрыто')
+                received += len(data)
+                for event in conn.receive_data(data):
+                    if isinstance(event, DataReceived):
+                        body += len(event.data)
+                        conn.acknowledge_received_data(
+                            event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, StreamEnded) and event.stream_id == stream_id:
+                        ended = True
+                sock.sendall(conn.data_to_send())
+        return (received - body) / len(paths)
+    finally:
+        sock.close()
+
+
+def bench_http2(args):
+    """--http2: совместимость с клиентами HTTP/2 и загрузка страницы по HTTP/1.1 и HTTP/2"""
+    from ar_server.http2 import http2_available
+
+    if not http2_available():
+        print("❌ Нужен пакет h2: pip install h2")
+        return 1
+    pages = args.pages.split(',')
+    directory = preload_site(pages, vendor=args.vendor)
+    if args.textures:
+        add_textures(directory, pages, args.textures, args.texture_size)
+    certificates = tempfile.mkdtemp(prefix='ar-http2-')
+    failed = False
+    try:
+        manager = CertificateManager(certificates, hosts=['localhost', '127.0.0.1'])
+        if manager.create_context() is None:
+            return 1
+        ssl_files = (manager.cert_file, manager.key_file)
+        client_context = ssl.create_default_context(cafile=manager.cert_file)
+        client_context.set_alpn_protocols(['h2', 'http/1.1'])
+        http1_context = ssl.create_default_context(cafile=manager.cert_file)
+
+        argv = ['--http2', '--access-log', 'off', '--engine', args.engine]
+        paths = site_files(directory)
+        with ServerProcess(argv, directory, HTTPSQuietHandler, ssl_files) as server:
+            print(f"🔀 Движок: {args.engine}, файлов сайта: {len(paths)}")
+            clients = [('curl', interop_curl), ('node', interop_node)]
+            for name, check in clients:
+                if shutil.which(name) is None:
+                    print(f"   ⏭️  {name} не найден")
+                    continue
+                errors = check(server.port, manager.cert_file, directory, paths)
+                failed |= bool(errors)
+                mark = '❌' if errors else '✅'
+                print(f"   {mark} {name}: {len(paths) - len(errors)}/{len(paths)} ответов "
+                      f"по HTTP/2 совпали с файлами")
+                for error in errors[:5]:
+                    print(f"      {error}")
+            repeated = ['/' + page for page in pages] * 10
+            http1 = header_overhead(server.port, http1_context, repeated, False)
+            http2 = header_overhead(server.port, client_context, repeated, True)
+            print(f"   📨 заголовки и кадры на ответ: HTTP/1.1 {http1:.0f} Б, "
+                  f"HTTP/2 {http2:.0f} Б (HPACK, {len(repeated)} ответов)")
+
+        bandwidth = args.bandwidth * 1e6 / 8
+        print(f"📶 Канал: RTT {args.rtt:g} мс, {args.bandwidth:g} Мбит/с к телефону, TLS, "
+              f"загрузок: {args.loads}")
+        for page in pages:
+            baseline = None
+            for label, mode in HTTP2_MODES:
+                argv = mode + ['--access-log', 'off', '--engine', args.engine]
+                if args.vendor:
+                    argv.append('--vendor')
+                with ServerProcess(argv, directory, HTTPSQuietHandler, ssl_files) as server:
+                    http2 = bool(mode)
+                    context = client_context if http2 else http1_context
+                    # Прогрев: кэш и сжатие
+                    for _ in range(2):
+                        asyncio.run(http2_runs(server.port, page, 1, 0, 1e12, context, http2))
+                    runs = asyncio.run(http2_runs(
+                        server.port, page, args.loads, args.rtt / 1000, bandwidth, context,
+                        http2))
+                html_done = percentile([run[0] for run in runs], 0.5) * 1000
+                all_done = percentile([run[1] for run in runs], 0.5) * 1000
+                change = ''
+                if baseline is None:
+                    baseline = all_done
+                else:
+                    change = f" ({(all_done - baseline) / baseline * 100:+.0f}%)"
+                print(f"   {page:14s} {label:24s} HTML {html_done:6.0f} мс, "
+                      f"все {runs[0][2]} файлов {all_done:6.0f} мс{change}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        shutil.rmtree(certificates, ignore_errors=True)
+    return 1 if failed else 0
+
+
+BUNDLE_PATHS = ('/', '/advanced.html', '/ar-app.js', '/textures/texture-0.png',
+                '/missing.js')
+
+
+class QuietOutput:
+    """Глушит вывод на время блока, в том числе у дочерних процессов (fd 1)"""
+
+    def __enter__(self):
+        sys.stdout.flush()
+        self._saved = os.dup(1)
+        with open(os.devnull, 'w') as devnull:
+            os.dup2(devnull.fileno(), 1)
+        return self
+
+    def __exit__(self, *args):
+        sys.stdout.flush()
+        os.dup2(self._saved, 1)
+        os.close(self._saved)
+
+
+def warm_workers(port, paths, rounds):
+    """Каждый файл по новым соединениям: SO_REUSEPORT раздаёт их всем воркерам"""
+    for _ in range(rounds):
+        for path in paths:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            connection.getresponse().read()
+            connection.close()
+
+
+def bench_bundle(args):
+    """--bundle: сборка, старт, обращения к файловой системе и память воркеров против каталога"""
+    from ar_server.bundle import EXCLUDED, Bundle, build_bundle, collect_files
+    from ar_server.cache import AssetCache
+    from ar_server.fsindex import FileIndex
+    from ar_server.handler import guess_type
+    from ar_server.vendor import load_vendor
+
+    pages = ['advanced.html', 'mobile.html']
+    directory = preload_site(pages, vendor=args.vendor)
+    shutil.copy(os.path.join(ROOT, 'index.html'), directory)
+    add_textures(directory, pages, args.textures, args.texture_size)
+    # Что лежит рядом со страницами у скриптов запуска
+    for name in ('cert.pem', 'key.pem', 'start_https.py'):
+        shutil.copy(os.path.join(ROOT, 'start_https.py'), os.path.join(directory, name))
+    bundle_file = os.path.join(directory, 'site.arbundle')
+    try:
+        started = time.perf_counter()
+        transforms = [load_vendor(directory).transform] if args.vendor else []
+        files = collect_files(directory, EXCLUDED)
+        build_bundle(directory, bundle_file, guess_type, files, transforms)
+        print(f"🏗️  Сборка: {len(files)} файлов за {time.perf_counter() - started:.2f} с, "
+              f"бандл {os.path.getsize(bundle_file) / 1024 ** 2:.1f} МБ")
+
+        modes = (('каталог', []), ('каталог --precompress', ['--precompress']),
+                 ('--bundle', ['--bundle']))
+        vendor = ['--vendor'] if args.vendor else []
+        largest = max(files, key=lambda path: os.path.getsize(os.path.join(directory, path)))
+        print(f"⚡ Подготовка в create_server и первый ответ /{largest} с gzip (лучшие из 5):")
+        servers = {}
+        for label, argv in modes:
+            options = parse_server_args('benchmark', argv + vendor + [
+                '--engine', args.engine, '--access-log', 'off'])
+            best = first = float('inf')
+            for _ in range(5):
+                with QuietOutput():
+                    started = time.perf_counter()
+                    server = create_server(('127.0.0.1', 0), QuietHandler, options,
+                                           directory=directory)
+                    best = min(best, time.perf_counter() - started)
+                start_background(server)
+                connection = http.client.HTTPConnection(
+                    '127.0.0.1', server.server_address[1], timeout=30)
+                started = time.perf_counter()
+                connection.request('GET', '/' + largest, headers={'Accept-Encoding': 'gzip'})
+                connection.getresponse().read()
+                first = min(first, time.perf_counter() - started)
+                connection.close()
+                if label in servers:
+                    with QuietOutput():
+                        server.shutdown()
+                        server.server_close()
+                else:
+                    servers[label] = server
+            print(f"   {label:22s} {best * 1000:7.1f} мс, первый ответ {first * 1000:7.1f} мс")
+
+        print(f"📂 Запрос по keep-alive ({args.engine}): обращений к ФС, время "
+              f"(лучшее из {ROUNDS}, режимы по очереди)")
+        connections = [http.client.HTTPConnection(
+            '127.0.0.1', servers[label].server_address[1], timeout=10)
+            for label in ('каталог', '--bundle')]
+        print(f"   {'':26s} {'каталог':>22s}   {'--bundle':>22s}")
+        for path in BUNDLE_PATHS + ('/cert.pem',):
+            results = []
+            for connection in connections:
+                for _ in range(2):
+                    connection.request('GET', path)
+                    connection.getresponse().read()
+                with FsCallCounter() as counter:
+                    for _ in range(args.requests):
+                        connection.request('GET', path)
+                        response = connection.getresponse()
+                        response.read()
+                results.append([response.status, counter.total() / args.requests,
+                                float('inf')])
+            for _ in range(ROUNDS):
+                for result, connection in zip(results, connections):
+                    started = time.perf_counter()
+                    for _ in range(args.requests):
+                        connection.request('GET', path)
+                        connection.getresponse().read()
+                    result[2] = min(result[2], (time.perf_counter() - started) / args.requests)
+            (status, calls, elapsed), (b_status, b_calls, b_elapsed) = results
+            print(f"   {path:26s} {status} {calls:4.1f} обр. {elapsed * 1e6:5.0f} мкс   "
+                  f"{b_status} {b_calls:4.1f} обр. {b_elapsed * 1e6:5.0f} мкс "
+                  f"({(b_elapsed / elapsed - 1) * 100:+.0f}%)")
+        for connection in connections:
+            connection.close()
+        with QuietOutput():
+            for server in servers.values():
+                server.shutdown()
+                server.server_close()
+
+        paths = [os.path.join(directory, *path.split('/')) for path in files]
+        cache = AssetCache(64 * 1024 * 1024, transforms=transforms)
+        index = FileIndex(directory)
+        bundle = Bundle(bundle_file, directory)
+        print(f"🔎 Поиск записи ({len(paths)} файлов, {args.lookups} раз):")
+        for label, lookup in (
+                ('AssetCache.get + FileIndex.stat',
+                 lambda path: cache.get(path, guess_type, index.stat)),
+                ('Bundle.get', lambda path: bundle.get(path, guess_type))):
+            for path in paths:
+                lookup(path)
+            started = time.perf_counter()
+            for number in range(args.lookups):
+                lookup(paths[number % len(paths)])
+            elapsed = (time.perf_counter() - started) / args.lookups
+            print(f"   {label:32s} {elapsed * 1e6:5.2f} мкс")
+        started = time.perf_counter()
+        for number in range(args.lookups):
+            bundle._find(files[number % len(files)])
+        print(f"   {'проба и разбор записи (холодный)':32s} "
+              f"{(time.perf_counter() - started) / args.lookups * 1e6:5.2f} мкс")
+        bundle.close()
+
+        print(f"🧠 Память {args.workers} воркеров после отдачи всех файлов (сумма по процессам):")
+        urls = ['/' + path for path in files]
+        memory = {}
+        for label, argv in (modes[0], modes[2]):
+            argv = argv + vendor + ['--engine', args.engine, '--access-log', 'off',
+                                    '--workers', str(args.workers), '--cache-size', '64']
+            with QuietOutput(), ServerProcess(argv, directory) as server:
+                before = server.proportional_memory()[0]
+                warm_workers(server.port, urls, args.workers * 2)
+                rss, _ = server.memory()
+                pss, private = server.proportional_memory()
+            memory[label] = pss
+            print(f"   {label:10s} RSS {rss / 1024 ** 2:6.1f} МБ  PSS {pss / 1024 ** 2:6.1f} МБ "
+                      f"(+{(pss - before) / 1024 ** 2:.1f} за прогрев)  "
+                      f"личная {private / 1024 ** 2:6.1f} МБ")
+        print(f"   --bundle: PSS {(memory['--bundle'] / memory['каталог'] - 1) * 100:+.0f}%")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+def page_mix(root, page, vendor):
+    """Страница и все её локальные файлы в порядке ссылок, как их грузит браузер
+
+    С vendor=True адреса CDN подменяются на копии из vendor/, как делает
+    сервер с --vendor; без копий библиотеки остаются на CDN и в замер не входят.
+    """
+    with open(os.path.join(root, page), 'rb') as f:
+        body = f.read()
+    if vendor:
+        body = VendorMap.load(os.path.join(root, VENDOR_DIR)).transform(page, 'text/html', body)
+    paths = ['/' + page]
+    for reference in PAGE_REFERENCE.findall(body.decode('utf-8')):
+        if '://' in reference or reference.startswith(('data:', '#')):
+            continue
+        path = '/' + reference.lstrip('./')
+        if path not in paths:
+            paths.append(path)
+    return paths
+
+
+async def http_get(reader, writer, path, keep_alive, timeout):
+    """Запрос как у мобильного браузера; возвращает (статус, можно ли продолжать, байт)"""
+    connection = 'keep-alive' if keep_alive else 'close'
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+                 f'User-Agent: {PHONE_USER_AGENT}\r\n'
+                 f'Accept-Encoding: gzip, deflate, br\r\n'
+                 f'Connection: {connection}\r\n\r\n'.encode())
+    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+    length = 0
+    reuse = keep_alive and head.startswith(b'HTTP/1.1')
+    for line in head.lower().split(b'\r\n'):
+        if line.startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+        elif line.startswith(b'connection:'):
+            reuse = reuse and b'close' not in line
+    await asyncio.wait_for(reader.readexactly(length), timeout)
+    return int(head.split(b' ', 2)[1]), reuse, length
+
+
+async def open_client(port, ssl_context, timeout):
+    return await asyncio.wait_for(asyncio.open_connection(
+        '127.0.0.1', port, ssl=ssl_context,
+        server_hostname='localhost' if ssl_context else None), timeout)
+
+
+async def page_client(port, paths, pages, keep_alive, ssl_context, timeout):
+    """Загружает страницу pages раз по одному соединению (или по соединению на файл)"""
+    latencies, page_times, received = [], [], 0
+    writer = None
+    try:
+        for _ in range(pages):
+            page_started = time.perf_counter()
+            for path in paths:
+                started = time.perf_counter()
+                reused = writer is not None
+                if writer is None:
+                    reader, writer = await open_client(port, ssl_context, timeout)
+                try:
+                    status, reuse, size = await http_get(
+                        reader, writer, path, keep_alive, timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    # Сервер закрыл простаивающее keep-alive соединение, пока
+                    # запрос был в пути: браузер в этом случае повторяет запрос
+                    writer.close()
+                    reader, writer = await open_client(port, ssl_context, timeout)
+                    status, reuse, size = await http_get(
+                        reader, writer, path, keep_alive, timeout)
+                if status != 200:
+                    raise ConnectionError(f'{path}: {status}')
+                latencies.append(time.perf_counter() - started)
+                received += size
+                if not reuse:
+                    writer.close()
+                    writer = None
+            page_times.append(time.perf_counter() - page_started)
+    finally:
+        if writer is not None:
+            writer.close()
+    return latencies, page_times, received
+
+
+async def load_level(port, paths, clients, pages, keep_alive, ssl_context, timeout):
+    tasks = [page_client(port, paths, pages, keep_alive, ssl_context, timeout)
+             for _ in range(clients)]
+    started = time.perf_counter()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    done = [result for result in results if not isinstance(result, BaseException)]
+    return {
+        'seconds': elapsed,
+        'latencies': [value for result in done for value in result[0]],
+        'pages': [value for result in done for value in result[1]],
+        'received': sum(result[2] for result in done),
+        'failures': len(results) - len(done),
+    }
+
+
+def load_cell(server, paths, clients, args, keep_alive, ssl_context):
+    """Один прогон: клиенты x загрузки страницы; метрики клиента и сервера"""
+    cpu_before = server.cpu_seconds()
+    run = asyncio.run(load_level(server.port, paths, clients, args.pages, keep_alive,
+                                 ssl_context, args.timeout))
+    cpu = server.cpu_seconds() - cpu_before
+    rss, peak_rss = server.memory()
+    latencies, requests = run['latencies'], len(run['latencies'])
+    return {
+        'clients': clients,
+        'keep_alive': keep_alive,
+        'requests': requests,
+        'failures': run['failures'],
+        'seconds': round(run['seconds'], 4),
+        'requests_per_second': round(requests / run['seconds'], 1),
+        'pages_per_second': round(len(run['pages']) / run['seconds'], 2),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'page_p95_ms': round(percentile(run['pages'], 0.95) * 1000, 3),
+        'received_bytes': run['received'],
+        'server_cpu_seconds': round(cpu, 3),
+        'server_cpu_ms_per_request': round(cpu / requests * 1000, 4) if requests else None,
+        'server_rss_mb': round(rss / 1024 ** 2, 1),
+        'server_peak_rss_mb': round(peak_rss / 1024 ** 2, 1),
+    }
+
+
+def cell_key(result):
+    return (result['launcher'], result['engine'], result['keep_alive'], result['clients'])
+
+
+def compare_results(results, baseline_file, tolerance):
+    """Сравнивает с прошлым JSON; возвращает число ухудшений больше tolerance"""
+    with open(baseline_file) as f:
+        baseline = {cell_key(result): result for result in json.load(f)['results']}
+    regressions = 0
+    print(f"📊 Сравнение с {baseline_file}:")
+    for result in results:
+        old = baseline.get(cell_key(result))
+        if old is None:
+            continue
+        throughput = result['requests_per_second'] / old['requests_per_second'] - 1
+        p95 = result['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0.0
+        worse = throughput < -tolerance or p95 > tolerance
+        regressions += worse
+        print(f"   {'⚠️ ' if worse else '✅'} {result['launcher']:19s} "
+              f"keep-alive: {'да ' if result['keep_alive'] else 'нет'} "
+              f"клиентов: {result['clients']:4d}  запросов/с {throughput * 100:+6.1f}%  "
+              f"p95 {p95 * 100:+6.1f}%")
+    return regressions
+
+
+def bench_load(args):
+    """Нагрузка как от телефонов: страница, её JS/CSS и копии библиотек для каждого скрипта запуска"""
+    launchers = args.launchers.split(',')
+    unknown = [name for name in launchers if name not in LAUNCHERS]
+    if unknown:
+        print(f"❌ Неизвестные скрипты: {', '.join(unknown)} (есть: {', '.join(LAUNCHERS)})")
+        return 2
+    levels = [int(level) for level in args.clients.split(',')]
+    modes = {'on': [True], 'off': [False], 'both': [True, False]}[args.keep_alive]
+    vendor = bool(VendorMap.load(os.path.join(args.root, VENDOR_DIR)))
+    paths = page_mix(args.root, args.page, vendor)
+    argv = ['--engine', args.engine, '--access-log', 'off', '--timeout', str(args.timeout),
+            '--max-connections', str(max(levels) * 2), '--backlog', str(max(levels)),
+            '--workers', str(args.workers)]
+    if vendor:
+        argv.append('--vendor')
+    print(f"⚙️  Движок: {args.engine}, процессов: {args.workers}, "
+          f"загрузок страницы на клиента: {args.pages}")
+    print(f"📄 Набор: {' '.join(paths)}")
+    if not vendor:
+        print("   (библиотеки с CDN не входят в замер: python fetch_vendor.py)")
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        manager = CertificateManager(directory, hosts=['localhost', '127.0.0.1'])
+        for launcher in launchers:
+            handler_class, tls = LAUNCHERS[launcher]
+            ssl_files = client_context = None
+            if tls:
+                ssl_files = manager.ensure()
+                if ssl_files[0] is None:
+                    return 1
+                client_context = ssl.create_default_context(cafile=manager.cert_file)
+            print(f"🚀 {launcher}.py ({'HTTPS' if tls else 'HTTP'})")
+            with ServerProcess(argv, args.root, handler_class, ssl_files) as server:
+                # Прогрев: кэш файлов и сжатые варианты
+                asyncio.run(load_level(server.port, paths, 1, 1, True, client_context,
+                                       args.timeout))
+                for keep_alive in modes:
+                    for clients in levels:
+                        result = load_cell(server, paths, clients, args, keep_alive,
+                                           client_context)
+                        result.update(launcher=launcher, engine=args.engine, tls=tls,
+                                      workers=args.workers)
+                        results.append(result)
+                        print(f"   {'✅' if not result['failures'] else '❌'} "
+                              f"keep-alive: {'да ' if keep_alive else 'нет'} "
+                              f"клиентов: {clients:4d}  "
+                              f"запросов/с: {result['requests_per_second']:7.0f}  "
+                              f"p50/p95/p99: {result['p50_ms']:6.1f}/{result['p95_ms']:6.1f}/"
+                              f"{result['p99_ms']:6.1f} мс  "
+                              f"CPU: {result['server_cpu_ms_per_request']} мс/запрос  "
+                              f"RSS: {result['server_rss_mb']} МБ  "
+                              f"ошибок: {result['failures']}")
+
+    if args.output:
+        report = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'pages': args.pages,
+            'paths': paths,
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Результаты: {args.output}")
+    failed = any(result['failures'] for result in results)
+    if args.baseline:
+        failed = compare_results(results, args.baseline, args.tolerance) or failed
+    return 1 if failed else 0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_to_accept(script, directory, timeout):
+    """Время от запуска скрипта до первого принятого соединения, секунды"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, script), '--port', str(port), '--no-browser',
+         '--access-log', 'off'],
+        cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=timeout).close()
+                return time.perf_counter() - started
+            except OSError:
+                if process.poll() is not None:
+                    return None
+                time.sleep(0.001)
+        return None
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def bench_startup(args):
+    """Время до первого соединения для каждого скрипта запуска (без браузера)"""
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ('index.html', 'ar-app.js', 'style.css'):
+            shutil.copy(os.path.join(ROOT, name), directory)
+        failed = False
+        for launcher in LAUNCHERS:
+            timings = [time_to_accept(launcher + '.py', directory, args.timeout)
+                       for _ in range(args.runs)]
+            if None in timings:
+                print(f"   ❌ {launcher}.py не открыл порт за {args.timeout} с")
+                failed = True
+                continue
+            print(f"   ⚡ {launcher + '.py':23s} p50: {percentile(timings, 0.5) * 1000:5.0f} мс  "
+                  f"макс: {max(timings) * 1000:5.0f} мс")
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        print(f"   🐍 сам интерпретатор: {(time.perf_counter() - started) * 1000:5.0f} мс")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    scenarios = parser.add_subparsers(dest='scenario', required=True)
+
+    slow = scenarios.add_parser('slow-clients', help=bench_slow_clients.__doc__)
+    slow.add_argument('--slow', type=int, default=8)
+    slow.add_argument('--timeout', type=float, default=2.0)
+    slow.set_defaults(run=bench_slow_clients)
+
+    conc = scenarios.add_parser('concurrency', help=bench_concurrency.__doc__)
+    conc.add_argument('--engine', choices=('threads', 'asyncio'), default='asyncio')
+    conc.add_argument('--levels', default='100,500,1000,2000,4000')
+    conc.add_argument('--requests', type=int, default=3)
+    conc.add_argument('--timeout', type=float, default=30.0)
+    conc.add_argument('--slo', type=float, default=1.0,
+                      help='допустимый p95 в секундах')
+    conc.set_defaults(run=bench_concurrency)
+
+    sendfile = scenarios.add_parser('sendfile', help=bench_sendfile.__doc__)
+    sendfile.add_argument('--size', type=int, default=64, help='размер файла, МБ')
+    sendfile.add_argument('--total', type=int, default=2, help='всего скачать, ГБ')
+    sendfile.set_defaults(run=bench_sendfile)
+
+    tls = scenarios.add_parser('tls', help=bench_tls.__doc__)
+    tls.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    tls.add_argument('--requests', type=int, default=200)
+    tls.add_argument('--stalled', type=int, default=4)
+    tls.add_argument('--handshake-timeout', type=float, default=10.0)
+    tls.set_defaults(run=bench_tls)
+
+    certs = scenarios.add_parser('certs', help=bench_certs.__doc__)
+    certs.add_argument('--requests', type=int, default=200)
+    certs.set_defaults(run=bench_certs)
+
+    logging = scenarios.add_parser('logging', help=bench_logging.__doc__)
+    logging.add_argument('--records', type=int, default=100000)
+    logging.add_argument('--agents', type=int, default=20)
+    logging.set_defaults(run=bench_logging)
+
+    metrics = scenarios.add_parser('metrics', help=bench_metrics.__doc__)
+    metrics.add_argument('--records', type=int, default=100000)
+    metrics.add_argument('--threads', type=int, default=4)
+    metrics.add_argument('--paths', type=int, default=50)
+    metrics.set_defaults(run=bench_metrics)
+
+    qr = scenarios.add_parser('qr', help=bench_qr.__doc__)
+    qr.add_argument('--addresses', type=int, default=3)
+    qr.add_argument('--requests', type=int, default=1000)
+    qr.set_defaults(run=bench_qr)
+
+    fs = scenarios.add_parser('fs', help=bench_fs.__doc__)
+    fs.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    fs.add_argument('--requests', type=int, default=500)
+    fs.set_defaults(run=bench_fs)
+
+    admission = scenarios.add_parser('admission', help=bench_admission.__doc__)
+    admission.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    admission.add_argument('--threads', type=int, default=4)
+    admission.add_argument('--duration', type=float, default=3.0,
+                           help='секунд цикла перезагрузок')
+    admission.add_argument('--slow', type=int, default=12, help='медленных клиентов')
+    admission.add_argument('--header-timeout', type=float, default=2.0)
+    admission.add_argument('--deadline', type=float, default=8.0,
+                           help='сколько посетитель готов ждать страницу, с')
+    admission.set_defaults(run=bench_admission)
+
+    telemetry = scenarios.add_parser('telemetry', help=bench_telemetry.__doc__)
+    telemetry.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    telemetry.add_argument('--reports', type=int, default=125000, help='пачек замеров')
+    telemetry.add_argument('--posts', type=int, default=2000, help='POST запросов')
+    telemetry.set_defaults(run=bench_telemetry)
+
+    preload = scenarios.add_parser('preload', help=bench_preload.__doc__)
+    preload.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    preload.add_argument('--pages', default='advanced.html,mobile.html')
+    preload.add_argument('--rtt', type=float, default=100.0, help='RTT канала, мс')
+    preload.add_argument('--bandwidth', type=float, default=8.0,
+                         help='полоса к телефону, Мбит/с')
+    preload.add_argument('--loads', type=int, default=5, help='загрузок страницы на режим')
+    preload.add_argument('--no-vendor', dest='vendor', action='store_false',
+                         help='без копий библиотек: только локальные файлы страницы')
+    preload.add_argument('--padding', type=int, default=0,
+                         help='КБ разметки в начале <body> (скрипты в конце страницы приходят позже)')
+    preload.add_argument('--lookups', type=int, default=100000)
+    preload.set_defaults(run=bench_preload)
+
+    livereload = scenarios.add_parser('livereload', help=bench_livereload.__doc__)
+    livereload.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    livereload.add_argument('--clients', type=int, default=300, help='открытых страниц')
+    livereload.add_argument('--idle', type=float, default=10.0, help='секунд простоя')
+    livereload.add_argument('--changes', type=int, default=10, help='правок файла')
+    livereload.set_defaults(run=bench_livereload)
+
+    http2 = scenarios.add_parser('http2', help=bench_http2.__doc__)
+    http2.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    http2.add_argument('--pages', default='advanced.html,mobile.html')
+    http2.add_argument('--rtt', type=float, default=100.0, help='RTT канала, мс')
+    http2.add_argument('--bandwidth', type=float, default=8.0,
+                       help='полоса к телефону, Мбит/с')
+    http2.add_argument('--loads', type=int, default=5, help='загрузок страницы на режим')
+    http2.add_argument('--textures', type=int, default=24, help='текстур в <a-assets>')
+    http2.add_argument('--texture-size', type=int, default=16, help='размер текстуры, КБ')
+    http2.add_argument('--no-vendor', dest='vendor', action='store_false',
+                       help='без копий библиотек: только локальные файлы страницы')
+    http2.set_defaults(run=bench_http2)
+
+    bundle = scenarios.add_parser('bundle', help=bench_bundle.__doc__)
+    bundle.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    bundle.add_argument('--requests', type=int, default=300)
+    bundle.add_argument('--lookups', type=int, default=100000)
+    bundle.add_argument('--workers', type=int, default=4)
+    bundle.add_argument('--textures', type=int, default=40, help='текстур в <a-assets>')
+    bundle.add_argument('--texture-size', type=int, default=64, help='размер текстуры, КБ')
+    bundle.add_argument('--no-vendor', dest='vendor', action='store_false',
+                        help='без копий библиотек: только локальные файлы страницы')
+    bundle.set_defaults(run=bench_bundle)
+
+    load = scenarios.add_parser('load', help=bench_load.__doc__)
+    load.add_argument('--launchers', default=','.join(LAUNCHERS),
+                      help='скрипты запуска через запятую')
+    load.add_argument('--engine', choices=('threads', 'asyncio'), default='threads')
+    load.add_argument('--workers', type=int, default=1,
+                      help='процессов сервера (--workers); CPU и RSS - сумма по воркерам')
+    load.add_argument('--clients', default='1,8,32', help='уровни одновременных клиентов')
+    load.add_argument('--keep-alive', choices=('on', 'off', 'both'), default='both')
+    load.add_argument('--pages', type=int, default=10, help='загрузок страницы на клиента')
+    load.add_argument('--page', default='index.html')
+    load.add_argument('--root', default=ROOT, help='каталог сайта (с vendor/ - и библиотеки)')
+    load.add_argument('--timeout', type=float, default=15.0)
+    load.add_argument('--output', metavar='JSON', help='сохранить результаты в файл')
+    load.add_argument('--baseline', metavar='JSON',
+                      help='сравнить с прошлым прогоном; ухудшение - код возврата 1')
+    load.add_argument('--tolerance', type=float, default=0.1,
+                      help='допустимое ухудшение запросов/с и p95 (доля)')
+    load.set_defaults(run=bench_load)
+
+    startup = scenarios.add_parser('startup', help=bench_startup.__doc__)
+    startup.add_argument('--runs', type=int, default=10)
+    startup.add_argument('--timeout', type=float, default=10.0)
+    startup.set_defaults(run=bench_startup)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
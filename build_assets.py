@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Сборка статики для режима --assets: минификация JS/CSS и имена с хэшем
+Печатает размеры до и после (в том числе после gzip)
+"""
+
+import argparse
+import gzip
+import os
+import sys
+
+from ar_server.build import BUILD_SOURCES, build_assets
+from ar_server.cache import format_size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--root', default=os.getcwd(),
+        help='каталог сайта (по умолчанию текущий)')
+    args = parser.parse_args(argv)
+
+    missing = [name for name in BUILD_SOURCES
+               if not os.path.exists(os.path.join(args.root, name))]
+    if missing:
+        print(f"❌ Не найдены файлы: {', '.join(missing)}")
+        return 1
+
+    files = build_assets(args.root)
+    print("🏗️  Сборка статики (исходник / gzip -> сборка / gzip):")
+    totals = [0, 0, 0, 0]
+    for name, info in files.items():
+        with open(os.path.join(args.root, name), 'rb') as f:
+            source_gzip = len(gzip.compress(f.read(), compresslevel=9, mtime=0))
+        sizes = (info['size'], source_gzip, info['minified'], info['gzip'])
+        totals = [total + size for total, size in zip(totals, sizes)]
+        print(f"   {name} -> {info['path']}: {format_size(sizes[0])} / {format_size(sizes[1])}"
+              f" -> {format_size(sizes[2])} / {format_size(sizes[3])}")
+    print(f"📉 Всего: {format_size(totals[0])} -> {format_size(totals[2])} "
+          f"(-{(1 - totals[2] / totals[0]) * 100:.0f}%), по сети с gzip "
+          f"{format_size(totals[1])} -> {format_size(totals[3])} "
+          f"(-{(1 - totals[3] / totals[1]) * 100:.0f}%)")
+    print("✅ Запустите сервер с --assets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
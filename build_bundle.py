@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Сборка бандла для режима --bundle: файлы сайта, их gzip/deflate варианты,
+ETag и MIME типы одним файлом с хэш-индексом
+Скрипты, сертификаты, ключи и скрытые файлы в бандл не попадают
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from ar_server.bundle import DEFAULT_BUNDLE_FILE, EXCLUDED, build_bundle, collect_files
+from ar_server.build import load_manifest
+from ar_server.cache import format_size
+from ar_server.handler import guess_type
+from ar_server.vendor import load_vendor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--root', default=os.getcwd(),
+        help='каталог сайта (по умолчанию текущий)')
+    parser.add_argument(
+        '-o', '--output', default=None,
+        help=f'файл бандла (по умолчанию {DEFAULT_BUNDLE_FILE} в каталоге сайта)')
+    parser.add_argument(
+        '--vendor', action='store_true',
+        help='подставить в HTML локальные копии CDN из vendor/ (как сервер с --vendor)')
+    parser.add_argument(
+        '--assets', action='store_true',
+        help='подставить в HTML собранные файлы из assets/ (как сервер с --assets)')
+    parser.add_argument(
+        '--no-compress', dest='compress', action='store_false',
+        help='не сохранять gzip/deflate варианты')
+    parser.add_argument(
+        '--exclude', action='append', default=[], metavar='ШАБЛОН',
+        help=f"не включать файлы и каталоги по шаблону (кроме {' '.join(EXCLUDED)})")
+    args = parser.parse_args(argv)
+
+    root = os.path.abspath(args.root)
+    output = os.path.abspath(args.output or os.path.join(root, DEFAULT_BUNDLE_FILE))
+    transforms = []
+    if args.vendor:
+        transforms.append(load_vendor(root).transform)
+    if args.assets:
+        transforms.append(load_manifest(root).transform)
+
+    files = collect_files(root, EXCLUDED + tuple(args.exclude))
+    if not files:
+        print(f"❌ В {root} нет файлов для бандла")
+        return 1
+    started = time.perf_counter()
+    sizes = build_bundle(root, output, guess_type, files, transforms, args.compress)
+    elapsed = time.perf_counter() - started
+
+    skipped = sorted(name for name in os.listdir(root)
+                     if os.path.isfile(os.path.join(root, name)) and name not in sizes
+                     and not name.startswith('.') and name != os.path.basename(output))
+    plain = sum(size for size, _ in sizes.values())
+    wire = sum(min([size] + list(variants.values())) for size, variants in sizes.values())
+    print(f"📦 Бандл {output}: {len(sizes)} файлов за {elapsed:.1f} с")
+    print(f"   файлы {format_size(plain)}, лучшее сжатие {format_size(wire)}, "
+          f"бандл {format_size(os.path.getsize(output))}")
+    if skipped:
+        print(f"🙈 Не раздаются: {', '.join(skipped)}")
+    option = '' if output == os.path.join(root, DEFAULT_BUNDLE_FILE) else f' {output}'
+    print(f"✅ Запустите сервер с --bundle{option}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
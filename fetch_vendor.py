@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Скачивает библиотеки и текстуры с CDN в vendor/ для режима --vendor
+Без доступа в интернет можно взять файлы из зеркала: --mirror <каталог или URL>
+"""
+
+import argparse
+import os
+import sys
+
+from ar_server.vendor import VENDOR_ASSETS, VENDOR_DIR, fetch_assets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--mirror',
+        help='каталог или базовый URL с копиями в раскладке <хост>/<путь>')
+    parser.add_argument(
+        '--dir', default=VENDOR_DIR,
+        help=f'куда сохранять копии (по умолчанию {VENDOR_DIR})')
+    parser.add_argument(
+        '--force', action='store_true',
+        help='скачать заново даже существующие копии (хэш всё равно сверяется)')
+    args = parser.parse_args(argv)
+
+    print(f"📚 Копии CDN ({len(VENDOR_ASSETS)} файлов) -> {os.path.abspath(args.dir)}")
+    errors = fetch_assets(args.dir, args.mirror, force=args.force)
+    if errors:
+        print(f"⚠️  Не получено файлов: {errors}. Для них страницы пойдут на CDN")
+        return 1
+    print("✅ Готово. Запустите сервер с --vendor")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
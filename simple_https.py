@@ -3,104 +3,73 @@
 Простой HTTPS сервер для веб-AR
 """
 
-import ssl
-import os
-import socket
-import webbrowser
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from threading import Timer
+import time
 
-def get_local_ip():
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
-        return local_ip
-    except:
-        return "127.0.0.1"
+# Отсчёт времени до первого соединения - до остальных импортов
+STARTED = time.perf_counter()
 
-def create_ssl_cert():
-    """Создает SSL сертификат с помощью OpenSSL"""
-    import subprocess
-    
-    cert_file = 'server.pem'
-    
-    if os.path.exists(cert_file):
-        print("✅ SSL сертификат уже существует")
-        return cert_file
-    
-    try:
-        print("🔧 Создание SSL сертификата...")
-        
-        # Простая команда для создания self-signed сертификата
-        cmd = [
-            'openssl', 'req', '-new', '-x509', '-keyout', cert_file, '-out', cert_file,
-            '-days', '365', '-nodes', '-subj', '/CN=localhost'
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            print("✅ SSL сертификат создан!")
-            return cert_file
-        else:
-            print(f"❌ Ошибка OpenSSL: {result.stderr}")
-            return None
-            
-    except FileNotFoundError:
-        print("❌ OpenSSL не найден")
-        return None
-    except Exception as e:
-        print(f"❌ Ошибка: {e}")
-        return None
+from threading import Thread, Timer
 
-class HTTPSHandler(SimpleHTTPRequestHandler):
-    def end_headers(self):
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Permissions-Policy', 'camera=*, microphone=*')
-        super().end_headers()
+from ar_server import (
+    ARRequestHandler, CertificateManager, QRCodes, create_server, device_icon, lan_addresses,
+    parse_server_args, qr_urls,
+)
+
+class HTTPSHandler(ARRequestHandler):
+    extra_headers = (
+        ('Access-Control-Allow-Origin', '*'),
+        ('Permissions-Policy', 'camera=*, microphone=*'),
+    )
     
     def log_message(self, format, *args):
-        user_agent = self.headers.get('User-Agent', '')
-        device_type = "📱" if any(mobile in user_agent.lower() for mobile in ['mobile', 'android', 'iphone']) else "💻"
+        device_type = device_icon(self.headers.get('User-Agent', ''))
         print(f"{device_type} {self.address_string()} - {format % args}")
 
-def start_https_server():
-    port = 8443
-    local_ip = get_local_ip()
+def open_browser(url):
+    import webbrowser
+    webbrowser.open(url)
+
+def show_banner(httpd, port, options, ready_ms):
+    addresses = lan_addresses(4)
+    local_ip = addresses[0] if addresses else "127.0.0.1"
     https_url = f"https://{local_ip}:{port}"
+    qr_codes = QRCodes(qr_urls(addresses or [local_ip], port, scheme="https"))
+    httpd.qr_codes = qr_codes
     
     print("🔒 HTTPS AR Сервер")
-    print(f"🌐 IP: {local_ip}")
+    print(f"🌐 IP: {', '.join(addresses) or local_ip}")
     print()
-    
-    # Создаем сертификат
-    cert_file = create_ssl_cert()
-    if not cert_file:
-        print("❌ Не удалось создать сертификат")
-        print("💡 Установите OpenSSL: https://slproweb.com/products/Win32OpenSSL.html")
-        return
-    
     print(f"📱 Адрес для мобильного: {https_url}")
     print(f"📄 Диагностика: {https_url}/debug.html")
+    if qr_codes.terminal(https_url + "/"):
+        print(f"🖼️  QR код: {https_url}/__qr.svg")
     print()
     print("⚠️  На мобильном будет предупреждение - нажмите 'Все равно перейти'")
     print()
+    print(f"🟢 HTTPS сервер запущен на порту {port} (открыт через {ready_ms:.0f} мс после запуска)")
+    print("🔴 Для остановки нажмите Ctrl+C")
+    print()
+    
+    if options is None or options.browser:
+        Timer(2.0, open_browser, [f"https://localhost:{port}"]).start()
+
+def start_https_server(options=None):
+    port = (options.port if options is not None else None) or 8443
+    
+    # Создаем сертификат
+    context = CertificateManager().create_context()
+    if context is None:
+        print("❌ Не удалось создать сертификат")
+        print("💡 Установите OpenSSL: https://slproweb.com/products/Win32OpenSSL.html")
+        return
     
     try:
-        httpd = HTTPServer(('0.0.0.0', port), HTTPSHandler)
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-        context.load_cert_chain(cert_file)
-        httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
-        
-        print(f"🟢 HTTPS сервер запущен на порту {port}")
-        print("🔴 Для остановки нажмите Ctrl+C")
-        print()
-        
-        Timer(2.0, lambda: webbrowser.open(f"https://localhost:{port}")).start()
-        
-        httpd.serve_forever()
+        httpd = create_server(('0.0.0.0', port), HTTPSHandler, options, ssl_context=context,
+                              started_at=STARTED)
+        ready_ms = (time.perf_counter() - STARTED) * 1000
+        Thread(target=show_banner, args=(httpd, port, options, ready_ms), daemon=True).start()
+        with httpd:
+            httpd.serve_forever()
         
     except KeyboardInterrupt:
         print("\n🛑 Сервер остановлен")
@@ -108,4 +77,4 @@ def start_https_server():
         print(f"❌ Ошибка: {e}")
 
 if __name__ == "__main__":
-    start_https_server() 
\ No newline at end of file
+    start_https_server(parse_server_args("Простой HTTPS сервер для веб-AR"))
@@ -4,78 +4,57 @@ HTTP сервер для веб-AR приложения с поддержкой
 Доступен по локальной сети для тестирования на телефоне
 """
 
+import time
+
+# Отсчёт времени до первого соединения - до остальных импортов
+STARTED = time.perf_counter()
+
 import sys
 import os
-import webbrowser
-import socket
-import qrcode
-import io
-import base64
-from threading import Timer
+from threading import Thread, Timer
 
-def get_local_ip():
-    """Получает локальный IP адрес компьютера"""
-    try:
-        # Подключаемся к внешнему адресу, чтобы определить локальный IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
-        return local_ip
-    except:
-        return "127.0.0.1"
+from ar_server import (
+    CAMERA_HEADERS, CORS_HEADERS, ISOLATION_HEADERS, ARRequestHandler, QRCodes, create_server,
+    device_icon, lan_addresses, parse_server_args, qr_urls, shared_index,
+)
 
-def generate_qr_code(url):
-    """Генерирует QR код для URL"""
-    try:
-        qr = qrcode.QRCode(version=1, box_size=2, border=1)
-        qr.add_data(url)
-        qr.make(fit=True)
-        
-        # Создаем ASCII версию QR кода
-        modules = qr.get_matrix()
-        ascii_qr = ""
-        for row in modules:
-            line = ""
-            for module in row:
-                line += "██" if module else "  "
-            ascii_qr += line + "\n"
-        
-        return ascii_qr
-    except:
-        return "QR код недоступен (установите: pip install qrcode)"
+# Порт HTTPS варианта (start_https.py) для QR кодов
+HTTPS_PORT = 8443
+
+class MobileHTTPRequestHandler(ARRequestHandler):
+    # CORS, камера на мобильных и заголовки безопасности
+    extra_headers = CORS_HEADERS + CAMERA_HEADERS + ISOLATION_HEADERS
+    
+    def log_message(self, format, *args):
+        # Логирование с указанием устройства
+        device_type = device_icon(self.headers.get('User-Agent', ''))
+        print(f"{device_type} {self.address_string()} - {format % args}")
 
 def open_browser(url):
     """Открывает браузер через несколько секунд после запуска сервера"""
+    import webbrowser
     print(f"🌐 Открываем браузер: {url}")
     webbrowser.open(url)
 
-def start_mobile_server():
-    """Запускает HTTP сервер, доступный из локальной сети"""
-    
-    port = 8000
-    local_ip = get_local_ip()
+def show_banner(httpd, port, options, ready_ms):
+    """Печатает адреса, QR код и инструкции, когда порт уже слушается"""
+    addresses = lan_addresses(4)
+    local_ip = addresses[0] if addresses else "127.0.0.1"
     local_url = f"http://{local_ip}:{port}"
     localhost_url = f"http://localhost:{port}"
     
+    # QR коды всех адресов и HTTPS варианта - для /__qr.svg и /__qr.png
+    qr_codes = QRCodes(qr_urls(addresses or [local_ip], port, https_port=HTTPS_PORT))
+    httpd.qr_codes = qr_codes
+    
     print("=" * 70)
     print("📱 Запуск веб-сервера для мобильных устройств")
     print("=" * 70)
     print(f"📂 Директория: {os.getcwd()}")
     print(f"🔧 Python: {sys.version}")
+    if options is not None:
+        print(f"🧵 Движок: {options.engine}, потоков: {options.threads}, очередь: {options.queue_size}, backlog: {options.backlog}")
     print()
-    
-    # Проверяем наличие файлов
-    files_to_check = ['index.html', 'ar-app.js', 'style.css']
-    missing_files = [f for f in files_to_check if not os.path.exists(f)]
-    
-    if missing_files:
-        print("❌ Ошибка: Отсутствуют необходимые файлы:")
-        for file in missing_files:
-            print(f"   - {file}")
-        print("\n💡 Убедитесь, что вы находитесь в правильной директории!")
-        return
-    
     print("✅ Все необходимые файлы найдены!")
     print()
     
@@ -83,6 +62,10 @@ def start_mobile_server():
     print("🌍 URLs для доступа:")
     print(f"   💻 На этом компьютере: {localhost_url}")
     print(f"   📱 На мобильном устройстве: {local_url}")
+    for address in addresses[1:]:
+        print(f"   📱 Другая сеть: http://{address}:{port}")
+    if not addresses:
+        print("   ⚠️  Сетевых интерфейсов нет: подключитесь к Wi-Fi и перезапустите сервер")
     print()
     
     # Информация о страницах
@@ -93,7 +76,7 @@ def start_mobile_server():
     
     print("📄 Доступные страницы:")
     for name, file in pages:
-        if os.path.exists(file):
+        if shared_index(os.getcwd()).exists(file):
             print(f"   ✅ {name}:")
             print(f"      💻 {localhost_url}/{file}")
             print(f"      📱 {local_url}/{file}")
@@ -105,17 +88,20 @@ def start_mobile_server():
     print("   Отсканируйте QR код камерой телефона:")
     print()
     
-    # Генерируем QR код
-    qr_code = generate_qr_code(local_url)
-    print(qr_code)
+    # Матрица из кэша .qr-cache/, по две строки кода на строку терминала
+    qr_code = qr_codes.terminal(local_url + "/")
+    print(qr_code or "QR код недоступен (установите: pip install qrcode)")
     print(f"   URL: {local_url}")
+    if qr_code:
+        print(f"   🖼️  Для проектора: {local_url}/__qr.svg или {local_url}/__qr.png")
+        print(f"   🔒 HTTPS вариант: {local_url}/__qr.svg?url=https://{local_ip}:{HTTPS_PORT}/")
     print()
     
     # Инструкции для мобильного
     print("📲 Инструкции для мобильного устройства:")
     print("   1. Убедитесь, что телефон подключен к той же Wi-Fi сети")
     print("   2. Откройте браузер на телефоне (Chrome рекомендуется)")
-    print(f"   3. Введите адрес: {local_ip}:8000")
+    print(f"   3. Введите адрес: {local_ip}:{port}")
     print("   4. Или отсканируйте QR код выше")
     print("   5. Разрешите доступ к камере")
     print("   6. Наведите камеру на ровную поверхность")
@@ -124,48 +110,41 @@ def start_mobile_server():
     print("🔴 Для остановки сервера нажмите Ctrl+C")
     print("=" * 70)
     print()
+    print(f"🟢 Сервер запущен и доступен в локальной сети! (порт открыт через {ready_ms:.0f} мс после запуска)")
+    print(f"💻 Локальный доступ: {localhost_url}")
+    print(f"📱 Мобильный доступ: {local_url}")
+    print()
     
     # Открываем браузер на компьютере через 2 секунды
-    Timer(2.0, open_browser, [localhost_url]).start()
+    if options is None or options.browser:
+        Timer(2.0, open_browser, [localhost_url]).start()
+
+def start_mobile_server(options=None):
+    """Открывает порт в локальной сети, затем печатает адреса и QR код"""
+    
+    port = (options.port if options is not None else None) or 8000
+    
+    # Проверяем наличие файлов
+    # Индекс каталога: тот же, что потом отвечает на запросы сервера
+    files_to_check = ['index.html', 'ar-app.js', 'style.css']
+    missing_files = [f for f in files_to_check if not shared_index(os.getcwd()).exists(f)]
+    
+    if missing_files:
+        print("❌ Ошибка: Отсутствуют необходимые файлы:")
+        for file in missing_files:
+            print(f"   - {file}")
+        print("\n💡 Убедитесь, что вы находитесь в правильной директории!")
+        return
     
     try:
-        if sys.version_info[0] == 3:
-            import http.server
-            import socketserver
-            
-            class MobileHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-                def end_headers(self):
-                    # CORS заголовки для AR
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-                    self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-                    
-                    # Заголовки для камеры на мобильных
-                    self.send_header('Permissions-Policy', 'camera=*, microphone=*')
-                    self.send_header('Feature-Policy', 'camera *; microphone *')
-                    
-                    # Заголовки безопасности
-                    self.send_header('Cross-Origin-Embedder-Policy', 'credentialless')
-                    self.send_header('Cross-Origin-Opener-Policy', 'same-origin')
-                    
-                    super().end_headers()
-                
-                def log_message(self, format, *args):
-                    # Логирование с указанием устройства
-                    user_agent = self.headers.get('User-Agent', '')
-                    device_type = "📱" if any(mobile in user_agent.lower() for mobile in ['mobile', 'android', 'iphone']) else "💻"
-                    print(f"{device_type} {self.address_string()} - {format % args}")
-            
-            # Запускаем сервер, доступный из локальной сети
-            with socketserver.TCPServer(("0.0.0.0", port), MobileHTTPRequestHandler) as httpd:
-                print(f"🟢 Сервер запущен и доступен в локальной сети!")
-                print(f"💻 Локальный доступ: {localhost_url}")
-                print(f"📱 Мобильный доступ: {local_url}")
-                print()
-                httpd.serve_forever()
-                
-        else:
-            print("❌ Требуется Python 3 для работы с мобильными устройствами!")
+        # Запускаем сервер, доступный из локальной сети; баннер и QR код
+        # печатаются в отдельном потоке и не задерживают первое соединение
+        httpd = create_server(("0.0.0.0", port), MobileHTTPRequestHandler, options,
+                              started_at=STARTED)
+        ready_ms = (time.perf_counter() - STARTED) * 1000
+        Thread(target=show_banner, args=(httpd, port, options, ready_ms), daemon=True).start()
+        with httpd:
+            httpd.serve_forever()
             
     except KeyboardInterrupt:
         print("\n🛑 Сервер остановлен пользователем")
@@ -173,13 +152,15 @@ def start_mobile_server():
         if "Address already in use" in str(e):
             print(f"❌ Ошибка: Порт {port} уже используется!")
             print(f"💡 Остановите предыдущий сервер (Ctrl+C) и попробуйте снова")
-            print(f"   Или используйте другой порт: python start_mobile_server.py")
+            print(f"   Или используйте другой порт: python start_mobile_server.py --port {port+1}")
         else:
             print(f"❌ Ошибка сервера: {e}")
     except Exception as e:
         print(f"❌ Неожиданная ошибка: {e}")
 
 if __name__ == "__main__":
+    options = parse_server_args("HTTP сервер для веб-AR, доступный из локальной сети")
+    
     print("🚀 Веб-AR сервер для мобильных устройств")
     print()
     print("💡 Советы для AR на мобильном:")
@@ -191,4 +172,4 @@ if __name__ == "__main__":
     print("   • Медленно перемещайте камеру для калибровки")
     print()
     
-    start_mobile_server() 
\ No newline at end of file
+    start_mobile_server(options)
\ No newline at end of file
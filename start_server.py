@@ -1,46 +1,48 @@
 #!/usr/bin/env python3
 """
 Простой HTTP сервер для веб-AR приложения
-Автоматически определяет Python версию и запускает сервер
+Сначала открывает порт, затем печатает адреса и открывает браузер
 """
 
+import time
+
+# Отсчёт времени до первого соединения - до остальных импортов
+STARTED = time.perf_counter()
+
 import sys
 import os
-import webbrowser
-import time
-from threading import Timer
+from threading import Thread, Timer
+
+from ar_server import (
+    CORS_HEADERS, ISOLATION_HEADERS, ARRequestHandler, create_server, parse_server_args,
+    shared_index,
+)
+
+class CustomHTTPRequestHandler(ARRequestHandler):
+    # CORS заголовки для AR и заголовки для HTTPS на localhost
+    extra_headers = CORS_HEADERS + ISOLATION_HEADERS
+    
+    def log_message(self, format, *args):
+        # Логирование запросов
+        print(f"📡 {self.address_string()} - {format % args}")
 
 def open_browser(url):
     """Открывает браузер через несколько секунд после запуска сервера"""
+    import webbrowser
     print(f"🌐 Открываем браузер: {url}")
     webbrowser.open(url)
 
-def start_server():
-    """Запускает HTTP сервер в зависимости от версии Python"""
-    
-    port = 8000
-    host = 'localhost'
-    url = f"http://{host}:{port}"
-    
+def show_banner(url, options, ready_ms):
+    """Печатает информацию о сервере, когда порт уже слушается"""
     print("=" * 60)
     print("🚀 Запуск веб-сервера для AR приложения")
     print("=" * 60)
     print(f"📂 Директория: {os.getcwd()}")
     print(f"🌍 URL: {url}")
     print(f"🔧 Python: {sys.version}")
+    if options is not None:
+        print(f"🧵 Движок: {options.engine}, потоков: {options.threads}, очередь: {options.queue_size}, backlog: {options.backlog}")
     print()
-    
-    # Проверяем наличие файлов
-    files_to_check = ['index.html', 'ar-app.js', 'style.css']
-    missing_files = [f for f in files_to_check if not os.path.exists(f)]
-    
-    if missing_files:
-        print("❌ Ошибка: Отсутствуют необходимые файлы:")
-        for file in missing_files:
-            print(f"   - {file}")
-        print("\n💡 Убедитесь, что вы находитесь в правильной директории!")
-        return
-    
     print("✅ Все необходимые файлы найдены!")
     print()
     
@@ -52,7 +54,7 @@ def start_server():
     
     print("📄 Доступные страницы:")
     for name, file in pages:
-        if os.path.exists(file):
+        if shared_index(os.getcwd()).exists(file):
             print(f"   ✅ {name}: {url}/{file}")
         else:
             print(f"   ❌ {name}: {file} (не найден)")
@@ -61,48 +63,42 @@ def start_server():
     print("🔴 Для остановки сервера нажмите Ctrl+C")
     print("=" * 60)
     print()
+    print(f"🟢 Сервер запущен на {url} (порт открыт через {ready_ms:.0f} мс после запуска)")
+    print(f"📱 Для тестирования AR откройте ссылку на мобильном устройстве")
+    print(f"💻 Для настольного компьютера используйте веб-камеру")
+    print()
     
     # Открываем браузер через 2 секунды
-    Timer(2.0, open_browser, [url]).start()
+    if options is None or options.browser:
+        Timer(2.0, open_browser, [url]).start()
+
+def start_server(options=None):
+    """Открывает порт, затем печатает информацию и обслуживает запросы"""
+    
+    port = (options.port if options is not None else None) or 8000
+    host = 'localhost'
+    url = f"http://{host}:{port}"
+    
+    # Проверяем наличие файлов
+    # Индекс каталога: тот же, что потом отвечает на запросы сервера
+    files_to_check = ['index.html', 'ar-app.js', 'style.css']
+    missing_files = [f for f in files_to_check if not shared_index(os.getcwd()).exists(f)]
+    
+    if missing_files:
+        print("❌ Ошибка: Отсутствуют необходимые файлы:")
+        for file in missing_files:
+            print(f"   - {file}")
+        print("\n💡 Убедитесь, что вы находитесь в правильной директории!")
+        return
     
     try:
-        if sys.version_info[0] == 3:
-            # Python 3
-            import http.server
-            import socketserver
-            
-            class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-                def end_headers(self):
-                    # Добавляем CORS заголовки для AR
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-                    self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-                    # Заголовки для HTTPS на localhost
-                    self.send_header('Cross-Origin-Embedder-Policy', 'credentialless')
-                    self.send_header('Cross-Origin-Opener-Policy', 'same-origin')
-                    super().end_headers()
-                
-                def log_message(self, format, *args):
-                    # Логирование запросов
-                    print(f"📡 {self.address_string()} - {format % args}")
-            
-            with socketserver.TCPServer((host, port), CustomHTTPRequestHandler) as httpd:
-                print(f"🟢 Сервер запущен на {url}")
-                print(f"📱 Для тестирования AR откройте ссылку на мобильном устройстве")
-                print(f"💻 Для настольного компьютера используйте веб-камеру")
-                print()
-                httpd.serve_forever()
-                
-        else:
-            # Python 2 (устарело, но для совместимости)
-            import SimpleHTTPServer
-            import SocketServer
-            
-            Handler = SimpleHTTPServer.SimpleHTTPRequestHandler
-            with SocketServer.TCPServer((host, port), Handler) as httpd:
-                print(f"🟢 Сервер запущен на {url}")
-                print("⚠️  Внимание: Используется Python 2. Рекомендуется обновиться до Python 3!")
-                httpd.serve_forever()
+        # Порт слушается сразу: баннер и браузер не задерживают первое соединение
+        httpd = create_server((host, port), CustomHTTPRequestHandler, options,
+                              started_at=STARTED)
+        ready_ms = (time.perf_counter() - STARTED) * 1000
+        Thread(target=show_banner, args=(url, options, ready_ms), daemon=True).start()
+        with httpd:
+            httpd.serve_forever()
                 
     except KeyboardInterrupt:
         print("\n🛑 Сервер остановлен пользователем")
@@ -111,7 +107,7 @@ def start_server():
             print(f"❌ Ошибка: Порт {port} уже используется!")
             print(f"💡 Попробуйте:")
             print(f"   - Закрыть другие приложения, использующие порт {port}")
-            print(f"   - Изменить порт в скрипте")
+            print(f"   - Указать другой порт: python start_server.py --port {port+1}")
             print(f"   - Использовать команду: python -m http.server {port+1}")
         else:
             print(f"❌ Ошибка сервера: {e}")
@@ -119,6 +115,8 @@ def start_server():
         print(f"❌ Неожиданная ошибка: {e}")
 
 if __name__ == "__main__":
+    options = parse_server_args("HTTP сервер для веб-AR приложения")
+    
     # Дополнительная информация
     print("💡 Советы для лучшей работы AR:")
     print("   • Используйте Chrome или Firefox для лучшей совместимости")
@@ -128,4 +126,4 @@ if __name__ == "__main__":
     print("   • Избегайте отражающих поверхностей")
     print()
     
-    start_server() 
\ No newline at end of file
+    start_server(options)
\ No newline at end of file
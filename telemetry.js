@@ -0,0 +1,64 @@
+// Замеры страницы для сервера: POST /__telemetry (сервер запущен с --telemetry)
+// Замеры копятся и уходят одной пачкой через несколько секунд или при уходе
+// со страницы. Без --telemetry сервер отвечает ошибкой, и страница это игнорирует.
+const ARTelemetry = (() => {
+    const ENDPOINT = '/__telemetry';
+    const FLUSH_DELAY = 5000;
+    let pending = {};
+    let timer = null;
+
+    function record(metric, value) {
+        if (typeof value === 'boolean') {
+            value = value ? 1 : 0;
+        }
+        if (!Number.isFinite(value)) {
+            return;
+        }
+        (pending[metric] = pending[metric] || []).push(Math.round(value * 1000) / 1000);
+        if (!timer) {
+            timer = setTimeout(flush, FLUSH_DELAY);
+        }
+    }
+
+    function flush() {
+        clearTimeout(timer);
+        timer = null;
+        if (!Object.keys(pending).length) {
+            return;
+        }
+        // text/plain не требует предварительного CORS запроса
+        const body = JSON.stringify({ metrics: pending });
+        pending = {};
+        if (!(navigator.sendBeacon && navigator.sendBeacon(ENDPOINT, body))) {
+            fetch(ENDPOINT, { method: 'POST', body, keepalive: true }).catch(() => {});
+        }
+    }
+
+    // Время от start (performance.now()) до сейчас, в мс
+    function since(metric, start) {
+        record(metric, performance.now() - start);
+    }
+
+    // Кадров в секунду за seconds секунд
+    function sampleFps(seconds = 2) {
+        let frames = 0;
+        const start = performance.now();
+        const tick = (now) => {
+            frames++;
+            if (now - start < seconds * 1000) {
+                requestAnimationFrame(tick);
+            } else {
+                record('fps', frames * 1000 / (now - start));
+            }
+        };
+        requestAnimationFrame(tick);
+    }
+
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') {
+            flush();
+        }
+    });
+
+    return { record, since, sampleFps, flush };
+})();